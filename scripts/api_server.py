@@ -7,19 +7,39 @@ import os
 import json
 import sys
 import pathlib
-import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, request, jsonify, g
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
 import base64
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ingest_multimodal import process_and_save, extract_text_from_image, extract_content_from_url
+from jobs import job_queue, QueueFullError
+from result_cache import ResultCache, all_stats as cache_stats
+from ocr_backends import ocr_router
+import pdf_tools
+import metrics
+import http_client
+import og_image as og_image_extractor
+from uploads import (UploadBuffer, UploadTooLarge, UPLOAD_MAX_SIZE,
+                     buffer_from_stream, buffer_from_bytes, buffer_from_data_url)
 
 # 加载环境变量
 from dotenv import load_dotenv
 env_path = pathlib.Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+class UploadRequest(Request):
+    """multipart 上传的文件部分直接写入 UploadBuffer（小文件留在内存，大文件转存临时文件）"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadBuffer(suffix=pathlib.Path(secure_filename(filename or '')).suffix)
+
 app = Flask(__name__)
+app.request_class = UploadRequest
+# 请求体大小上限，超过后返回 413（multipart 和原始二进制上传都会边读边检查）
+app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_SIZE
 # 配置 CORS，允许所有来源（开发环境）
 CORS(app, resources={r"/*": {"origins": "*", "methods": ["GET", "POST", "OPTIONS", "PUT", "DELETE"], "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"]}})
 
@@ -33,11 +53,75 @@ def handle_preflight():
         response.headers.add('Access-Control-Allow-Methods', "*")
         return response
 
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    metrics.http_in_flight.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('metrics_start')
+    if start is not None:
+        # 按路由模板统计，避免 /api/jobs/<job_id> 等路径产生大量标签；流式响应只统计到开始输出
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_duration.observe(time.perf_counter() - start, endpoint=endpoint)
+        metrics.http_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if g.pop('metrics_start', None) is not None:
+        metrics.http_in_flight.dec()
+
+@app.errorhandler(413)
+@app.errorhandler(UploadTooLarge)
+def upload_too_large(e):
+    return jsonify({
+        'success': False,
+        'error': f'上传内容过大，最大支持 {UPLOAD_MAX_SIZE // (1024 * 1024)}MB'
+    }), 413
+
+# 原始二进制上传支持的 Content-Type
+RAW_UPLOAD_SUFFIXES = {
+    'application/octet-stream': '',
+    'application/pdf': '.pdf',
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+}
+
+def _read_raw_upload():
+    """
+    读取原始二进制请求体（Content-Type 为 application/octet-stream、image/* 或 application/pdf）
+    分块读取到 UploadBuffer，不经过 JSON 和 base64；不是原始上传时返回 None
+    """
+    suffix = RAW_UPLOAD_SUFFIXES.get(request.mimetype)
+    if suffix is None and not request.mimetype.startswith('image/'):
+        return None
+    return buffer_from_stream(request.stream, suffix=suffix or '')
+
+# 提取结果缓存：键为输入内容哈希 + 提取器版本，提取逻辑变化时修改版本号即可让旧缓存失效
+ocr_cache = ResultCache('ocr', version='ocr-router-v1')
+pdf_text_cache = ResultCache('pdf_text', version='pdf-text-v2')
+pdf_thumbnail_cache = ResultCache('pdf_thumbnail', version='first-page-v2')
+
+# 启动时探测一次可用的最快缩略图渲染器，之后每个请求直接使用
+print(f"🖼️ PDF 缩略图渲染器: {pdf_tools.get_thumbnail_renderer() or '不可用'}")
+
 @app.route('/health', methods=['GET'])
 def health():
     """健康检查"""
     return jsonify({'status': 'ok', 'message': 'AI 采集服务运行中'})
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Prometheus 格式的运行指标（汇总所有 worker 进程）
+    包括 API 请求、采集流程各阶段的耗时直方图 / 次数 / 进行中数量、外部服务错误次数、缓存命中次数
+    """
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 @app.route('/api/ocr', methods=['POST'])
 def ocr():
     """
@@ -45,34 +129,40 @@ def ocr():
     
     请求体（JSON）：
     {
-        "image": "data:image/jpeg;base64,/9j/4AAQ..." 或图片 URL
+        "image": "data:image/jpeg;base64,/9j/4AAQ..." 或图片 URL,
+        "backend": "baidu_accurate",  // 可选，首选的 OCR 后端（见 /api/ocr/backends），默认自动选择
+        "allow_paid": true            // 可选，允许自动选择时使用收费后端（百度、GLM-4V），默认只用本地识别（OCR_ALLOW_PAID=1 时默认允许）
     }
     
     或（Form Data）：
     - file: 图片文件
+    - backend / allow_paid: 可选，同上
+    
+    或（原始二进制，Content-Type: application/octet-stream 或 image/*）：
+    请求体直接为图片内容，首选后端和 allow_paid 用查询参数 ?backend= / ?allow_paid= 指定
     """
     try:
-        image_data = None
-        temp_path = None
+        buf = _read_raw_upload()
+        backend = request.args.get('backend') or None
         
         # 检查是否是文件上传
-        if 'file' in request.files:
+        if buf is not None:
+            if not buf.size:
+                buf.close()
+                return jsonify({'error': '文件不能为空'}), 400
+        elif 'file' in request.files:
             file = request.files['file']
             if file.filename:
-                # 保存临时文件
-                upload_dir = pathlib.Path(__file__).parent.parent / 'uploads'
-                upload_dir.mkdir(exist_ok=True)
-                filename = secure_filename(file.filename)
-                filepath = upload_dir / filename
-                file.save(str(filepath))
-                temp_path = str(filepath)
+                buf = buffer_from_stream(file.stream, suffix=pathlib.Path(secure_filename(file.filename)).suffix)
             else:
                 return jsonify({'error': '文件不能为空'}), 400
+            backend = request.form.get('backend') or backend
         else:
             # JSON 请求
             data = request.get_json()
             if not data:
                 return jsonify({'error': '请求体不能为空'}), 400
+            backend = data.get('backend') or backend
             
             image_data = data.get('image')
             if not image_data:
@@ -81,27 +171,15 @@ def ocr():
             # 处理 base64 图片
             if image_data.startswith('data:image'):
                 try:
-                    header, encoded = image_data.split(',', 1)
-                    image_bytes = base64.b64decode(encoded)
-                    upload_dir = pathlib.Path(__file__).parent.parent / 'uploads'
-                    upload_dir.mkdir(exist_ok=True)
-                    temp_path = upload_dir / f'ocr_temp_{int(pathlib.Path(__file__).stat().st_mtime)}.jpg'
-                    with open(temp_path, 'wb') as f:
-                        f.write(image_bytes)
-                    temp_path = str(temp_path)
+                    buf = buffer_from_data_url(image_data, suffix='.jpg')
                 except Exception as e:
                     return jsonify({'error': f'图片解码失败: {e}'}), 400
             elif image_data.startswith('http'):
                 # URL 图片，下载后处理
                 try:
-                    resp = requests.get(image_data, timeout=15)
+                    resp = http_client.get(image_data, timeout=15)
                     if resp.status_code == 200:
-                        upload_dir = pathlib.Path(__file__).parent.parent / 'uploads'
-                        upload_dir.mkdir(exist_ok=True)
-                        temp_path = upload_dir / f'ocr_temp_{int(pathlib.Path(__file__).stat().st_mtime)}.jpg'
-                        with open(temp_path, 'wb') as f:
-                            f.write(resp.content)
-                        temp_path = str(temp_path)
+                        buf = buffer_from_bytes(resp.content, suffix='.jpg')
                     else:
                         return jsonify({'error': f'下载图片失败: {resp.status_code}'}), 400
                 except Exception as e:
@@ -109,30 +187,34 @@ def ocr():
             else:
                 return jsonify({'error': '不支持的图片格式，请使用 base64 或 URL'}), 400
         
-        # 调用 OCR 提取文字
-        if temp_path:
-            text = extract_text_from_image(temp_path)
-            
-            # 清理临时文件
-            try:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-            except:
-                pass
-            
-            if text:
-                return jsonify({
-                    'success': True,
-                    'text': text
-                }), 200
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': '未能从图片中提取到文字'
-                }), 400
+        # 未传 allow_paid 时按 OCR_ALLOW_PAID；传 false 时即使服务端开启也只用免费后端
+        allow_paid = _request_option('allow_paid')
+        allow_paid = ocr_router.allow_paid if allow_paid in (None, '') else _is_truthy(allow_paid)
+        
+        # 调用 OCR 提取文字（相同图片直接返回缓存结果；指定了后端或允许收费后端时分别缓存）
+        with buf:
+            if backend and backend not in ocr_router.backends:
+                return jsonify({'error': f'未知的 OCR 后端: {backend}，可选: {", ".join(ocr_router.backends)}'}), 400
+            text, cached = ocr_cache.get_or_compute(
+                buf.fileobj(), lambda: extract_text_from_image(buf.source(), backend=backend, allow_paid=allow_paid),
+                variant=(backend or '') + ('|paid' if allow_paid else ''))
+        if cached:
+            print("⚡ OCR 命中缓存")
+        
+        if text:
+            return jsonify({
+                'success': True,
+                'text': text
+            }), 200
         else:
-            return jsonify({'error': '图片处理失败'}), 400
+            return jsonify({
+                'success': False,
+                'error': '未能从图片中提取到文字'
+            }), 400
             
+    except (HTTPException, UploadTooLarge):
+        # 请求体过大等 HTTP 错误交给对应的 errorhandler 处理
+        raise
     except Exception as e:
         print(f"❌ OCR API 错误: {e}")
         import traceback
@@ -142,80 +224,117 @@ def ocr():
             'error': str(e)
         }), 500
 
+def _read_pdf_upload():
+    """
+    读取 PDF 上传（原始二进制请求体、Form Data 的 file 字段，或 JSON 的 pdf 字段 base64）
+    返回 (UploadBuffer, 错误响应)，二者只有一个不为 None
+    """
+    buf = _read_raw_upload()
+    if buf is not None:
+        if not buf.size:
+            buf.close()
+            return None, (jsonify({'error': '文件不能为空'}), 400)
+        return buf, None
+    
+    if 'file' in request.files:
+        file = request.files['file']
+        if not file.filename:
+            return None, (jsonify({'error': '文件不能为空'}), 400)
+        return buffer_from_stream(file.stream, suffix='.pdf'), None
+    
+    data = request.get_json()
+    if not data or 'pdf' not in data:
+        return None, (jsonify({'error': '请求体不能为空'}), 400)
+    
+    pdf_data = data.get('pdf')
+    if pdf_data.startswith('data:application/pdf'):
+        return buffer_from_data_url(pdf_data, suffix='.pdf'), None
+    return None, (jsonify({'error': 'PDF 处理失败'}), 400)
+
+def _request_option(name):
+    """读取请求参数：URL 参数优先，其次是 Form Data 或 JSON 请求体中的同名字段"""
+    value = request.args.get(name)
+    if value is None and request.form:
+        value = request.form.get(name)
+    if value is None and request.is_json:
+        data = request.get_json(silent=True) or {}
+        value = data.get(name)
+    return value
+
+def _is_truthy(value):
+    return value is True or str(value).lower() in ('1', 'true')
+
 @app.route('/api/pdf-extract', methods=['POST'])
 def pdf_extract():
     """
-    PDF 文字提取
+    PDF 文字提取（页数较多时按页分块并行提取）
+    
+    可选参数（URL 参数、Form Data 或 JSON 字段）：
+    - pages: 页码范围，如 "1-3,5,8-"，默认全部
+    - backend: pdfplumber | pymupdf | pypdf2，默认 PDF_TEXT_BACKEND
+    - stream: 为 true 时以 NDJSON 流式返回，每完成一页输出 {"page": 页码, "text": ...}，
+              最后一行为 {"done": true, "pages": 页数}
     """
     try:
-        temp_path = None
+        buf, error = _read_pdf_upload()
+        if error:
+            return error
         
-        if 'file' in request.files:
-            file = request.files['file']
-            if file.filename:
-                upload_dir = pathlib.Path(__file__).parent.parent / 'uploads'
-                upload_dir.mkdir(exist_ok=True)
-                filename = secure_filename(file.filename)
-                filepath = upload_dir / filename
-                file.save(str(filepath))
-                temp_path = str(filepath)
-            else:
-                return jsonify({'error': '文件不能为空'}), 400
-        else:
-            data = request.get_json()
-            if not data or 'pdf' not in data:
-                return jsonify({'error': '请求体不能为空'}), 400
-            
-            pdf_data = data.get('pdf')
-            if pdf_data.startswith('data:application/pdf'):
-                header, encoded = pdf_data.split(',', 1)
-                pdf_bytes = base64.b64decode(encoded)
-                upload_dir = pathlib.Path(__file__).parent.parent / 'uploads'
-                upload_dir.mkdir(exist_ok=True)
-                temp_path = upload_dir / f'pdf_temp_{int(pathlib.Path(__file__).stat().st_mtime)}.pdf'
-                with open(temp_path, 'wb') as f:
-                    f.write(pdf_bytes)
-                temp_path = str(temp_path)
-        
-        if temp_path:
-            text = ""
-            # 尝试使用 pdfplumber 提取文字
-            try:
-                import pdfplumber
-                with pdfplumber.open(temp_path) as pdf:
-                    for page in pdf.pages:
-                        text += page.extract_text() or ""
-            except ImportError:
-                print("⚠️ pdfplumber 未安装，尝试使用 PyPDF2")
+        pages = _request_option('pages')
+        backend = _request_option('backend')
+        try:
+            backend = pdf_tools.resolve_backend(backend)
+        except pdf_tools.NoPdfBackendError as e:
+            buf.close()
+            return jsonify({'error': str(e)}), 500
+        # 进程池任务只能接收路径或 bytes
+        source = buf.path or buf.getvalue()
+        
+        if _is_truthy(_request_option('stream')):
+            def generate():
+                count = 0
                 try:
-                    import PyPDF2
-                    with open(temp_path, 'rb') as f:
-                        reader = PyPDF2.PdfReader(f)
-                        for page in reader.pages:
-                            text += page.extract_text() or ""
-                except ImportError:
-                    return jsonify({'error': '未安装 PDF 处理库 (pdfplumber 或 PyPDF2)'}), 500
-            
-            # 清理临时文件
-            try:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-            except:
-                pass
+                    for index, page_text in pdf_tools.iter_pdf_text(source, pages=pages, backend=backend):
+                        count += 1
+                        yield json.dumps({'page': index + 1, 'text': page_text}, ensure_ascii=False) + '\n'
+                    yield json.dumps({'done': True, 'pages': count}) + '\n'
+                except Exception as e:
+                    # 输出已经开始，无法再返回错误状态码；最后一行带 error，客户端据此区分失败和连接中断
+                    if not isinstance(e, ValueError):
+                        print(f"❌ PDF 流式提取错误: {e}")
+                    yield json.dumps({'done': True, 'pages': count, 'error': str(e)}, ensure_ascii=False) + '\n'
             
-            if text.strip():
-                return jsonify({
-                    'success': True,
-                    'text': text
-                }), 200
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': '未能从 PDF 中提取到文字，可能是扫描件图片，请尝试截图后使用"图片"模式识别。'
-                }), 400
+            response = Response(generate(), mimetype='application/x-ndjson')
+            # 响应结束时释放上传内容（客户端在第一行输出前断开、生成器从未执行时也会调用）
+            response.call_on_close(buf.close)
+            return response
         
-        return jsonify({'error': 'PDF 处理失败'}), 400
+        with buf:
+            try:
+                text, cached = pdf_text_cache.get_or_compute(
+                    buf.fileobj(),
+                    lambda: pdf_tools.extract_pdf_text(source, pages=pages, backend=backend),
+                    variant=f'{backend}|{pages or ""}'
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        if cached:
+            print("⚡ PDF 文字命中缓存")
+        
+        if text.strip():
+            return jsonify({
+                'success': True,
+                'text': text
+            }), 200
+        else:
+            return jsonify({
+                'success': False,
+                'error': '未能从 PDF 中提取到文字，可能是扫描件图片，请尝试截图后使用"图片"模式识别。'
+            }), 400
             
+    except (HTTPException, UploadTooLarge):
+        # 请求体过大等 HTTP 错误交给对应的 errorhandler 处理
+        raise
     except Exception as e:
         print(f"❌ PDF API 错误: {e}")
         return jsonify({
@@ -227,114 +346,44 @@ def pdf_extract():
 def pdf_thumbnail():
     """
     PDF 首页缩略图生成
-    将 PDF 第一页转换为图片，返回 base64
+    将 PDF 第一页直接按目标宽度渲染为图片，返回 base64
+    
+    可选参数（URL 参数、Form Data 或 JSON 字段）：
+    - width: 缩略图宽度（像素），默认 PDF_THUMBNAIL_WIDTH；列表页建议 300~400
+    - format: jpeg（默认）| webp
     """
     try:
-        temp_path = None
+        buf, error = _read_pdf_upload()
+        if error:
+            return error
         
-        if 'file' in request.files:
-            file = request.files['file']
-            if file.filename:
-                upload_dir = pathlib.Path(__file__).parent.parent / 'uploads'
-                upload_dir.mkdir(exist_ok=True)
-                filename = secure_filename(file.filename)
-                filepath = upload_dir / filename
-                file.save(str(filepath))
-                temp_path = str(filepath)
-            else:
-                return jsonify({'error': '文件不能为空'}), 400
-        else:
-            data = request.get_json()
-            if not data or 'pdf' not in data:
-                return jsonify({'error': '请求体不能为空'}), 400
-            
-            pdf_data = data.get('pdf')
-            if pdf_data.startswith('data:application/pdf'):
-                header, encoded = pdf_data.split(',', 1)
-                pdf_bytes = base64.b64decode(encoded)
-                upload_dir = pathlib.Path(__file__).parent.parent / 'uploads'
-                upload_dir.mkdir(exist_ok=True)
-                temp_path = str(upload_dir / f'pdf_thumb_{int(pathlib.Path(__file__).stat().st_mtime)}.pdf')
-                with open(temp_path, 'wb') as f:
-                    f.write(pdf_bytes)
-        
-        if not temp_path:
-            return jsonify({'error': 'PDF 处理失败'}), 400
-        
-        thumbnail_base64 = None
-        
-        # 方法1：使用 pdf2image（需要安装 poppler）
-        try:
-            from pdf2image import convert_from_path
-            images = convert_from_path(temp_path, first_page=1, last_page=1, dpi=150)
-            if images:
-                import io
-                img_buffer = io.BytesIO()
-                images[0].save(img_buffer, format='JPEG', quality=85)
-                img_buffer.seek(0)
-                thumbnail_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-                print("✅ 使用 pdf2image 生成缩略图成功")
-        except ImportError:
-            print("⚠️ pdf2image 未安装，尝试使用 fitz (PyMuPDF)")
-        except Exception as e:
-            print(f"⚠️ pdf2image 失败: {e}，尝试使用 fitz")
+        width = _request_option('width') or pdf_tools.THUMBNAIL_DEFAULT_WIDTH
+        fmt = (_request_option('format') or 'jpeg').lower().replace('jpg', 'jpeg')
         
-        # 方法2：使用 PyMuPDF (fitz)
-        if not thumbnail_base64:
+        with buf:
             try:
-                import fitz  # PyMuPDF
-                doc = fitz.open(temp_path)
-                page = doc[0]
-                # 设置缩放比例，生成更清晰的图片
-                zoom = 2.0
-                mat = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=mat)
-                thumbnail_base64 = base64.b64encode(pix.tobytes("jpeg")).decode('utf-8')
-                doc.close()
-                print("✅ 使用 PyMuPDF 生成缩略图成功")
-            except ImportError:
-                print("⚠️ PyMuPDF 未安装")
-            except Exception as e:
-                print(f"⚠️ PyMuPDF 失败: {e}")
-        
-        # 方法3：使用 pdfplumber + PIL（备选方案，效果较差）
-        if not thumbnail_base64:
-            try:
-                import pdfplumber
-                from PIL import Image
-                import io
-                
-                with pdfplumber.open(temp_path) as pdf:
-                    if pdf.pages:
-                        page = pdf.pages[0]
-                        # pdfplumber 可以获取页面图片
-                        img = page.to_image(resolution=150)
-                        img_buffer = io.BytesIO()
-                        img.original.save(img_buffer, format='JPEG', quality=85)
-                        img_buffer.seek(0)
-                        thumbnail_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-                        print("✅ 使用 pdfplumber 生成缩略图成功")
-            except Exception as e:
-                print(f"⚠️ pdfplumber 缩略图失败: {e}")
-        
-        # 清理临时文件
-        try:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        except:
-            pass
+                width = int(width)
+                source = buf.path or buf.getvalue()
+                thumbnail_base64, cached = pdf_thumbnail_cache.get_or_compute(
+                    buf.fileobj(),
+                    lambda: base64.b64encode(pdf_tools.render_thumbnail(source, width=width, fmt=fmt)).decode('utf-8'),
+                    variant=f'{width}|{fmt}'
+                )
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            except pdf_tools.NoPdfBackendError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        if cached:
+            print("⚡ PDF 缩略图命中缓存")
         
-        if thumbnail_base64:
-            return jsonify({
-                'success': True,
-                'thumbnail': f'data:image/jpeg;base64,{thumbnail_base64}'
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': '无法生成 PDF 缩略图，请安装 pdf2image 或 PyMuPDF 库'
-            }), 400
+        return jsonify({
+            'success': True,
+            'thumbnail': f'data:{pdf_tools.THUMBNAIL_FORMATS[fmt]};base64,{thumbnail_base64}'
+        }), 200
             
+    except (HTTPException, UploadTooLarge):
+        # 请求体过大等 HTTP 错误交给对应的 errorhandler 处理
+        raise
     except Exception as e:
         print(f"❌ PDF 缩略图 API 错误: {e}")
         import traceback
@@ -344,10 +393,27 @@ def pdf_thumbnail():
             'error': str(e)
         }), 500
 
+@app.route('/api/ocr/backends', methods=['GET'])
+def get_ocr_backends():
+    """各 OCR 后端的可用状态、近期延迟、错误率、吞吐量和当日额度用量（当前 worker 进程）"""
+    return jsonify({'success': True, 'pid': os.getpid(), 'backends': ocr_router.stats()}), 200
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """提取结果缓存的命中/未命中计数（当前 worker 进程）"""
+    return jsonify({'success': True, 'pid': os.getpid(), 'caches': cache_stats()}), 200
+
 @app.route('/api/extract-og-image', methods=['POST'])
 def extract_og_image():
     """
     从 URL 提取 og:image（Open Graph 封面图）
+    只下载到 </head> 为止；结果按 URL 缓存（未找到的结果也会短时间缓存）
+    
+    请求体（JSON）：
+    {
+        "url": "https://mp.weixin.qq.com/s/...",
+        "no_cache": false   // 可选，为 true 时跳过缓存重新抓取
+    }
     """
     try:
         data = request.get_json()
@@ -357,49 +423,13 @@ def extract_og_image():
         url = data.get('url')
         print(f"\n🔗 提取 og:image: {url}")
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
+        og_image, info = og_image_extractor.extract_og_image(url, use_cache=not data.get('no_cache'))
         
-        resp = requests.get(url, headers=headers, timeout=15)
-        if resp.status_code != 200:
-            return jsonify({'success': False, 'error': f'请求失败: {resp.status_code}'}), 400
-        
-        # 解析 HTML 提取 og:image
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        
-        # 尝试多种方式获取封面图
-        og_image = None
-        
-        # 1. og:image
-        og_tag = soup.find('meta', property='og:image')
-        if og_tag and og_tag.get('content'):
-            og_image = og_tag['content']
-        
-        # 2. twitter:image
-        if not og_image:
-            twitter_tag = soup.find('meta', attrs={'name': 'twitter:image'})
-            if twitter_tag and twitter_tag.get('content'):
-                og_image = twitter_tag['content']
-        
-        # 3. 微信文章特殊处理
-        if not og_image and 'mp.weixin.qq.com' in url:
-            # 微信文章的封面图可能在 msg_cdn_url 或 cover
-            import re
-            match = re.search(r'var\s+msg_cdn_url\s*=\s*["\']([^"\']+)["\']', resp.text)
-            if match:
-                og_image = match.group(1)
+        if info.get('status_code') != 200:
+            return jsonify({'success': False, 'error': f"请求失败: {info.get('status_code')}"}), 400
         
         if og_image:
-            # 确保是完整 URL
-            if og_image.startswith('//'):
-                og_image = 'https:' + og_image
-            elif not og_image.startswith('http'):
-                from urllib.parse import urljoin
-                og_image = urljoin(url, og_image)
-            
-            print(f"✅ 找到封面图: {og_image[:100]}...")
+            print(f"✅ 找到封面图（{info.get('source')}，{'缓存' if info.get('cached') else str(info.get('bytes')) + ' 字节'}）: {og_image[:100]}...")
             return jsonify({
                 'success': True,
                 'image_url': og_image
@@ -425,7 +455,8 @@ def extract_content():
     
     请求体（JSON）：
     {
-        "url": "https://mp.weixin.qq.com/s/..."
+        "url": "https://mp.weixin.qq.com/s/...",
+        "no_cache": false   // 可选，为 true 时跳过抓取缓存重新抓取
     }
     """
     try:
@@ -440,7 +471,7 @@ def extract_content():
         print(f"\n📥 收到内容提取请求: {url}")
         
         # 调用提取函数（包括OCR）
-        content = extract_content_from_url(url)
+        content = extract_content_from_url(url, use_cache=not _is_truthy(data.get('no_cache')))
         
         if content:
             return jsonify({
@@ -475,21 +506,36 @@ def ingest():
     
     或（Form Data，用于图片上传）：
     - file: 图片文件
+    
+    或（原始二进制，Content-Type: application/octet-stream 或 image/*）：
+    请求体直接为图片内容，type 固定为 image_url
+    
+    异步模式：JSON 中传 "async": true（或 URL 参数 ?async=1），
+    请求立即返回 202 和 job_id，通过 GET /api/jobs/<job_id> 查询进度和结果
+    
+    链接输入默认使用抓取缓存（同一篇文章不同跟踪参数视为同一链接），
+    传 "no_cache": true（或 ?no_cache=1）时重新抓取
     """
     try:
+        run_async = request.args.get('async') in ('1', 'true')
+        upload = _read_raw_upload()  # 上传的图片内容（UploadBuffer），处理结束后释放
+        
+        if upload is not None:
+            if not upload.size:
+                upload.close()
+                return jsonify({'error': '文件不能为空'}), 400
+            content = upload.source()
+            input_type = 'image_url'
         # 检查是否是文件上传
-        if 'file' in request.files:
+        elif 'file' in request.files:
             file = request.files['file']
             if file.filename:
-                # 保存临时文件
-                upload_dir = pathlib.Path(__file__).parent.parent / 'uploads'
-                upload_dir.mkdir(exist_ok=True)
-                filename = secure_filename(file.filename)
-                filepath = upload_dir / filename
-                file.save(str(filepath))
-                
-                # 使用文件路径
-                content = str(filepath)
+                upload = buffer_from_stream(file.stream, suffix=pathlib.Path(secure_filename(file.filename)).suffix)
+                run_async = run_async or request.form.get('async') in ('1', 'true')
+                if run_async:
+                    # 缓冲区由 request.files 持有，请求结束时会被关闭；异步任务需要接管
+                    upload = upload.detach()
+                content = upload.source()
                 input_type = 'image_url'
             else:
                 return jsonify({'error': '文件不能为空'}), 400
@@ -501,33 +547,54 @@ def ingest():
             
             content = data.get('content')
             input_type = data.get('type', 'text')
+            run_async = run_async or data.get('async') is True
             
             # 如果是图片 base64，需要先解码
-            if input_type == 'image_url' and content.startswith('data:image'):
-                # base64 图片，保存为临时文件
+            if input_type == 'image_url' and content and content.startswith('data:image'):
                 try:
-                    header, encoded = content.split(',', 1)
-                    image_data = base64.b64decode(encoded)
-                    upload_dir = pathlib.Path(__file__).parent.parent / 'uploads'
-                    upload_dir.mkdir(exist_ok=True)
-                    filepath = upload_dir / f'temp_{int(pathlib.Path(__file__).stat().st_mtime)}.jpg'
-                    with open(filepath, 'wb') as f:
-                        f.write(image_data)
-                    content = str(filepath)
+                    upload = buffer_from_data_url(content, suffix='.jpg')
+                    content = upload.source()
                 except Exception as e:
                     return jsonify({'error': f'图片解码失败: {e}'}), 400
         
-        if not content:
+        def cleanup():
+            if upload:
+                upload.close()
+        
+        if upload is None and not content:
             return jsonify({'error': 'content 字段不能为空'}), 400
         
         if input_type not in ['text', 'link', 'image_url']:
+            cleanup()
             return jsonify({'error': 'type 必须是 text, link 或 image_url'}), 400
         
+        use_cache = not _is_truthy(_request_option('no_cache'))
+        
         # 调用处理函数
-        print(f"\n📥 收到请求: type={input_type}, content={content[:50]}...")
+        preview = f'<上传图片 {upload.size} 字节>' if upload else content[:50]
+        print(f"\n📥 收到请求: type={input_type}, content={preview}...")
+        
+        if run_async:
+            try:
+                job = job_queue.submit(process_and_save, content, input_type, use_cache=use_cache,
+                                       cleanup=cleanup, meta={'type': input_type})
+            except QueueFullError as e:
+                cleanup()
+                return jsonify({'success': False, 'error': str(e)}), 503
+            
+            print(f"🧾 已加入任务队列: {job['id']}")
+            return jsonify({
+                'success': True,
+                'job_id': job['id'],
+                'status': job['status'],
+                'status_url': f"/api/jobs/{job['id']}"
+            }), 202
         
         try:
-            process_and_save(content, input_type)
+            try:
+                process_and_save(content, input_type, use_cache=use_cache)
+            finally:
+                cleanup()
             return jsonify({
                 'success': True,
                 'message': '内容已成功处理并保存到数据库'
@@ -542,6 +609,9 @@ def ingest():
                 'message': '处理失败，请检查内容格式'
             }), 500
             
+    except (HTTPException, UploadTooLarge):
+        # 请求体过大等 HTTP 错误交给对应的 errorhandler 处理
+        raise
     except Exception as e:
         print(f"❌ API 错误: {e}")
         import traceback
@@ -552,49 +622,113 @@ def ingest():
             'message': '服务器内部错误'
         }), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    查询异步采集任务状态
+    
+    返回：
+    {
+        "id": "...",
+        "status": "queued" | "running" | "succeeded" | "failed",
+        "stage": 当前阶段（fetch / ocr / parse / dedup / save）,
+        "stages": [{"name": ..., "started_at": ..., "finished_at": ...}],
+        "result": process_and_save 的返回值（包含解析出的 event）,
+        "error": 失败原因
+    }
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    return jsonify({'success': True, **job}), 200
+
+# 批量采集的默认并发数和上限
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 16))
+# 单次批量请求最多的条目数
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+
+def _process_batch_item(index, item):
+    """处理批量请求中的单个条目，异常只影响该条目"""
+    content = item.get('content') if isinstance(item, dict) else None
+    input_type = item.get('type', 'text') if isinstance(item, dict) else None
+    
+    if not content:
+        return {'index': index, 'success': False, 'error': 'content 不能为空'}
+    
+    try:
+        result = process_and_save(content, input_type, use_cache=not _is_truthy(item.get('no_cache')))
+        return {'index': index, 'success': True, 'message': '处理成功', 'result': result}
+    except Exception as e:
+        return {'index': index, 'success': False, 'error': str(e)}
+
 @app.route('/api/ingest/batch', methods=['POST'])
 def ingest_batch():
     """
-    批量处理多个内容
+    批量处理多个内容（并发处理，并发数由 concurrency 或 BATCH_CONCURRENCY 控制）
     
     请求体：
     {
         "items": [
             {"content": "...", "type": "text"},
             {"content": "...", "type": "link"}
-        ]
+        ],                    // 非空对象数组，最多 BATCH_MAX_ITEMS 条
+        "concurrency": 4,     // 可选，不超过 BATCH_MAX_CONCURRENCY
+        "stream": true        // 可选，以 NDJSON 流式返回
     }
+    
+    流式模式（stream 为 true 或 Accept: application/x-ndjson）：
+    每个条目完成后立即输出一行 {"index": 输入序号, "success": ..., ...}，
+    最后一行为 {"done": true, "total": ..., "success_count": ..., "results": [按输入顺序排列]}
     """
     try:
         data = request.get_json()
-        if not data or 'items' not in data:
+        if not isinstance(data, dict) or 'items' not in data:
             return jsonify({'error': '请求体必须包含 items 数组'}), 400
         
-        items = data.get('items', [])
-        results = []
-        
-        for item in items:
-            content = item.get('content')
-            input_type = item.get('type', 'text')
-            
-            if not content:
-                results.append({'success': False, 'error': 'content 不能为空'})
-                continue
-            
+        items = data['items']
+        if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+            return jsonify({'error': 'items 必须是非空的对象数组'}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({'error': f'items 最多 {BATCH_MAX_ITEMS} 条'}), 400
+        try:
+            concurrency = int(data.get('concurrency') or BATCH_CONCURRENCY)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'concurrency 必须是整数'}), 400
+        concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY, len(items) or 1))
+        stream = data.get('stream') is True or 'application/x-ndjson' in request.headers.get('Accept', '')
+        
+        def run():
+            """按完成顺序产出每个条目的结果"""
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ingest-batch')
             try:
-                process_and_save(content, input_type)
-                results.append({'success': True, 'message': '处理成功'})
-            except Exception as e:
-                results.append({'success': False, 'error': str(e)})
+                futures = [executor.submit(_process_batch_item, index, item) for index, item in enumerate(items)]
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                # 客户端断开时取消尚未开始的条目
+                executor.shutdown(wait=False, cancel_futures=True)
+        
+        def summary(results):
+            ordered = sorted(results, key=lambda r: r['index'])
+            return {
+                'success': True,
+                'total': len(items),
+                'success_count': sum(1 for r in ordered if r.get('success')),
+                'results': ordered
+            }
+        
+        if stream:
+            def generate():
+                results = []
+                for result in run():
+                    results.append(result)
+                    yield json.dumps(result, ensure_ascii=False) + '\n'
+                yield json.dumps({'done': True, **summary(results)}, ensure_ascii=False) + '\n'
+            
+            return Response(generate(), mimetype='application/x-ndjson')
         
-        success_count = sum(1 for r in results if r.get('success'))
-        
-        return jsonify({
-            'success': True,
-            'total': len(items),
-            'success_count': success_count,
-            'results': results
-        }), 200
+        return jsonify(summary(list(run()))), 200
         
     except Exception as e:
         return jsonify({
@@ -602,11 +736,63 @@ def ingest_batch():
             'error': str(e)
         }), 500
 
+def run_production(port, workers=None, threads=None):
+    """
+    使用 gunicorn 多进程 + 多线程模式启动（生产环境）
+    配置见 gunicorn_conf.py，命令行参数优先于环境变量
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("❌ 未安装 gunicorn，无法使用生产模式: pip install gunicorn")
+        sys.exit(1)
+    
+    class StandaloneApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+        
+        def load_config(self):
+            # 先加载 gunicorn_conf.py，再用命令行参数覆盖
+            import gunicorn_conf
+            for key in self.cfg.settings:
+                if hasattr(gunicorn_conf, key):
+                    self.cfg.set(key, getattr(gunicorn_conf, key))
+            for key, value in self.options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+        
+        def load(self):
+            return self.application
+    
+    if workers:
+        # 供各 worker 按 worker 数分配 OCR 进程数（image_ocr.ocr_process_count）
+        os.environ['API_WORKERS'] = str(workers)
+    options = {
+        'bind': f'0.0.0.0:{port}',
+        'workers': workers,
+        'threads': threads,
+    }
+    StandaloneApplication(app, options).run()
+
 if __name__ == '__main__':
-    port = int(os.getenv('API_PORT', 5001))  # 改为 5001，避免与 macOS AirPlay 冲突
-    print(f"🚀 AI 采集 API 服务启动在 http://localhost:{port}")
+    import argparse
+    parser = argparse.ArgumentParser(description='AI 采集 API 服务')
+    parser.add_argument('--mode', choices=['dev', 'prod'], default=os.getenv('API_MODE', 'dev'),
+                        help='dev: Flask 开发服务器（单进程，自动重载）；prod: gunicorn 多进程 worker 池')
+    parser.add_argument('--port', type=int, default=int(os.getenv('API_PORT', 5001)))  # 默认 5001，避免与 macOS AirPlay 冲突
+    parser.add_argument('--workers', type=int, default=None, help='worker 进程数（仅 prod 模式）')
+    parser.add_argument('--threads', type=int, default=None, help='每个 worker 的线程数（仅 prod 模式）')
+    args = parser.parse_args()
+    
+    port = args.port
+    print(f"🚀 AI 采集 API 服务启动在 http://localhost:{port}（{args.mode} 模式）")
     print(f"📝 健康检查: http://localhost:{port}/health")
     print(f"📥 采集接口: http://localhost:{port}/api/ingest")
     print(f"🔍 OCR 接口: http://localhost:{port}/api/ocr")
-    app.run(host='0.0.0.0', port=port, debug=True)
-
+    
+    if args.mode == 'prod':
+        run_production(port, workers=args.workers, threads=args.threads)
+    else:
+        app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+API 服务压测脚本
+依次以不同 worker 数启动 api_server.py（prod 模式），并发请求指定接口，
+输出每秒请求数随 worker 数的变化
+
+用法：
+    python3 bench_api_server.py                              # 默认压测 /health
+    python3 bench_api_server.py --workers 1 2 4 8 --threads 4
+    python3 bench_api_server.py --path /api/extract-content --body '{"url": "https://example.com"}'
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import pathlib
+import requests
+
+SCRIPT_DIR = pathlib.Path(__file__).parent
+
+
+def wait_until_ready(base_url, timeout=30):
+    """等待服务启动完成"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def run_load(base_url, path, body, concurrency, duration):
+    """并发压测，返回 (成功请求数, 失败请求数, 延迟列表)"""
+    ok = 0
+    failed = 0
+    latencies = []
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client():
+        nonlocal ok, failed
+        session = requests.Session()
+        while time.time() < stop_at:
+            start = time.perf_counter()
+            try:
+                if body is None:
+                    resp = session.get(f"{base_url}{path}", timeout=120)
+                else:
+                    resp = session.post(f"{base_url}{path}", json=body, timeout=120)
+                success = resp.status_code < 500
+            except requests.exceptions.RequestException:
+                success = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if success:
+                    ok += 1
+                    latencies.append(elapsed)
+                else:
+                    failed += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return ok, failed, latencies
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * pct / 100))
+    return values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='api_server.py 多 worker 压测')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=32, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=10, help='每轮压测时长（秒）')
+    parser.add_argument('--path', default='/health')
+    parser.add_argument('--body', default=None, help='POST 请求体（JSON 字符串），不填则使用 GET')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    body = json.loads(args.body) if args.body else None
+    base_url = f"http://127.0.0.1:{args.port}"
+    rows = []
+
+    for workers in args.workers:
+        print(f"\n🚀 启动服务: workers={workers}, threads={args.threads}")
+        proc = subprocess.Popen(
+            [sys.executable, str(SCRIPT_DIR / 'api_server.py'), '--mode', 'prod',
+             '--port', str(args.port), '--workers', str(workers), '--threads', str(args.threads)],
+            cwd=str(SCRIPT_DIR),
+            env={**os.environ, 'API_LOG_LEVEL': 'warning'},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not wait_until_ready(base_url):
+                print("❌ 服务启动超时，跳过")
+                continue
+            ok, failed, latencies = run_load(base_url, args.path, body, args.concurrency, args.duration)
+            rps = ok / args.duration
+            rows.append((workers, rps, percentile(latencies, 50), percentile(latencies, 99), failed))
+            print(f"✅ {ok} 个请求，{rps:.1f} req/s")
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    print("\n" + "=" * 60)
+    print(f"📊 压测结果: {args.path}（并发 {args.concurrency}，threads={args.threads}）")
+    print("=" * 60)
+    print(f"{'workers':>8} {'req/s':>10} {'p50(ms)':>10} {'p99(ms)':>10} {'失败':>6}")
+    for workers, rps, p50, p99, failed in rows:
+        print(f"{workers:>8} {rps:>10.1f} {p50 * 1000:>10.1f} {p99 * 1000:>10.1f} {failed:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+网页正文提取基准测试
+对比原实现（正则删除 script/style + BeautifulSoup 解析 + 多次 select / get_text）
+与 html_extract.parse_page（一次解析）在各解析器下的耗时
+
+用法：
+    python3 bench_html_extract.py --fixtures ./saved_pages    # 使用保存的微信文章 .html
+    python3 bench_html_extract.py                             # 未指定时生成模拟微信文章页面
+"""
+
+import argparse
+import pathlib
+import re
+import statistics
+import time
+
+from bs4 import BeautifulSoup
+
+import html_extract
+
+
+def generate_fixtures():
+    """生成模拟微信文章：head 中有大段脚本，正文由大量 section / span 组成（与真实页面相近）"""
+    head_scripts = '<script>' + 'var x = 1; if (a < b) { y(); }\n' * 3000 + '</script>'
+    style = '<style>' + '.rich_media_content p { margin: 0; }\n' * 500 + '</style>'
+    paragraphs = ''.join(
+        f'<section style="margin: 0 8px;"><p><span style="font-size: 15px;">第{i}段：活动时间、地点和报名方式等信息，'
+        f'欢迎同学们参加。</span></p><img data-src="https://mmbiz.qpic.cn/mmbiz_jpg/{i}/640?wx_fmt=jpeg" '
+        f'data-w="1080" data-ratio="0.5"></section>\n'
+        for i in range(300)
+    )
+    tail_scripts = ''.join(f'<script>var data{i} = {{"k": "{"v" * 200}"}};</script>' for i in range(50))
+    page = (f'<html><head><meta charset="utf-8"><title>活动预告</title>{head_scripts}{style}</head><body>'
+            f'<h1 class="rich_media_title" id="activity-name">活动预告</h1>'
+            f'<div class="rich_media_content" id="js_content">{paragraphs}</div>{tail_scripts}</body></html>')
+    return {'wechat_article.html': page}
+
+
+def legacy_extract(page):
+    """原实现：_clean_html_content + _extract_wechat_content 的解析部分，普通网页路径再解析一次"""
+    html = re.sub(r'<script[^>]*>.*?</script>', '', page, flags=re.DOTALL | re.IGNORECASE)
+    html = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
+    soup = BeautifulSoup(html, 'html.parser')
+    soup.get_text()
+    parts = []
+    for selector in ['#js_content', '.rich_media_content', '#activity-name', '.rich_media_title']:
+        for elem in soup.select(selector):
+            text = elem.get_text(separator='\n', strip=True)
+            if text and len(text) > 20:
+                parts.append(text)
+    area = soup.select_one('#js_content, .rich_media_content')
+    images = [img.get('data-src') or img.get('src') for img in area.find_all('img')] if area else []
+    # 内容不足时走普通网页路径：重新解析并取全部文字
+    BeautifulSoup(html, 'html.parser').get_text(separator='\n', strip=True)
+    return parts, images
+
+
+def bench(func, page, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(page)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='网页正文提取基准测试')
+    parser.add_argument('--fixtures', help='保存的 .html 页面目录')
+    parser.add_argument('--rounds', type=int, default=10, help='每个页面重复次数')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        fixtures = {p.name: p.read_text(encoding='utf-8', errors='replace')
+                    for p in sorted(pathlib.Path(args.fixtures).glob('*.html'))}
+    else:
+        fixtures = generate_fixtures()
+
+    names = html_extract.available_parsers()
+    print(f"\n{'页面':<28}{'大小 KB':>9}{'原实现 ms':>12}" + ''.join(f'{n + " ms":>14}' for n in names))
+    for name, page in fixtures.items():
+        legacy = bench(legacy_extract, page, args.rounds)
+        row = f"{name:<28}{len(page.encode()) / 1024:>9.0f}{legacy:>12.1f}"
+        for parser_name in names:
+            elapsed = bench(lambda p: html_extract.parse_page(p, parser_name), page, args.rounds)
+            row += f"{f'{elapsed:.1f} ({legacy / elapsed:.0f}x)':>14}"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+共享 HTTP 连接池基准测试
+本地 HTTP/1.1 服务模拟「文章页面 + 多张 mmbiz 图片」，对比每次单独 requests.get（每个请求新建连接）
+与 http_client 共享连接池（keep-alive）下每篇文章的抓取耗时
+
+--connect-delay 模拟每次新建连接的开销（真实环境中是 TCP + TLS 握手，跨网络通常为数十毫秒）
+
+用法：
+    python3 bench_http_client.py --articles 20 --images 8 --connect-delay 30
+"""
+
+import argparse
+import http.server
+import statistics
+import threading
+import time
+
+import requests
+
+import http_client
+
+
+def make_server(page_size, image_size, connect_delay):
+    page = b'<html><head></head><body>' + b'x' * page_size + b'</body></html>'
+    image = b'\xff\xd8' + b'\0' * image_size
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+
+        def setup(self):
+            # 每个新连接只执行一次，模拟握手耗时
+            time.sleep(connect_delay)
+            super().setup()
+
+        def do_GET(self):
+            body = page if self.path.startswith('/s/') else image
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html' if body is page else 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch_article(get, base, index, images):
+    """与抓取微信文章的流程一致：先取正文，再逐张下载图片"""
+    get(f'{base}/s/article{index}', timeout=30).content
+    for i in range(images):
+        get(f'{base}/mmbiz_jpg/{index}/{i}?wx_fmt=jpeg', timeout=15).content
+
+
+def run(label, get, base, articles, images):
+    times = []
+    for index in range(articles):
+        start = time.perf_counter()
+        fetch_article(get, base, index, images)
+        times.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<28} 平均 {statistics.mean(times):>8.1f} ms   中位数 {statistics.median(times):>8.1f} ms   "
+          f"最慢 {max(times):>8.1f} ms")
+    return statistics.mean(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='共享 HTTP 连接池基准测试')
+    parser.add_argument('--articles', type=int, default=20)
+    parser.add_argument('--images', type=int, default=8, help='每篇文章的图片数')
+    parser.add_argument('--page-kb', type=int, default=200)
+    parser.add_argument('--image-kb', type=int, default=100)
+    parser.add_argument('--connect-delay', type=float, default=30, help='每次新建连接的模拟耗时（毫秒）')
+    args = parser.parse_args()
+
+    server = make_server(args.page_kb * 1024, args.image_kb * 1024, args.connect_delay / 1000)
+    base = f'http://127.0.0.1:{server.server_port}'
+    print(f"📄 {args.articles} 篇文章 × (1 个页面 + {args.images} 张图片)，新建连接耗时 {args.connect_delay} ms\n")
+
+    legacy = run('requests.get（每次新建连接）', requests.get, base, args.articles, args.images)
+    http_client.reset()
+    pooled = run('http_client（共享连接池）', http_client.get, base, args.articles, args.images)
+    print(f"\n⚡ 每篇文章平均耗时减少 {(1 - pooled / legacy) * 100:.0f}%")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
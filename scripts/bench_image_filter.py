@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+图片预筛选基准测试
+生成模拟微信文章（文字海报、照片、GIF 表情、分割线、二维码、重复的品牌条等），
+在本地 HTTP 服务上对比预筛选前后的 OCR 调用次数、下载字节数和耗时（OCR 用固定耗时模拟）
+
+用法：
+    python3 bench_image_filter.py
+    python3 bench_image_filter.py --articles 20 --ocr-delay 0.5
+"""
+
+import argparse
+import http.server
+import io
+import random
+import tempfile
+import threading
+import time
+
+from bs4 import BeautifulSoup
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+import image_filter
+import image_ocr
+from result_cache import ResultCache
+
+
+def _encode(image, fmt):
+    buf = io.BytesIO()
+    image.save(buf, fmt)
+    return buf.getvalue()
+
+
+def _poster(seed, height=1400):
+    image = Image.new('RGB', (1080, height), 'white')
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=36)
+    for y in range(40, height - 40, 60):
+        draw.text((40, y), f'Activity {seed}: lecture at Room {y}, sign up before Friday', fill='black', font=font)
+    return _encode(image, 'JPEG')
+
+
+def _photo(seed):
+    gradient = Image.linear_gradient('L').rotate(seed * 37).resize((1080, 720)).convert('RGB')
+    noise = Image.effect_noise((1080, 720), 30).convert('RGB')
+    return _encode(Image.blend(gradient, noise, 0.3).filter(ImageFilter.GaussianBlur(3)), 'JPEG')
+
+
+def _qrcode(seed):
+    rng = random.Random(seed)
+    image = Image.new('L', (430, 430), 255)
+    draw = ImageDraw.Draw(image)
+    for i in range(43):
+        for j in range(43):
+            if rng.random() < 0.5:
+                draw.rectangle([j * 10, i * 10, j * 10 + 9, i * 10 + 9], fill=0)
+    return _encode(image, 'PNG')
+
+
+def generate_fixtures(articles):
+    """
+    返回 (图片 {路径: bytes}, 文章 HTML 列表)
+    每篇文章：3 张文字海报、1 张照片、2 个 GIF 表情、2 条分割线、1 个二维码、1 个装饰图标、
+    重复出现 3 次的品牌条（同一张图片，URL 尺寸段不同），以及 1 张没有尺寸属性的分割线
+    """
+    images = {}
+    pages = []
+    sticker = _encode(Image.new('RGB', (240, 240), 'yellow'), 'GIF')
+    divider = _encode(Image.new('RGB', (1080, 24), (200, 200, 200)), 'PNG')
+    icon = _encode(Image.new('RGB', (64, 64), 'red'), 'PNG')
+    banner = _poster('brand', height=300)
+    for a in range(articles):
+        imgs = []
+
+        def add(name, data, fmt, attrs='', size='640'):
+            images[f'/mmbiz_{fmt}/{name}'] = data
+            imgs.append(f'<img data-src="{{base}}/mmbiz_{fmt}/{name}/{size}?wx_fmt={fmt}" {attrs}>')
+
+        for i in range(3):
+            add(f'poster{a}_{i}', _poster(a * 10 + i), 'jpeg', 'data-w="1080" data-ratio="1.296"')
+        add(f'photo{a}', _photo(a), 'jpeg', 'data-w="1080" data-ratio="0.667"')
+        for i in range(2):
+            add(f'sticker{a}_{i}', sticker, 'gif', 'data-w="240" data-ratio="1"')
+            add(f'divider{a}_{i}', divider, 'png', 'data-w="1080" data-ratio="0.022"')
+        add(f'qrcode{a}', _qrcode(a), 'png', 'data-w="430" data-ratio="1"')
+        add(f'icon{a}', icon, 'png', 'data-w="64" data-ratio="1"')
+        for size in ('640', '0', '640'):
+            add('banner', banner, 'jpeg', 'data-w="1080" data-ratio="0.278"', size=size)
+        add(f'divider_noattr{a}', divider, 'png')
+        pages.append('<div id="js_content">' + '\n'.join(imgs) + '</div>')
+    return images, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片预筛选基准测试')
+    parser.add_argument('--articles', type=int, default=10, help='模拟文章数')
+    parser.add_argument('--ocr-delay', type=float, default=0.2, help='模拟的单张 OCR 耗时（秒）')
+    args = parser.parse_args()
+
+    images, pages = generate_fixtures(args.articles)
+    served = {'bytes': 0}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = images[self.path.split('?')[0].rsplit('/', 1)[0]]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                # 分块写出，客户端中断下载时只统计实际发送的字节
+                for start in range(0, len(body), 8192):
+                    self.wfile.write(body[start:start + 8192])
+                    served['bytes'] += len(body[start:start + 8192])
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *a):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{httpd.server_port}'
+
+    calls = {'count': 0}
+
+    def fake_ocr(data):
+        calls['count'] += 1
+        time.sleep(args.ocr_delay)
+        return 'x' * 20, args.ocr_delay
+
+    # OCR 用线程模拟，计数函数不需要能被子进程导入
+    image_ocr.OCR_PROCESSES = 0
+
+    def run(prefilter):
+        image_filter.IMAGE_PREFILTER = prefilter
+        # 每轮使用空的识别结果缓存，避免第二轮直接命中第一轮的结果
+        image_ocr.ocr_cache = ResultCache('bench_image_ocr', 'v1', cache_dir=tempfile.mkdtemp())
+        calls['count'] = 0
+        served['bytes'] = 0
+        total = 0
+        start = time.perf_counter()
+        for page in pages:
+            soup = BeautifulSoup(page.replace('{base}', base), 'html.parser')
+            items = [(idx, img['data-src'], img.attrs) for idx, img in enumerate(soup.find_all('img'))]
+            total += len(items)
+            image_ocr.ocr_image_urls(items, ocr_func=fake_ocr, budget=600)
+        return total, calls['count'], served['bytes'], time.perf_counter() - start
+
+    total, before_calls, before_bytes, before_time = run(False)
+    _, after_calls, after_bytes, after_time = run(True)
+    httpd.shutdown()
+
+    print(f"\n{'':<10}{'OCR 调用':>10}{'下载 KB':>12}{'耗时 s':>10}")
+    print(f"{'无预筛选':<10}{before_calls:>10}{before_bytes / 1024:>12.0f}{before_time:>10.2f}")
+    print(f"{'预筛选':<10}{after_calls:>10}{after_bytes / 1024:>12.0f}{after_time:>10.2f}")
+    print(f"\n{args.articles} 篇文章共 {total} 张图片，预筛选减少 {before_calls - after_calls} 次 OCR "
+          f"（{(before_calls - after_calls) / max(before_calls, 1):.0%}）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+og:image 提取基准测试
+在本地 HTTP 服务上对比原实现（完整下载 + BeautifulSoup）与只读 <head> 的新实现，
+输出每个页面的延迟和下载字节数
+
+用法：
+    python3 bench_og_image.py --fixtures ./saved_pages    # 使用保存的 .html 页面
+    python3 bench_og_image.py                             # 未指定时生成模拟微信文章页面
+"""
+
+import argparse
+import http.server
+import pathlib
+import re
+import threading
+import time
+
+import requests
+from bs4 import BeautifulSoup
+
+import http_client
+import og_image
+
+
+def generate_fixtures():
+    """生成模拟页面：正文大小与真实微信文章相近（数百 KB）"""
+    body = ''.join(
+        f'<section><p>第{i}段：这里是活动介绍正文，包含时间、地点和报名方式等信息。</p>'
+        f'<img data-src="https://mmbiz.qpic.cn/mmbiz_jpg/{i}/640?wx_fmt=jpeg"></section>\n'
+        for i in range(3000)
+    )
+    script = '<script>var msg_cdn_url = "http://mmbiz.qpic.cn/mmbiz_jpg/cover/0?wx_fmt=jpeg";</script>'
+    head_scripts = '<script>' + 'var x = 1;' * 2000 + '</script>'
+    return {
+        'wechat_og.html': f'<html><head><meta charset="utf-8">{head_scripts}'
+                          f'<meta property="og:image" content="https://mmbiz.qpic.cn/cover.jpg">'
+                          f'</head><body>{body}{script}</body></html>',
+        'wechat_cdn_only.html': f'<html><head><meta charset="utf-8">{head_scripts}</head>'
+                                f'<body>{body[:len(body) // 3]}{script}{body}</body></html>',
+        'generic_twitter.html': f'<html><head><meta name="twitter:image" content="/static/cover.png">'
+                                f'</head><body>{body}</body></html>',
+    }
+
+
+def legacy_extract(url):
+    """原实现：下载完整 HTML 后用 BeautifulSoup 解析"""
+    resp = requests.get(url, headers=http_client.DEFAULT_HEADERS, timeout=15)
+    soup = BeautifulSoup(resp.text, 'html.parser')
+    image = None
+    tag = soup.find('meta', property='og:image')
+    if tag and tag.get('content'):
+        image = tag['content']
+    if not image:
+        tag = soup.find('meta', attrs={'name': 'twitter:image'})
+        if tag and tag.get('content'):
+            image = tag['content']
+    if not image:
+        m = re.search(r'var\s+msg_cdn_url\s*=\s*["\']([^"\']+)["\']', resp.text)
+        if m:
+            image = m.group(1)
+    return image, len(resp.content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='og:image 提取基准测试')
+    parser.add_argument('--fixtures', help='保存的 HTML 页面目录')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        pages = {p.name: p.read_text(encoding='utf-8', errors='replace')
+                 for p in sorted(pathlib.Path(args.fixtures).glob('*.html'))}
+    else:
+        pages = generate_fixtures()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            name = self.path.split('/')[-1].split('?')[0]
+            content = pages.get(name, '').encode('utf-8')
+            self.send_response(200 if name in pages else 404)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            try:
+                self.wfile.write(content)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 新实现读到 </head> 后主动断开
+
+        def log_message(self, *a):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # 以 mp.weixin.qq.com 路径模拟微信链接，触发 msg_cdn_url 查找
+    base = f'http://127.0.0.1:{server.server_port}/mp.weixin.qq.com/s'
+
+    print(f"{'页面':<24} {'大小(KB)':>9} {'原实现(ms)':>11} {'原下载(KB)':>11} {'新实现(ms)':>11} {'新下载(KB)':>11} {'缓存(ms)':>9}  来源")
+    print('-' * 110)
+    for name, content in pages.items():
+        url = f'{base}/{name}'
+        legacy_ms, new_ms = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            legacy_image, legacy_bytes = legacy_extract(url)
+            legacy_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            image, info = og_image.fetch_og_image(url)
+            new_ms.append((time.perf_counter() - start) * 1000)
+        og_image.extract_og_image(url)
+        start = time.perf_counter()
+        og_image.extract_og_image(url)
+        cached_ms = (time.perf_counter() - start) * 1000
+        match = '' if (image or '').endswith((legacy_image or '').split('/')[-1]) else '  ⚠️ 结果不一致'
+        print(f"{name[:24]:<24} {len(content.encode()) / 1024:>9.0f} {min(legacy_ms):>11.1f} {legacy_bytes / 1024:>11.0f} "
+              f"{min(new_ms):>11.1f} {info['bytes'] / 1024:>11.0f} {cached_ms:>9.3f}  {info['source']}{match}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
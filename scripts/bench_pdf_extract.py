@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+PDF 文字提取基准测试
+对比各后端（pdfplumber / PyMuPDF / PyPDF2）串行与按页并行提取的耗时
+
+用法：
+    python3 bench_pdf_extract.py --dir ./sample_pdfs       # 使用目录中的 PDF
+    python3 bench_pdf_extract.py                           # 未指定时用 PyMuPDF 生成示例 PDF
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+import pdf_tools
+
+
+def generate_samples(pages_list):
+    """生成带多行文字的示例 PDF（需要 PyMuPDF）"""
+    try:
+        import fitz
+    except ImportError:
+        print("❌ 未指定 --dir 且未安装 PyMuPDF，无法生成示例 PDF")
+        sys.exit(1)
+
+    samples = []
+    for pages in pages_list:
+        doc = fitz.open()
+        for i in range(pages):
+            page = doc.new_page()
+            for line in range(40):
+                page.insert_text((50, 40 + line * 18), f"Campus recruiting brochure page {i + 1} line {line + 1} 2026 Spring")
+        samples.append((f'generated_{pages}p.pdf', doc.tobytes()))
+        doc.close()
+    return samples
+
+
+def legacy_extract(data):
+    """原实现：pdfplumber 串行提取 + 字符串拼接"""
+    import io
+    import pdfplumber
+    text = ""
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for page in pdf.pages:
+            text += page.extract_text() or ""
+    return text
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF 文字提取基准测试')
+    parser.add_argument('--dir', help='PDF 样本目录')
+    parser.add_argument('--pages', type=int, nargs='+', default=[4, 40, 120], help='生成示例 PDF 的页数')
+    parser.add_argument('--workers', type=int, default=pdf_tools.PDF_WORKERS)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.dir:
+        samples = [(p.name, p.read_bytes()) for p in sorted(pathlib.Path(args.dir).glob('*.pdf'))]
+    else:
+        samples = generate_samples(args.pages)
+    if not samples:
+        print("❌ 没有找到 PDF 样本")
+        return
+
+    backends = pdf_tools.available_backends()
+    print(f"📦 可用后端: {', '.join(backends)}，并行进程数: {args.workers}")
+
+    # 预热进程池，避免把进程启动时间计入第一轮
+    if args.workers > 1:
+        list(pdf_tools.iter_pdf_text(samples[-1][1], backend=backends[0], workers=args.workers))
+
+    print(f"\n{'文件':<24} {'页数':>5} {'方式':<22} {'耗时(ms)':>10}")
+    print("-" * 66)
+    for name, data in samples:
+        pages = pdf_tools.page_count(data, backends[0])
+        rows = []
+        if 'pdfplumber' in backends:
+            rows.append(('legacy (pdfplumber +=)', timed(lambda: legacy_extract(data), args.repeat)))
+        for backend in backends:
+            rows.append((f'{backend} 串行', timed(
+                lambda: pdf_tools.extract_pdf_text(data, backend=backend, workers=1), args.repeat)))
+            if args.workers > 1:
+                rows.append((f'{backend} 并行', timed(
+                    lambda: pdf_tools.extract_pdf_text(data, backend=backend, workers=args.workers), args.repeat)))
+        for label, elapsed in rows:
+            print(f"{name[:24]:<24} {pages:>5} {label:<22} {elapsed * 1000:>10.1f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
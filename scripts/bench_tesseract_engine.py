@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+tesseract 常驻引擎基准测试
+对比每张图片启动一个 tesseract 子进程（pytesseract，原实现）与每个 OCR 进程一个常驻引擎（tesserocr）的每秒识别图片数。
+默认生成一组模拟海报（中英文活动信息，尺寸和微信文章配图相近），也可以用 --images 指定真实海报目录
+
+用法：
+    python3 bench_tesseract_engine.py
+    python3 bench_tesseract_engine.py --count 40 --processes 4
+    python3 bench_tesseract_engine.py --images ~/posters
+"""
+
+import argparse
+import io
+import os
+import pathlib
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+
+import tesseract_engine
+
+
+def _poster(seed):
+    image = Image.new('RGB', (1080, 1400 + seed % 5 * 100), 'white')
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=36)
+    for y in range(40, image.height - 40, 70):
+        draw.text((40, y), f'Lecture {seed}: AI and Future Education, Room A{500 + y // 70}, 14:00', fill='black', font=font)
+    buf = io.BytesIO()
+    image.save(buf, 'JPEG', quality=90)
+    return buf.getvalue()
+
+
+def load_images(args):
+    if args.images:
+        paths = sorted(p for p in pathlib.Path(args.images).expanduser().iterdir()
+                       if p.suffix.lower() in ('.jpg', '.jpeg', '.png', '.webp'))
+        return [p.read_bytes() for p in paths[:args.count]]
+    return [_poster(i) for i in range(args.count)]
+
+
+def _init(mode):
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    tesseract_engine.TESSERACT_ENGINE = mode
+    tesseract_engine.warm_up()
+
+
+def _recognize(data):
+    return tesseract_engine.image_to_string(Image.open(io.BytesIO(data)))
+
+
+def run(images, mode, processes):
+    """在 processes 个 OCR 进程中识别全部图片，返回 (每秒图片数, 识别出的字符数)；进程启动和预热不计入"""
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init, initargs=(mode,),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        # 先让每个进程完成启动和预热
+        list(executor.map(_recognize, images[:processes]))
+        start = time.perf_counter()
+        texts = list(executor.map(_recognize, images))
+        elapsed = time.perf_counter() - start
+    return len(images) / elapsed, sum(len(t.strip()) for t in texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='tesseract 常驻引擎基准测试')
+    parser.add_argument('--count', type=int, default=24, help='图片数量')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='OCR 进程数')
+    parser.add_argument('--images', help='真实海报目录（默认生成模拟海报）')
+    args = parser.parse_args()
+
+    labels = {'subprocess': 'pytesseract 子进程', 'auto': 'tesserocr 常驻引擎'}
+    modes = (['subprocess'] if tesseract_engine.PYTESSERACT_AVAILABLE else []) + \
+            (['auto'] if tesseract_engine.TESSEROCR_AVAILABLE else [])
+    if not modes:
+        print("❌ 未找到 tesseract 命令，也未安装 tesserocr，无法运行基准测试")
+        return
+    if len(modes) == 1:
+        print(f"⚠️ 只能测试 {labels[modes[0]]}（另一种方式不可用）")
+    images = load_images(args)
+    print(f"📷 {len(images)} 张图片，{args.processes} 个 OCR 进程")
+    results = {mode: run(images, mode, args.processes) for mode in modes}
+
+    print(f"\n{'':<22}{'图片/秒':>10}{'字符数':>10}")
+    for mode, (rate, chars) in results.items():
+        print(f"{labels[mode]:<22}{rate:>10.2f}{chars:>10}")
+    if len(results) == 2:
+        print(f"\n常驻引擎吞吐量为子进程方式的 {results['auto'][0] / results['subprocess'][0]:.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
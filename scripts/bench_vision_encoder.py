@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+视觉模型图片编码基准测试
+生成几类常见输入（手机截图 PNG、750×8000 长海报、PNG 海报、小尺寸 JPEG），对比原图直接上传与 vision_encoder 编码后的：
+- 上传字节数（base64 之前）和编码耗时
+- 按上行带宽估算的上传耗时，编码耗时 + 上传耗时即端到端延迟的变化
+配置了 ZHIPU_API_KEY 并加 --live 时，实际调用 GLM-4V，对比原图和编码后图片的完整请求耗时
+
+用法：
+    python3 bench_vision_encoder.py
+    python3 bench_vision_encoder.py --uplink-mbps 5
+    python3 bench_vision_encoder.py --live
+"""
+
+import argparse
+import base64
+import io
+import os
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+import vision_encoder
+
+
+def _encode(image, fmt, **kwargs):
+    buf = io.BytesIO()
+    image.save(buf, fmt, **kwargs)
+    return buf.getvalue()
+
+
+def _text_image(size, font_size, background='white'):
+    image = Image.new('RGB', size, background)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=font_size)
+    for i, y in enumerate(range(20, size[1] - font_size, font_size * 2)):
+        draw.text((20, y), f'Item {i}: Career fair, Jianhua Building A509, 14:00-17:00', fill='black', font=font)
+    return image
+
+
+def fixtures():
+    screenshot = _text_image((1242, 2688), 36)
+    screenshot.paste(Image.effect_noise((1242, 700), 50).convert('RGB'), (0, 0))
+    poster = _text_image((750, 8000), 28, background=(250, 235, 210))
+    png_poster = _text_image((1080, 1920), 48, background=(220, 235, 250))
+    small = _text_image((600, 400), 24)
+    return [
+        ('手机截图 PNG 1242×2688', _encode(screenshot, 'PNG')),
+        ('长海报 JPEG 750×8000', _encode(poster, 'JPEG', quality=95)),
+        ('海报 PNG 1080×1920', _encode(png_poster, 'PNG')),
+        ('小图 JPEG 600×400', _encode(small, 'JPEG', quality=85)),
+    ]
+
+
+def _glm_latency(client, model, url):
+    start = time.perf_counter()
+    client.chat.completions.create(model=model, messages=[{'role': 'user', 'content': [
+        {'type': 'image_url', 'image_url': {'url': url}},
+        {'type': 'text', 'text': '请提取图片中的所有文字'},
+    ]}])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='视觉模型图片编码基准测试')
+    parser.add_argument('--uplink-mbps', type=float, default=20, help='估算上传耗时使用的上行带宽（Mbps）')
+    parser.add_argument('--live', action='store_true', help='实际调用 GLM-4V（需要 ZHIPU_API_KEY）')
+    args = parser.parse_args()
+
+    client = None
+    if args.live:
+        if not os.getenv('ZHIPU_API_KEY'):
+            print("⚠️ 未配置 ZHIPU_API_KEY，跳过实际调用")
+        else:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv('ZHIPU_API_KEY'),
+                            base_url=os.getenv('ZHIPU_BASE_URL', 'https://open.bigmodel.cn/api/paas/v4'))
+    model = os.getenv('ZHIPU_MODEL', 'glm-4v')
+    bytes_per_second = args.uplink_mbps * 1e6 / 8
+
+    print(f"{'':<24}{'原图 KB':>10}{'编码后 KB':>11}{'编码 ms':>9}{'上传 s':>16}{'端到端 s':>16}")
+    total_before = total_after = 0
+    time_before = time_after = 0.0
+    for name, data in fixtures():
+        start = time.perf_counter()
+        encoded, mime = vision_encoder.encode_image(data)
+        encode_seconds = time.perf_counter() - start
+        # base64 使上传体积增加 1/3
+        upload_before = len(data) * 4 / 3 / bytes_per_second
+        upload_after = len(encoded) * 4 / 3 / bytes_per_second
+        before, after = upload_before, encode_seconds + upload_after
+        if client is not None:
+            before = _glm_latency(client, model, f'data:image/jpeg;base64,{base64.b64encode(data).decode()}')
+            after = encode_seconds + _glm_latency(client, model, f'data:{mime};base64,{base64.b64encode(encoded).decode()}')
+        total_before += len(data)
+        total_after += len(encoded)
+        time_before += before
+        time_after += after
+        print(f"{name:<24}{len(data) / 1024:>10.0f}{len(encoded) / 1024:>11.0f}{encode_seconds * 1000:>9.0f}"
+              f"{upload_before:>8.2f}->{upload_after:<6.2f}{before:>8.2f}->{after:<6.2f}")
+
+    saved = total_before - total_after
+    print(f"\n共节省 {saved / 1024:.0f} KB（{saved / max(total_before, 1):.0%}）；"
+          f"{'实际调用' if client else f'按 {args.uplink_mbps:g} Mbps 估算'}的端到端耗时 {time_before:.2f}s -> {time_after:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+常驻 Playwright 浏览器池
+原实现每次抓取都要 sync_playwright() + chromium.launch()，冷启动就要数秒。
+这里每个进程保持 BROWSER_POOL_SIZE 个已启动的浏览器，抓取时租用一个，用完归还：
+- 浏览器上下文（context）复用，每次租用只新建一个页面
+- 租用前检查浏览器是否仍然连接，崩溃或出错后自动重新启动
+- 每个浏览器处理 BROWSER_MAX_PAGES 个页面后回收重启，避免内存持续增长
+- 页面操作超过 BROWSER_TASK_TIMEOUT 秒未完成（如 page.evaluate 一直不返回，Playwright 自身的超时管不到）时，
+  结束该浏览器进程使阻塞的调用返回，并用新启动的浏览器线程替换它，租用名额不会被卡住的页面耗尽
+
+Playwright 同步 API 的对象只能在创建它的线程中使用，因此每个浏览器都有自己的线程，
+调用方通过 run(func) 把操作交给该线程执行，func(page) 的返回值应为普通数据（不要返回页面元素）
+"""
+
+import os
+import queue
+import atexit
+import signal
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+try:
+    from playwright.sync_api import sync_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 2))
+# 每个浏览器处理多少个页面后重启
+BROWSER_MAX_PAGES = int(os.getenv('BROWSER_MAX_PAGES', 50))
+# 等待空闲浏览器的最长时间（秒）
+BROWSER_LEASE_TIMEOUT = float(os.getenv('BROWSER_LEASE_TIMEOUT', 30))
+# 单次页面操作（func(page)）的最长时间（秒），应大于页面加载和等待条件的超时之和
+BROWSER_TASK_TIMEOUT = float(os.getenv('BROWSER_TASK_TIMEOUT', 90))
+# 不加载图片、字体和音视频（只需要正文文字和图片地址）
+BROWSER_BLOCK_RESOURCES = os.getenv('BROWSER_BLOCK_RESOURCES', '1').lower() in ('1', 'true')
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font'}
+
+
+class BrowserPoolUnavailable(RuntimeError):
+    """Playwright 未安装或浏览器池已关闭"""
+
+
+class BrowserPoolTimeout(RuntimeError):
+    """等待空闲浏览器超时"""
+
+
+class BrowserTaskTimeout(BrowserPoolTimeout):
+    """页面操作超时（该浏览器已被关闭并替换）"""
+
+
+def _kill(pid):
+    """强制结束浏览器进程（阻塞中的页面调用随即因连接断开抛出异常）"""
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _block_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        route.abort()
+    else:
+        route.continue_()
+
+
+class _BrowserWorker:
+    """一个浏览器实例及其所属线程"""
+
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.tasks = queue.Queue()
+        self.pages_served = 0
+        self.launches = 0
+        self.lock = threading.Lock()
+        self.current = None      # 正在执行的任务的 Future
+        self.abandoned = False   # 页面操作超时后被替换，任务结束后退出线程
+        self.pid = None          # 浏览器主进程号，页面操作卡住时从调用方线程结束该进程
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self.thread = threading.Thread(target=self._loop, name=f'browser-{index}', daemon=True)
+        self.thread.start()
+
+    def _ensure_browser(self):
+        """健康检查：浏览器断开（崩溃）时重新启动"""
+        if self._browser is not None and not self._browser.is_connected():
+            print(f"⚠️ 浏览器 {self.index} 已断开，重新启动")
+            self._close_browser()
+        if self._browser is None:
+            if self._playwright is None:
+                self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(headless=True, args=['--disable-dev-shm-usage'])
+            self.pid = self._browser_pid()
+            self.pages_served = 0
+            self.launches += 1
+        if self._context is None:
+            self._context = self._browser.new_context(user_agent=USER_AGENT, viewport={'width': 1920, 'height': 1080})
+            if BROWSER_BLOCK_RESOURCES:
+                self._context.route('**/*', _block_resources)
+
+    def _browser_pid(self):
+        """通过 CDP 查询浏览器主进程号（Playwright 没有公开启动的浏览器进程）"""
+        try:
+            session = self._browser.new_browser_cdp_session()
+            try:
+                processes = session.send('SystemInfo.getProcessInfo')['processInfo']
+            finally:
+                session.detach()
+        except Exception as e:
+            print(f"⚠️ 无法获取浏览器 {self.index} 的进程号: {e}")
+            return None
+        return next((p['id'] for p in processes if p['type'] == 'browser'), None)
+
+    def _close_browser(self):
+        for obj in (self._context, self._browser):
+            if obj is not None:
+                try:
+                    obj.close()
+                except Exception:
+                    pass
+        self._context = None
+        self._browser = None
+        self.pid = None
+
+    def _loop(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            func, future = task
+            with self.lock:
+                self.current = future
+            if future.set_running_or_notify_cancel():
+                try:
+                    self._ensure_browser()
+                    page = self._context.new_page()
+                    try:
+                        future.set_result(func(page))
+                    finally:
+                        page.close()
+                except Exception as e:
+                    future.set_exception(e)
+                    # 出错后丢弃上下文（可能残留异常状态），下次租用时重新创建
+                    if self._context is not None:
+                        try:
+                            self._context.close()
+                        except Exception:
+                            pass
+                        self._context = None
+                self.pages_served += 1
+                if self.pages_served >= BROWSER_MAX_PAGES:
+                    self._close_browser()
+            with self.lock:
+                self.current = None
+                abandoned = self.abandoned
+            if abandoned:
+                break
+            self.pool._release(self)
+
+        self._close_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+
+    def abort(self, future):
+        """
+        页面操作超时（在调用方线程中调用）：标记为已放弃，并结束浏览器进程使阻塞中的页面调用抛出异常返回
+        任务已经结束时返回 False。Playwright 同步 API 不能跨线程调用，这里直接结束启动时记下的浏览器进程
+        """
+        with self.lock:
+            if self.current is not future:
+                return False
+            self.abandoned = True
+        pid = self.pid
+        if pid is not None:
+            _kill(pid)
+        else:
+            print(f"⚠️ 浏览器 {self.index} 的进程号未知，卡住的页面调用只能等它自行返回")
+        return True
+
+
+class BrowserPool:
+    def __init__(self, size=BROWSER_POOL_SIZE):
+        self.size = size
+        self._idle = None
+        self._workers = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _ensure_started(self):
+        # 按进程懒启动：gunicorn fork 出的 worker 不能使用 master 中的浏览器
+        with self._lock:
+            if self._closed:
+                raise BrowserPoolUnavailable('浏览器池已关闭')
+            if self._pid != os.getpid():
+                self._idle = queue.Queue()
+                self._workers = [_BrowserWorker(self, i) for i in range(self.size)]
+                for worker in self._workers:
+                    self._idle.put(worker)
+                self._pid = os.getpid()
+
+    def _release(self, worker):
+        if self._pid == os.getpid():
+            self._idle.put(worker)
+
+    def _replace(self, worker):
+        """用新的浏览器线程替换卡住的 worker（旧线程在页面调用返回后自行退出）"""
+        with self._lock:
+            if self._pid != os.getpid() or self._closed:
+                return
+            replacement = _BrowserWorker(self, worker.index)
+            self._workers[self._workers.index(worker)] = replacement
+            self._idle.put(replacement)
+
+    def run(self, func, lease_timeout=BROWSER_LEASE_TIMEOUT, timeout=BROWSER_TASK_TIMEOUT):
+        """
+        租用一个浏览器，在其线程中执行 func(page) 并返回结果，页面用完自动关闭
+        没有空闲浏览器时最多等待 lease_timeout 秒，超时抛出 BrowserPoolTimeout；
+        func 执行超过 timeout 秒时关闭并替换该浏览器，抛出 BrowserTaskTimeout
+        """
+        if not PLAYWRIGHT_AVAILABLE:
+            raise BrowserPoolUnavailable('Playwright 未安装')
+        self._ensure_started()
+        try:
+            worker = self._idle.get(timeout=lease_timeout)
+        except queue.Empty:
+            raise BrowserPoolTimeout(f'{lease_timeout} 秒内没有空闲浏览器')
+        future = Future()
+        worker.tasks.put((func, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                # 浏览器线程还没开始执行该任务，取消后浏览器照常归还
+                raise BrowserTaskTimeout(f'页面操作超过 {timeout:g} 秒未开始')
+            if not worker.abort(future):
+                # 恰好在超时时完成
+                return future.result()
+            print(f"⚠️ 浏览器 {worker.index} 的页面操作超过 {timeout:g} 秒未完成，关闭并替换该浏览器")
+            self._replace(worker)
+            raise BrowserTaskTimeout(f'页面操作超过 {timeout:g} 秒未完成')
+
+    def warm(self):
+        """预先启动所有浏览器（可在 gunicorn post_fork 中调用）"""
+        if not PLAYWRIGHT_AVAILABLE:
+            return
+        self._ensure_started()
+        # 浏览器卡住或正在被租用时不无限等待，只预热等到的浏览器
+        leased = []
+        for _ in range(self.size):
+            try:
+                leased.append(self._idle.get(timeout=BROWSER_LEASE_TIMEOUT))
+            except queue.Empty:
+                print(f"⚠️ 浏览器预热：{BROWSER_LEASE_TIMEOUT:g} 秒内没有空闲浏览器")
+                break
+        futures = []
+        for worker in leased:
+            future = Future()
+            worker.tasks.put((lambda page: None, future))
+            futures.append(future)
+        for future in futures:
+            try:
+                future.result(timeout=BROWSER_TASK_TIMEOUT)
+            except Exception as e:
+                print(f"⚠️ 浏览器预热失败: {e!r}")
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize() if self._idle is not None and self._pid == os.getpid() else 0,
+            'launches': sum(w.launches for w in self._workers) if self._pid == os.getpid() else 0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._pid == os.getpid():
+                for worker in self._workers:
+                    worker.tasks.put(None)
+                # 等待浏览器进程退出（正在执行的页面最多等几秒）
+                for worker in self._workers:
+                    worker.thread.join(timeout=5)
+
+
+browser_pool = BrowserPool()
+atexit.register(browser_pool.close)
@@ -0,0 +1,173 @@
+"""
+按域名的抓取调度（礼貌抓取）
+批量采集几十个微信链接时，直接请求 mp.weixin.qq.com 过快会触发「环境异常 / 完成验证后即可继续访问」验证页，
+之后每个链接都要把所有抓取策略依次试一遍才失败。这里在直接访问源站的抓取（HTTP、Playwright）前加一层调度：
+
+- 每个域名限制同时进行的请求数和相邻请求的最小间隔（DOMAIN_POLICIES 可按域名配置）
+- 检测到验证页（或 HTTP 429）时自适应退避：请求间隔翻倍，并进入冷却期
+- 冷却期内该域名不再直接访问，抓取直接走不经过本机 IP 的 Jina Reader；冷却期随连续被拦截次数加倍
+- 请求成功后退避逐步恢复
+
+冷却状态写入 DOMAIN_STATE_DIR，多个 worker 进程共享（被拦截的是同一个出口 IP）；并发数和间隔按进程计算
+"""
+
+import os
+import json
+import time
+import pathlib
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import metrics
+
+DOMAIN_STATE_DIR = pathlib.Path(os.getenv('DOMAIN_STATE_DIR', pathlib.Path(__file__).parent.parent / 'uploads' / 'domain_state'))
+# 默认每个域名同时进行的请求数和最小间隔（秒）
+DOMAIN_CONCURRENCY = int(os.getenv('DOMAIN_CONCURRENCY', 4))
+DOMAIN_MIN_INTERVAL = float(os.getenv('DOMAIN_MIN_INTERVAL', 0))
+# 按域名覆盖，JSON：{"域名": {"concurrency": 2, "min_interval": 1.0}}
+DOMAIN_POLICIES = json.loads(os.getenv('DOMAIN_POLICIES') or '{"mp.weixin.qq.com": {"concurrency": 2, "min_interval": 1.0}}')
+# 第一次被拦截后的冷却时间（秒），连续被拦截时加倍，不超过 DOMAIN_COOLDOWN_MAX
+DOMAIN_COOLDOWN = float(os.getenv('DOMAIN_COOLDOWN', 120))
+DOMAIN_COOLDOWN_MAX = float(os.getenv('DOMAIN_COOLDOWN_MAX', 1800))
+# 请求间隔的最大退避倍数
+DOMAIN_MAX_BACKOFF = int(os.getenv('DOMAIN_MAX_BACKOFF', 16))
+# 等待请求名额的最长时间（秒），超时则放弃本次直接抓取
+DOMAIN_SLOT_TIMEOUT = float(os.getenv('DOMAIN_SLOT_TIMEOUT', 30))
+
+domain_blocks = metrics.Counter('ingest_domain_blocks_total', '直接抓取被源站拦截（验证页 / 429）的次数', ['domain'])
+domain_skips = metrics.Counter('ingest_domain_cooldown_skips_total', '域名冷却期内跳过的直接抓取次数', ['domain'])
+
+
+class DomainSlotTimeout(Exception):
+    """等待域名请求名额超时（或抓取已被取消）"""
+
+
+def domain_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+class _Domain:
+    def __init__(self, concurrency, min_interval):
+        self.min_interval = min_interval
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+        self.backoff = 1
+        self.blocks = 0           # 连续被拦截次数
+        self.cooldown_until = 0.0
+
+
+class DomainScheduler:
+    """按域名限制并发、间隔，并在被拦截后退避和冷却"""
+
+    def __init__(self, state_dir=DOMAIN_STATE_DIR, policies=None):
+        self.state_dir = pathlib.Path(state_dir)
+        self.policies = DOMAIN_POLICIES if policies is None else policies
+        self._domains = {}
+        self._lock = threading.Lock()
+
+    def _get(self, domain):
+        with self._lock:
+            state = self._domains.get(domain)
+            if state is None:
+                policy = self.policies.get(domain, {})
+                state = self._domains[domain] = _Domain(policy.get('concurrency', DOMAIN_CONCURRENCY),
+                                                        policy.get('min_interval', DOMAIN_MIN_INTERVAL))
+            return state
+
+    def _state_path(self, domain):
+        return self.state_dir / f'{domain}.json'
+
+    def _load_shared(self, domain, state):
+        """读取其他 worker 写入的冷却状态（取较晚的冷却结束时间）"""
+        try:
+            shared = json.loads(self._state_path(domain).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return
+        with state.lock:
+            if shared.get('cooldown_until', 0) > state.cooldown_until:
+                state.cooldown_until = shared['cooldown_until']
+                state.blocks = max(state.blocks, shared.get('blocks', 0))
+                state.backoff = max(state.backoff, shared.get('backoff', 1))
+
+    def _save_shared(self, domain, state):
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            path = self._state_path(domain)
+            tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'cooldown_until': state.cooldown_until, 'blocks': state.blocks,
+                           'backoff': state.backoff}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 保存域名冷却状态失败: {e}")
+
+    def in_cooldown(self, url):
+        """该域名是否在冷却期内（冷却期内不应直接访问）"""
+        domain = domain_of(url)
+        state = self._get(domain)
+        self._load_shared(domain, state)
+        if time.time() < state.cooldown_until:
+            domain_skips.inc(domain=domain)
+            return True
+        return False
+
+    @contextmanager
+    def slot(self, url, cancel=None, timeout=DOMAIN_SLOT_TIMEOUT):
+        """
+        占用一个域名请求名额，并等待到与上一个请求的间隔满足要求后再返回
+        cancel: 可选 threading.Event，设置后立即放弃等待；等待超时或被取消时抛出 DomainSlotTimeout
+        """
+        state = self._get(domain_of(url))
+        deadline = time.monotonic() + timeout
+        while not state.slots.acquire(timeout=0.1):
+            if (cancel is not None and cancel.is_set()) or time.monotonic() >= deadline:
+                raise DomainSlotTimeout(f'等待 {domain_of(url)} 请求名额超时')
+        try:
+            with state.lock:
+                start = max(time.monotonic(), state.next_start)
+                state.next_start = start + state.min_interval * state.backoff
+            delay = start - time.monotonic()
+            if delay > 0:
+                if start > deadline:
+                    raise DomainSlotTimeout(f'{domain_of(url)} 请求间隔等待超时')
+                if cancel is not None:
+                    if cancel.wait(delay):
+                        raise DomainSlotTimeout('抓取已取消')
+                else:
+                    time.sleep(delay)
+            yield
+        finally:
+            state.slots.release()
+
+    def report_blocked(self, url, reason='verification'):
+        """直接抓取被拦截：请求间隔翻倍，并进入冷却期（连续被拦截时冷却时间加倍）"""
+        domain = domain_of(url)
+        state = self._get(domain)
+        with state.lock:
+            state.blocks += 1
+            state.backoff = min(state.backoff * 2, DOMAIN_MAX_BACKOFF)
+            cooldown = min(DOMAIN_COOLDOWN * 2 ** (state.blocks - 1), DOMAIN_COOLDOWN_MAX)
+            state.cooldown_until = max(state.cooldown_until, time.time() + cooldown)
+        domain_blocks.inc(domain=domain)
+        print(f"🚦 {domain} 被拦截（{reason}），{cooldown:.0f} 秒内改用 Jina 抓取，请求间隔退避 {state.backoff}x")
+        self._save_shared(domain, state)
+
+    def report_ok(self, url):
+        """直接抓取成功：退避倍数减半，连续拦截计数清零"""
+        state = self._get(domain_of(url))
+        with state.lock:
+            state.blocks = 0
+            state.backoff = max(1, state.backoff // 2)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            domains = dict(self._domains)
+        return {domain: {'backoff': state.backoff, 'blocks': state.blocks,
+                         'cooldown_remaining': max(0, round(state.cooldown_until - now, 1))}
+                for domain, state in domains.items()}
+
+
+domain_scheduler = DomainScheduler()
@@ -0,0 +1,62 @@
+"""
+gunicorn 生产环境配置
+由 `python3 api_server.py --mode prod` 加载，也可以直接使用：
+    gunicorn -c gunicorn_conf.py api_server:app
+
+所有参数都可以通过环境变量覆盖（见下方 API_* 变量）
+"""
+
+import os
+
+# 监听地址
+bind = f"0.0.0.0:{os.getenv('API_PORT', '5001')}"
+
+# worker 进程数和每个进程的线程数
+# 采集请求大部分时间在等待 DeepSeek / GLM-4V / Supabase，线程可以覆盖 I/O 等待，
+# 多进程则避免 tesseract、pdfplumber 等 CPU 密集任务互相抢 GIL
+# 每个 worker 另有自己的 OCR 进程池（image_ocr.ocr_process_count），整机 OCR 进程数 = workers × OCR_PROCESSES；
+# 未设置 OCR_PROCESSES 时按 CPU 核数 / workers 分配（至少 1 个），调整 API_WORKERS 时 OCR 进程数随之变化
+workers = int(os.getenv('API_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+threads = int(os.getenv('API_THREADS', 4))
+worker_class = 'gthread'
+
+# 单个请求超时（秒），AI 解析链路较长，需要留足时间
+timeout = int(os.getenv('API_TIMEOUT', 180))
+# 收到重启/退出信号后，等待正在处理的请求完成的时间
+# 异步采集任务在 worker_exit 中另外最多等待 INGEST_JOB_DRAIN_TIMEOUT 秒（见 jobs.py）
+graceful_timeout = int(os.getenv('API_GRACEFUL_TIMEOUT', 60))
+keepalive = int(os.getenv('API_KEEPALIVE', 5))
+
+# worker 回收：处理一定数量请求后平滑重启，防止内存缓慢增长（OCR / PDF 库容易残留内存）
+# 加入随机抖动，避免所有 worker 同时重启
+max_requests = int(os.getenv('API_MAX_REQUESTS', 500))
+max_requests_jitter = int(os.getenv('API_MAX_REQUESTS_JITTER', 50))
+
+# 在 master 中预加载应用，worker 通过 fork 共享只读内存
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('API_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """fork 之后在每个 worker 中重新创建外部服务客户端，避免共享 master 的连接"""
+    import ingest_multimodal
+    import http_client
+    # 供 OCR 进程池按实际 worker 数分配进程数（image_ocr.ocr_process_count），包括命令行 -w 覆盖的值
+    os.environ['API_WORKERS'] = str(server.cfg.workers)
+    ingest_multimodal.init_clients()
+    http_client.reset()
+    if os.getenv('BROWSER_POOL_PREWARM', '').lower() in ('1', 'true'):
+        # 后台启动 Playwright 浏览器，第一次回退到浏览器抓取时无需等待冷启动
+        import threading
+        from browser_pool import browser_pool
+        threading.Thread(target=browser_pool.warm, daemon=True).start()
+    server.log.info(f"worker {worker.pid} 已初始化客户端")
+
+
+def worker_exit(server, worker):
+    """worker 退出（回收或重启）前处理本进程的异步采集任务：等待执行中的任务，其余标记为失败"""
+    from jobs import job_queue
+    job_queue.shutdown()
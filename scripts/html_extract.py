@@ -0,0 +1,155 @@
+"""
+网页正文提取
+原流程对同一个页面：先用 DOTALL 正则删除 <script>/<style>，再 BeautifulSoup(html.parser) 完整解析，
+然后多次 soup.select 和 get_text，普通网页还要再解析一遍。这里每个页面只解析一次：
+
+- 解析器优先使用 C 实现的 selectolax（lexbor），其次 lxml，都未安装时回退到 BeautifulSoup
+- 在解析后的文档树上直接删除 script / style 节点，不再对原始 HTML 跑正则
+- 一次返回标题、正文文字、微信正文各选择器的文字和正文图片引用，后续流程不再重复解析
+
+环境变量 HTML_PARSER 可指定解析器：auto（默认）/ selectolax / lxml / bs4
+"""
+
+import os
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    SELECTOLAX_AVAILABLE = False
+
+try:
+    import lxml.html
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+HTML_PARSER = os.getenv('HTML_PARSER', 'auto')
+
+# 微信公众号文章内容选择器（只支持 #id 和 .class 两种形式）
+WECHAT_SELECTORS = ['#js_content', '.rich_media_content', '#activity-name', '.rich_media_title']
+# 正文图片所在区域，按顺序取第一个存在的
+WECHAT_IMAGE_AREAS = ['#js_content', '.rich_media_content']
+# 正文标题
+WECHAT_TITLE_SELECTORS = ['#activity-name', '.rich_media_title']
+# 结构上直接删除的节点（内容不是正文）
+DROP_TAGS = ['script', 'style']
+
+
+def _parse_selectolax(html):
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(DROP_TAGS)
+
+    def text(node):
+        if node is None:
+            return ''
+        # lexbor 会保留只含空白的文字节点（去空白后为空串），用不会出现在正文中的分隔符拼接后再过滤
+        return '\n'.join(s for s in node.text(separator='\x00', strip=True).split('\x00') if s)
+
+    sections = [(selector, [text(node) for node in tree.css(selector)]) for selector in WECHAT_SELECTORS]
+    area = next((node for node in (tree.css_first(s) for s in WECHAT_IMAGE_AREAS) if node is not None), None)
+    images = [(img.attributes.get('data-src') or img.attributes.get('src') or img.attributes.get('data-original'),
+               dict(img.attributes)) for img in area.css('img')] if area is not None else []
+    title = next((t for t in (text(tree.css_first(s)) for s in WECHAT_TITLE_SELECTORS) if t), '') \
+        or text(tree.css_first('title'))
+    return {
+        'title': title,
+        'text': text(tree.body if tree.body is not None else tree.root),
+        'sections': sections,
+        'images': images,
+    }
+
+
+def _xpath(selector):
+    if selector.startswith('#'):
+        return f'//*[@id="{selector[1:]}"]'
+    return f'//*[contains(concat(" ", normalize-space(@class), " "), " {selector[1:]} ")]'
+
+
+def _parse_lxml(html):
+    root = lxml.html.document_fromstring(html)
+    etree.strip_elements(root, *DROP_TAGS, etree.Comment, with_tail=False)
+
+    def text(node):
+        if node is None:
+            return ''
+        return '\n'.join(s.strip() for s in node.itertext() if s.strip())
+
+    def first(selector):
+        found = root.xpath(_xpath(selector))
+        return found[0] if found else None
+
+    sections = [(selector, [text(node) for node in root.xpath(_xpath(selector))]) for selector in WECHAT_SELECTORS]
+    area = next((node for node in (first(s) for s in WECHAT_IMAGE_AREAS) if node is not None), None)
+    images = [(img.get('data-src') or img.get('src') or img.get('data-original'), dict(img.attrib))
+              for img in area.iter('img')] if area is not None else []
+    title_node = root.find('.//title')
+    title = next((t for t in (text(first(s)) for s in WECHAT_TITLE_SELECTORS) if t), '') or text(title_node)
+    body = root.find('body')
+    return {
+        'title': title,
+        'text': text(body if body is not None else root),
+        'sections': sections,
+        'images': images,
+    }
+
+
+def _parse_bs4(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(DROP_TAGS):
+        tag.decompose()
+
+    def text(node):
+        return node.get_text(separator='\n', strip=True) if node is not None else ''
+
+    sections = [(selector, [text(node) for node in soup.select(selector)]) for selector in WECHAT_SELECTORS]
+    area = soup.select_one(', '.join(WECHAT_IMAGE_AREAS))
+    images = [(img.get('data-src') or img.get('src') or img.get('data-original'), dict(img.attrs))
+              for img in area.find_all('img')] if area is not None else []
+    title = next((t for t in (text(soup.select_one(s)) for s in WECHAT_TITLE_SELECTORS) if t), '') \
+        or text(soup.find('title'))
+    return {
+        'title': title,
+        'text': text(soup.body or soup),
+        'sections': sections,
+        'images': images,
+    }
+
+
+PARSERS = {'selectolax': _parse_selectolax, 'lxml': _parse_lxml, 'bs4': _parse_bs4}
+
+
+def available_parsers():
+    names = []
+    if SELECTOLAX_AVAILABLE:
+        names.append('selectolax')
+    if LXML_AVAILABLE:
+        names.append('lxml')
+    names.append('bs4')
+    return names
+
+
+def parse_page(html, parser=None):
+    """
+    解析页面，返回 dict：
+    - title: 文章标题（微信 #activity-name，其次 <title>）
+    - text: <body> 的全部文字（各文字节点去空白后以换行连接，与 get_text('\\n', strip=True) 一致）
+    - sections: [(选择器, [每个匹配元素的文字])]，选择器见 WECHAT_SELECTORS
+    - images: [(图片地址, 属性 dict)]，来自正文区域（#js_content 或 .rich_media_content）
+    """
+    name = parser or HTML_PARSER
+    if name == 'auto' or name not in available_parsers():
+        name = available_parsers()[0]
+    try:
+        doc = PARSERS[name](html)
+    except Exception as e:
+        # 如 lxml 不接受带 encoding 声明的 str、空文档等，回退到 BeautifulSoup
+        if name == 'bs4':
+            raise
+        print(f"⚠️ {name} 解析失败，回退到 BeautifulSoup: {e}")
+        name = 'bs4'
+        doc = _parse_bs4(html)
+    doc['parser'] = name
+    return doc
@@ -0,0 +1,127 @@
+"""
+共享 HTTP 客户端
+所有对外抓取（Jina Reader、网页 / 微信文章、mmbiz.qpic.cn 图片、og:image）共用一个 requests.Session：
+- 按主机复用连接（keep-alive），同一篇文章的多张图片、连续的多篇文章不再重复建立 TCP + TLS 连接
+- 连接失败和 429 / 5xx 按指数退避重试；读取超时不重试，避免把 60 秒的等待翻倍
+- 统一的请求头和超时（连接超时固定，读取超时由调用方指定）
+
+Session 按进程创建：gunicorn fork 出的 worker 不会复用 master 中的连接
+"""
+
+import os
+import threading
+from concurrent.futures import CancelledError
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
+from urllib3.util.retry import Retry
+
+# 每个进程最多缓存多少个主机的连接池
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', 32))
+# 每个主机最多保持的连接数（应不小于同时抓取同一主机的线程数）
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 16))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+# 重试间隔：backoff * 2^(n-1) 秒
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 0.5))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+}
+# 微信文章和 mmbiz 图片需要带上来源页，否则可能返回防盗链图片
+WECHAT_HEADERS = {'Referer': 'https://mp.weixin.qq.com/'}
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+READ_CHUNK_SIZE = 64 * 1024
+
+_session = None
+_session_pid = None
+_lock = threading.Lock()
+
+
+class FetchCancelled(CancelledError):
+    """下载过程中被取消（如并行抓取时其他策略已成功）"""
+
+
+def _create_session():
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=0,
+        status=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        # 重试用完后返回最后一次响应，由调用方按状态码处理（与直接 requests.get 一致）
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    # 不在不同文章 / 用户的请求之间共享 Cookie（与每次单独 requests.get 的行为一致）
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_session():
+    """返回当前进程的共享 Session（fork 后自动重新创建）"""
+    global _session, _session_pid
+    if _session is not None and _session_pid == os.getpid():
+        return _session
+    with _lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = _create_session()
+            _session_pid = os.getpid()
+        return _session
+
+
+def reset():
+    """丢弃当前进程的连接池（gunicorn post_fork 中调用）"""
+    global _session, _session_pid
+    with _lock:
+        _session = None
+        _session_pid = None
+
+
+def _timeout(timeout):
+    """数字表示读取超时，连接超时统一使用 HTTP_CONNECT_TIMEOUT"""
+    if timeout is None:
+        timeout = HTTP_READ_TIMEOUT
+    if isinstance(timeout, (int, float)):
+        return (min(HTTP_CONNECT_TIMEOUT, timeout), timeout)
+    return timeout
+
+
+def get(url, headers=None, timeout=None, **kwargs):
+    """
+    通过共享连接池发送 GET 请求，参数与 requests.get 相同
+    headers 会合并到默认请求头上；timeout 为数字时表示读取超时（秒）
+    """
+    return get_session().get(url, headers=headers, timeout=_timeout(timeout), **kwargs)
+
+
+def read_text(resp, cancel=None, chunk_size=READ_CHUNK_SIZE):
+    """
+    分块读取 stream=True 的响应正文并解码（编码规则与 resp.text 相同）
+    cancel: threading.Event，被设置后中断下载、关闭连接并抛出 FetchCancelled
+    """
+    chunks = []
+    for chunk in resp.iter_content(chunk_size):
+        if cancel is not None and cancel.is_set():
+            # 关闭连接，丢弃未读取的内容（读完的响应会自动把连接放回连接池）
+            resp.close()
+            raise FetchCancelled(resp.url)
+        chunks.append(chunk)
+    data = b''.join(chunks)
+    encoding = resp.encoding or chardet.detect(data)['encoding'] or 'utf-8'
+    try:
+        return data.decode(encoding, errors='replace')
+    except LookupError:
+        return data.decode('utf-8', errors='replace')
@@ -0,0 +1,239 @@
+"""
+文章图片 OCR 前的预筛选
+微信文章里除了正文海报，还有大量不含文字的图片：GIF 表情、分割线、二维码、装饰小图，
+以及同一张图片重复出现（如每段末尾的品牌条）。逐张下载并送进 tesseract 代价很高，这里按成本从低到高逐级过滤：
+
+1. 只看 <img> 属性：wx_fmt=gif、data-w / data-ratio 给出的尺寸、同一文章内重复的图片
+2. 下载时先读取图片头部（前 IMAGE_HEADER_BYTES 字节）解析尺寸，不合格则中断下载
+3. 下载完成后在缩略图上估计「含文字的可能性」（边缘密度、对比度、二维码特征）
+
+每一级都偏向保留：无法判断的图片一律交给 OCR，只跳过有把握不含文字的图片
+"""
+
+import io
+import os
+import re
+import struct
+from urllib.parse import urlsplit, parse_qs
+
+import metrics
+
+# 宽度或高度低于该值的图片视为图标 / 装饰图
+IMAGE_MIN_WIDTH = int(os.getenv('IMAGE_MIN_WIDTH', 150))
+IMAGE_MIN_HEIGHT = int(os.getenv('IMAGE_MIN_HEIGHT', 40))
+# 高宽比低于该值的图片视为分割线
+IMAGE_MIN_RATIO = float(os.getenv('IMAGE_MIN_RATIO', 0.06))
+# 解析尺寸时读取的图片头部字节数（JPEG 的 EXIF 可能较长）
+IMAGE_HEADER_BYTES = int(os.getenv('IMAGE_HEADER_BYTES', 16 * 1024))
+# 文字判断使用的缩略图边长
+IMAGE_THUMBNAIL_SIZE = int(os.getenv('IMAGE_THUMBNAIL_SIZE', 256))
+# 缩略图中强边缘像素占比低于该值视为不含文字（纯色图、照片、渐变背景）
+IMAGE_MIN_EDGE_DENSITY = float(os.getenv('IMAGE_MIN_EDGE_DENSITY', 0.03))
+# 设为 0 关闭预筛选（所有图片都交给 OCR，用于对比或排查漏识别）
+IMAGE_PREFILTER = os.getenv('IMAGE_PREFILTER', '1') != '0'
+
+images_skipped = metrics.Counter('ingest_images_skipped_total', 'OCR 前被预筛选跳过的图片数（按原因分类）', ['reason'])
+
+# mmbiz 图片地址末尾的尺寸段（/0、/640、/640.jpeg），同一张图片不同尺寸视为重复
+_SIZE_SEGMENT_RE = re.compile(r'/\d+(\.\w+)?$')
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _size_reason(width, height):
+    if width is None or height is None:
+        return None
+    if width < IMAGE_MIN_WIDTH or height < IMAGE_MIN_HEIGHT:
+        return 'small'
+    if height / width < IMAGE_MIN_RATIO:
+        return 'divider'
+    return None
+
+
+def dedup_key(url):
+    """同一张图片的不同 URL（尺寸段、wx_fmt、from 等参数不同）归一为同一个键"""
+    parts = urlsplit(url)
+    if 'qpic.cn' in parts.netloc or 'mmbiz' in parts.netloc:
+        return parts.netloc.lower() + _SIZE_SEGMENT_RE.sub('', parts.path)
+    return parts.netloc.lower() + parts.path + '?' + parts.query
+
+
+def attrs_reason(url, attrs):
+    """
+    只根据 URL 和 <img> 属性判断是否跳过，返回跳过原因，需要 OCR 时返回 None
+    微信图片属性：data-w 为原图宽度，data-ratio 为高宽比，data-type 为图片格式
+    """
+    fmt = (parse_qs(urlsplit(url).query).get('wx_fmt') or [''])[0].lower()
+    if fmt == 'gif' or (attrs.get('data-type') or '').lower() == 'gif' or urlsplit(url).path.lower().endswith('.gif'):
+        return 'gif'
+
+    width = _to_int(attrs.get('data-w') or attrs.get('width') or attrs.get('data-width'))
+    ratio = attrs.get('data-ratio')
+    try:
+        height = int(width * float(ratio)) if width and ratio else None
+    except ValueError:
+        height = None
+    if height is None:
+        height = _to_int(attrs.get('height') or attrs.get('data-height'))
+    return _size_reason(width, height)
+
+
+def iter_selected(items, skipped=None):
+    """
+    第 1 级过滤（不发请求），逐个处理，可用于流式输入
+    items: 可迭代的 (序号, 图片 URL, <img> 属性 dict)
+    产出 (序号, 图片 URL)，同一张图片只保留第一次出现；skipped 字典记录各原因跳过的数量
+    """
+    seen = set()
+    for idx, url, attrs in items:
+        reason = None
+        if IMAGE_PREFILTER:
+            reason = attrs_reason(url, attrs)
+            if reason is None:
+                key = dedup_key(url)
+                if key in seen:
+                    reason = 'duplicate'
+                else:
+                    seen.add(key)
+        if reason:
+            if skipped is not None:
+                skipped[reason] = skipped.get(reason, 0) + 1
+            record_skip(reason)
+            continue
+        yield idx, url
+
+
+def print_skipped(skipped):
+    if skipped:
+        summary = '、'.join(f'{reason} {count}' for reason, count in sorted(skipped.items()))
+        print(f"  ⏭️ 预筛选跳过 {sum(skipped.values())} 张图片（{summary}）")
+
+
+def select_images(items):
+    """iter_selected 的列表版本，返回 [(序号, 图片 URL)]"""
+    skipped = {}
+    selected = list(iter_selected(items, skipped))
+    print_skipped(skipped)
+    return selected
+
+
+def parse_image_size(head):
+    """
+    从图片头部字节解析格式和尺寸，返回 (格式, 宽, 高)，无法识别时返回 None
+    支持 PNG、GIF、JPEG、WebP
+    """
+    if head[:8] == b'\x89PNG\r\n\x1a\n' and len(head) >= 24:
+        width, height = struct.unpack('>II', head[16:24])
+        return 'png', width, height
+    if head[:6] in (b'GIF87a', b'GIF89a') and len(head) >= 10:
+        width, height = struct.unpack('<HH', head[6:10])
+        return 'gif', width, height
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP' and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', head[26:30])
+            return 'webp', width & 0x3fff, height & 0x3fff
+        if chunk == b'VP8L':
+            bits = int.from_bytes(head[21:25], 'little')
+            return 'webp', (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+        if chunk == b'VP8X':
+            return 'webp', int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+        return None
+    if head[:2] == b'\xff\xd8':
+        # 逐个跳过 JPEG 段，直到 SOF（帧头）段
+        pos = 2
+        while pos + 9 < len(head):
+            if head[pos] != 0xff:
+                return None
+            marker = head[pos + 1]
+            if marker == 0xff:
+                pos += 1
+                continue
+            if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7:
+                pos += 2
+                continue
+            length = struct.unpack('>H', head[pos + 2:pos + 4])[0]
+            if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+                height, width = struct.unpack('>HH', head[pos + 5:pos + 9])
+                return 'jpeg', width, height
+            pos += 2 + length
+    return None
+
+
+def header_reason(head):
+    """第 2 级过滤：根据图片头部判断是否跳过（动图、尺寸过小），无法解析时返回 None"""
+    size = parse_image_size(head) if IMAGE_PREFILTER else None
+    if size is None:
+        return None
+    fmt, width, height = size
+    if fmt == 'gif':
+        return 'gif'
+    return _size_reason(width, height)
+
+
+def _thumbnail(data):
+    """返回 (原图宽, 原图高, 灰度缩略图)，无法解码时返回 None"""
+    try:
+        from PIL import Image
+        image = Image.open(io.BytesIO(data))
+        width, height = image.size
+        # JPEG 可以直接按缩小比例解码，避免完整解码大图
+        image.draft('L', (IMAGE_THUMBNAIL_SIZE, IMAGE_THUMBNAIL_SIZE))
+        gray = image.convert('L')
+        gray.thumbnail((IMAGE_THUMBNAIL_SIZE, IMAGE_THUMBNAIL_SIZE))
+    except Exception:
+        return None
+    return width, height, gray
+
+
+def _edge_density(gray):
+    from PIL import ImageFilter, ImageStat
+    edges = gray.filter(ImageFilter.FIND_EDGES).point(lambda v: 255 if v > 64 else 0)
+    return ImageStat.Stat(edges).mean[0] / 255
+
+
+def text_density(data):
+    """
+    估计图片尺寸和文字密度，返回 (宽, 高, 强边缘像素比例)，无法解码时返回 None
+    文字越密集、字越小，缩略图上的强边缘越多（OCR 路由据此选择识别精度更高的后端）
+    """
+    thumb = _thumbnail(data)
+    if thumb is None:
+        return None
+    width, height, gray = thumb
+    return width, height, _edge_density(gray)
+
+
+def text_reason(data):
+    """
+    第 3 级过滤：在缩略图上估计图片是否含文字，返回跳过原因，可能含文字（或无法判断）时返回 None
+    - 强边缘像素过少：纯色图、照片、渐变背景
+    - 深色像素占一半左右、近似正方形且边缘比例低：二维码（大块黑白模块，而文字是细笔画）
+    """
+    if not IMAGE_PREFILTER:
+        return None
+    thumb = _thumbnail(data)
+    if thumb is None:
+        return None
+    from PIL import ImageStat
+    _, _, gray = thumb
+
+    edge_density = _edge_density(gray)
+    if edge_density < IMAGE_MIN_EDGE_DENSITY:
+        return 'no_text'
+
+    width, height = gray.size
+    dark = ImageStat.Stat(gray.point(lambda v: 255 if v < 128 else 0)).mean[0] / 255
+    if 0.85 <= height / width <= 1.15 and 0.3 <= dark <= 0.7 and edge_density < dark * 0.6:
+        return 'qrcode'
+    return None
+
+
+def record_skip(reason):
+    """记录跳过的图片（下载阶段的过滤由 image_ocr 调用）"""
+    images_skipped.inc(reason=reason)
@@ -0,0 +1,320 @@
+"""
+文章图片并行下载 + OCR
+微信文章常把海报切成十几张图片，原实现逐张「下载 → tesseract」串行执行。这里：
+- 下载在线程池中并发进行，同一主机同时最多 OCR_PER_HOST_LIMIT 个请求
+- 下载完成的图片立即交给进程池 OCR（进程数见 ocr_process_count），下载和识别互相重叠
+- 结果按图片序号重新排序，[图片N文字] 的编号和顺序与串行实现一致
+- 每篇文章有总时间预算 OCR_ARTICLE_BUDGET，超时后跳过剩余图片
+- 下载时先按图片头部尺寸、下载后按缩略图判断是否可能含文字（见 image_filter），内容相同的图片只识别一次
+- 识别结果按图片地址缓存（ocr_cache），同一张图片出现在多篇文章中时不再重复下载和识别
+- 每张图片由 ocr_backends 的路由选择识别后端；选中 tesseract 时在进程池中执行，
+  每个 OCR 进程保留一个已加载语言模型的常驻引擎（见 tesseract_engine）；识别前先预处理，长图切块并行识别（见 ocr_preprocess）
+
+iter_image_ocr() 是生成器：输入图片引用流，识别完成一张就产出一张；
+HTTP 抓取和 Playwright 抓取的正文图片都通过 ocr_article_images() 使用同一个阶段
+"""
+
+import io
+import os
+import hashlib
+import time
+import threading
+import multiprocessing
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+import http_client
+import image_filter
+import metrics
+import ocr_preprocess
+import tesseract_engine
+from ocr_backends import ocr_router, OCR_MIN_TEXT_LENGTH
+from result_cache import ResultCache
+
+# 每个进程同时下载的图片数
+OCR_DOWNLOAD_WORKERS = int(os.getenv('OCR_DOWNLOAD_WORKERS', 8))
+# 同一主机（如 mmbiz.qpic.cn）同时下载的图片数
+OCR_PER_HOST_LIMIT = int(os.getenv('OCR_PER_HOST_LIMIT', 4))
+# 每个 API worker 进程的 OCR 进程数；0 表示在线程中执行（tesseract 本身是子进程，不受 GIL 限制）
+# 未设置时按 CPU 核数 / API_WORKERS 分配，见 ocr_process_count()
+OCR_PROCESSES = int(os.environ['OCR_PROCESSES']) if os.getenv('OCR_PROCESSES') else None
+# 未设置 OCR_PROCESSES 时每个 worker 最多的 OCR 进程数
+OCR_MAX_PROCESSES = int(os.getenv('OCR_MAX_PROCESSES', 2))
+# 每篇文章图片 OCR 的总时间预算（秒）
+OCR_ARTICLE_BUDGET = float(os.getenv('OCR_ARTICLE_BUDGET', 60))
+
+# 图片地址 -> 识别文字（不含文字的图片缓存空字符串）
+ocr_cache = ResultCache('image_ocr', 'image-ocr-v1')
+
+_download_executor = None
+_ocr_executor = None
+_route_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_host_slots = {}
+
+
+def _init_ocr_process():
+    # 多个 tesseract 并行时限制每个进程的 OpenMP 线程数，避免抢占 CPU
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    # 进程启动时加载语言模型，之后每张图片直接识别
+    tesseract_engine.warm_up()
+
+
+def ocr_process_count():
+    """
+    每个 API worker 进程的 OCR 进程数（线程模式下为线程数）
+    OCR 进程池按 worker 创建，整台机器的 OCR 进程数 = API_WORKERS × 该值；
+    默认 CPU 核数 / API_WORKERS（至少 1、至多 OCR_MAX_PROCESSES），gunicorn 默认 2×CPU+1 个 worker 时每个 worker 1 个，
+    避免每个 worker 都按 CPU 核数启动进程导致 CPU 超额和内存占用成倍增加；
+    未设置 API_WORKERS 时不在多 worker 服务中（开发模式、脚本），按 CPU 核数分配（gunicorn_conf.py 在每个 worker 中设置实际 worker 数）
+    """
+    if OCR_PROCESSES is not None:
+        return OCR_PROCESSES
+    cpus = os.cpu_count() or 1
+    workers = int(os.getenv('API_WORKERS') or 1)
+    return max(1, min(OCR_MAX_PROCESSES, cpus // max(workers, 1)))
+
+
+def _reset_if_forked():
+    """fork 后的子进程不能使用父进程的线程池 / 进程池，重新创建（调用方持有 _executor_lock）"""
+    global _download_executor, _ocr_executor, _route_executor, _executor_pid, _host_slots
+    if _executor_pid != os.getpid():
+        _download_executor = _ocr_executor = _route_executor = None
+        _host_slots = {}
+        _executor_pid = os.getpid()
+
+
+def _create_ocr_executor():
+    processes = ocr_process_count()
+    if processes > 0:
+        # 使用 spawn：API worker 是多线程进程，直接 fork 可能继承被其他线程持有的锁
+        # 进程在第一次提交任务时才启动（按需启动，最多 processes 个），启动时加载常驻引擎
+        return ProcessPoolExecutor(max_workers=processes, initializer=_init_ocr_process,
+                                   mp_context=multiprocessing.get_context('spawn'))
+    return ThreadPoolExecutor(max_workers=max(1, min(OCR_MAX_PROCESSES, os.cpu_count() or 1)),
+                              thread_name_prefix='image-ocr')
+
+
+def _get_executors():
+    """文章图片 OCR 使用的线程池和进程池，按进程懒创建（fork 后重新创建）"""
+    global _download_executor, _ocr_executor, _route_executor
+    with _executor_lock:
+        _reset_if_forked()
+        if _ocr_executor is None:
+            _ocr_executor = _create_ocr_executor()
+        if _download_executor is None:
+            _download_executor = ThreadPoolExecutor(max_workers=OCR_DOWNLOAD_WORKERS, thread_name_prefix='image-download')
+            # 路由后的识别（等待远程 OCR 接口或进程池结果）在单独的线程池中进行，不占用下载线程
+            _route_executor = ThreadPoolExecutor(max_workers=OCR_DOWNLOAD_WORKERS, thread_name_prefix='image-ocr-route')
+        return _download_executor, _ocr_executor, _route_executor
+
+
+def get_ocr_executor():
+    """
+    当前进程的 OCR 进程池（单张图片识别也提交到这里，与文章图片共用同一组常驻引擎）
+    只创建进程池本身，不创建文章图片下载用的线程池；OCR 进程在第一次识别时才启动
+    """
+    global _ocr_executor
+    with _executor_lock:
+        _reset_if_forked()
+        if _ocr_executor is None:
+            _ocr_executor = _create_ocr_executor()
+        return _ocr_executor
+
+
+def _host_slot(url):
+    host = urlsplit(url).netloc
+    with _executor_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(OCR_PER_HOST_LIMIT)
+        return slot
+
+
+def _download(url, headers, timeout, deadline):
+    """
+    下载图片，返回 (bytes, 跳过原因)
+    超出时间预算返回 (None, 'budget')；预筛选判断不含文字时返回 (None, 原因)，头部不合格时不再下载剩余部分
+    """
+    with _host_slot(url):
+        if time.monotonic() >= deadline:
+            return None, 'budget'
+        with metrics.track('image_download', provider='image'):
+            resp = http_client.get(url, headers=headers, timeout=timeout, stream=True)
+            if resp.status_code != 200:
+                resp.close()
+                metrics.provider_error('image', f'http_{resp.status_code}')
+                raise requests.HTTPError(f'HTTP {resp.status_code}')
+            chunks = []
+            received = 0
+            checked = False
+            for chunk in resp.iter_content(chunk_size=8192):
+                chunks.append(chunk)
+                received += len(chunk)
+                if not checked and received >= image_filter.IMAGE_HEADER_BYTES:
+                    checked = True
+                    reason = image_filter.header_reason(b''.join(chunks))
+                    if reason:
+                        resp.close()
+                        return None, reason
+            data = b''.join(chunks)
+    if not checked:
+        reason = image_filter.header_reason(data)
+        if reason:
+            return None, reason
+    return data, image_filter.text_reason(data)
+
+
+def ocr_image_bytes(data):
+    """在 OCR 进程中预处理并执行 tesseract（使用该进程的常驻引擎），返回 (文字, 耗时秒数)；长图的各块依次识别"""
+    from PIL import Image
+
+    start = time.perf_counter()
+    tiles = ocr_preprocess.prepare(Image.open(io.BytesIO(data)))
+    text = ocr_preprocess.stitch([(tesseract_engine.image_to_string(tile), overlapped) for tile, overlapped in tiles])
+    return text, time.perf_counter() - start
+
+
+def normalize_image_url(src):
+    """补全正文图片的协议和域名（微信正文图片可能是 //、/ 开头或相对路径）"""
+    if src.startswith('//'):
+        return 'https:' + src
+    if src.startswith('/'):
+        return 'https://mp.weixin.qq.com' + src
+    if not src.startswith('http'):
+        return 'https://mp.weixin.qq.com/' + src.lstrip('/')
+    return src
+
+
+def _valid(text):
+    return bool(text and len(text.strip()) > OCR_MIN_TEXT_LENGTH)
+
+
+def _route_ocr(data, ocr_executor):
+    """
+    经 OCR 路由识别，返回 (文字, 后端名)；后端耗时和结果已由路由记入 metrics
+    与 /api/ocr 相同，收费后端只在 OCR_ALLOW_PAID=1 时参与路由
+    """
+    return ocr_router.recognize(data, executor=ocr_executor, retry_empty=False)
+
+
+def iter_image_ocr(refs, headers=None, timeout=15, budget=None, ocr_func=None):
+    """
+    流式图片 OCR 阶段（生成器）
+    refs: 可迭代的 (序号, 图片地址, <img> 属性 dict)，序号从 0 开始，用于 [图片N文字] 编号
+    产出 (序号, 文字)：按识别完成的先后顺序，只包含识别出有效文字的图片
+    - 先经 image_filter 预筛选（属性 / 重复），再查识别结果缓存，未命中的才下载和识别
+    - 下载和识别共用进程级线程池 / 进程池，同一主机限并发
+    - 超出时间预算后停止，剩余图片跳过；调用方提前停止迭代时也会取消未开始的任务
+    ocr_func: 可选，固定在进程池中执行的识别函数（必须是模块级函数），返回 (文字, 耗时秒数)；
+              默认每张图片由 OCR 路由选择后端
+    """
+    budget = OCR_ARTICLE_BUDGET if budget is None else budget
+    deadline = time.monotonic() + budget
+    download_executor, ocr_executor, route_executor = _get_executors()
+
+    def normalized():
+        for idx, src, attrs in refs:
+            if not src:
+                print(f"  ⚠️ 图片 {idx+1} 没有找到URL")
+                continue
+            yield idx, normalize_image_url(src), attrs or {}
+
+    pending = {}  # future -> (阶段, 序号, 缓存键)
+    prefiltered = {}
+    seen = set()
+    skipped = 0
+    filtered = 0
+    try:
+        for idx, url in image_filter.iter_selected(normalized(), prefiltered):
+            key = ocr_cache.key(image_filter.dedup_key(url).encode('utf-8'))
+            cached = ocr_cache.get(key)
+            if cached is not None:
+                if _valid(cached):
+                    print(f"  ♻️ 图片 {idx+1} 使用缓存的OCR结果")
+                    yield idx, cached
+                continue
+            pending[download_executor.submit(_download, url, headers, timeout, deadline)] = ('download', idx, key)
+        image_filter.print_skipped(prefiltered)
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, idx, key = pending.pop(future)
+                if stage == 'download':
+                    try:
+                        data, reason = future.result()
+                    except Exception as e:
+                        print(f"  ⚠️ 图片 {idx+1} 下载失败: {e}")
+                        continue
+                    if reason == 'budget':
+                        skipped += 1
+                        continue
+                    if reason is None and image_filter.IMAGE_PREFILTER:
+                        # 不同 URL 指向同一张图片时只识别一次
+                        digest = hashlib.sha1(data).digest()
+                        reason = 'duplicate' if digest in seen else None
+                        seen.add(digest)
+                    if reason:
+                        filtered += 1
+                        image_filter.record_skip(reason)
+                        if reason != 'duplicate':
+                            ocr_cache.set(key, '')
+                        continue
+                    if ocr_func is None:
+                        pending[route_executor.submit(_route_ocr, data, ocr_executor)] = ('route', idx, key)
+                    else:
+                        pending[ocr_executor.submit(ocr_func, data)] = ('ocr', idx, key)
+                    continue
+
+                try:
+                    text, detail = future.result()
+                except Exception as e:
+                    print(f"  ⚠️ 图片 {idx+1} OCR失败: {e}")
+                    if stage == 'ocr':
+                        metrics.stage_total.inc(stage='tesseract', outcome='error')
+                    continue
+                text = (text or '').strip()
+                valid = _valid(text)
+                if stage == 'ocr':
+                    metrics.observe_stage('tesseract', detail, 'ok' if valid else 'empty')
+                elif detail is None:
+                    # 没有可用的后端或全部失败，不缓存，下次再试
+                    continue
+                ocr_cache.set(key, text if valid else '')
+                if valid:
+                    print(f"  ✅ 图片 {idx+1} OCR成功: {len(text)} 字符")
+                    yield idx, text
+                else:
+                    print(f"  ⚠️ 图片 {idx+1} OCR未提取到有效文字")
+    finally:
+        # 取消尚未开始的下载和识别；已在进行中的任务会自然结束，结果被丢弃
+        skipped += len(pending)
+        for future in pending:
+            future.cancel()
+        if filtered:
+            print(f"  ⏭️ 下载后预筛选跳过 {filtered} 张图片")
+        if skipped:
+            print(f"  ⏱️ 超出时间预算（{budget:.0f} 秒），跳过 {skipped} 张图片")
+
+
+def ocr_image_urls(items, headers=None, timeout=15, budget=None, ocr_func=None):
+    """
+    iter_image_ocr 的列表版本
+    items: [(序号, 图片 URL)] 或 [(序号, 图片 URL, <img> 属性)]
+    返回 [(序号, 文字)]，按序号排序
+    """
+    refs = (item if len(item) == 3 else (item[0], item[1], {}) for item in items)
+    return sorted(iter_image_ocr(refs, headers=headers, timeout=timeout, budget=budget, ocr_func=ocr_func))
+
+
+def ocr_article_images(refs, headers=None, timeout=15, budget=None):
+    """识别文章正文图片，返回按图片顺序排列的 [图片N文字] 段落列表"""
+    return [f"[图片{idx+1}文字]: {text}"
+            for idx, text in ocr_image_urls(refs, headers=headers, timeout=timeout, budget=budget)]
@@ -13,7 +13,30 @@ import os
 # 获取项目根目录
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 EXCEL_FILE = os.path.join(PROJECT_ROOT, "信息收集.xlsx")
-API_URL = "http://localhost:5001/api/ingest"
+API_BASE = "http://localhost:5001"
+API_URL = f"{API_BASE}/api/ingest"
+# 异步任务轮询间隔和最长等待时间（秒）
+POLL_INTERVAL = 2
+JOB_TIMEOUT = 300
+
+def wait_for_job(job_id):
+    """轮询异步采集任务直到结束，返回与同步接口相同格式的结果"""
+    deadline = time.time() + JOB_TIMEOUT
+    while time.time() < deadline:
+        job = requests.get(f"{API_BASE}/api/jobs/{job_id}", timeout=10).json()
+        if job.get("status") == "failed":
+            return {"success": False, "message": job.get("error") or "处理失败"}
+        if job.get("status") == "succeeded":
+            result = job.get("result") or {}
+            reason = result.get("reason")
+            messages = {"duplicate": "重复数据", "invalid": "无效内容"}
+            return {
+                "success": bool(result.get("saved")),
+                "data": result.get("event") or {},
+                "message": messages.get(reason, reason or "")
+            }
+        time.sleep(POLL_INTERVAL)
+    raise requests.exceptions.Timeout(f"任务 {job_id} 超时")
 
 def import_data():
     """从 Excel 导入数据"""
@@ -33,7 +56,7 @@ def import_data():
     
     # 检查 API 服务
     try:
-        health_response = requests.get("http://localhost:5001/health", timeout=5)
+        health_response = requests.get(f"{API_BASE}/health", timeout=5)
         if health_response.status_code != 200:
             print("❌ API 服务不可用，请先启动服务")
             return
@@ -66,16 +89,22 @@ def import_data():
         print(f"   内容: {content[:60].replace(chr(10), ' ')}...")
         
         try:
+            # 异步提交，避免长时间占用 HTTP 连接，然后轮询任务结果
             response = requests.post(
                 API_URL,
                 json={
                     "content": content,
-                    "type": "text"
+                    "type": "text",
+                    "async": True
                 },
-                timeout=90  # AI 处理可能需要较长时间
+                timeout=10
             )
             
-            result = response.json()
+            submitted = response.json()
+            if submitted.get("job_id"):
+                result = wait_for_job(submitted["job_id"])
+            else:
+                result = submitted
             
             if result.get("success"):
                 success_count += 1
@@ -1,14 +1,26 @@
+import io
 import os
 import json
-import base64
 import requests
 import re
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
 from openai import OpenAI
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+import metrics
+import http_client
+import url_cache
+import html_extract
+import noise_filter
+from domain_scheduler import domain_scheduler, domain_of, DomainSlotTimeout
+import image_ocr
+from ocr_backends import ocr_router, glm4v_backend
+
 # OCR 支持（可选，用于图片文字提取）
 try:
     from PIL import Image
@@ -18,12 +30,15 @@ except ImportError:
     OCR_AVAILABLE = False
     print("⚠️ OCR 功能未安装，图片处理将使用备选方案")
 
-# Playwright 支持（可选，用于浏览器自动化抓取）
+# 跨进程文件锁（Windows 上不可用时只使用进程内的锁）
 try:
-    from playwright.sync_api import sync_playwright
-    PLAYWRIGHT_AVAILABLE = True
+    import fcntl
 except ImportError:
-    PLAYWRIGHT_AVAILABLE = False
+    fcntl = None
+
+# Playwright 支持（可选，用于浏览器自动化抓取，浏览器由 browser_pool 常驻复用）
+from browser_pool import browser_pool, PLAYWRIGHT_AVAILABLE
+if not PLAYWRIGHT_AVAILABLE:
     print("💡 Playwright 未安装，微信公众号链接可能无法抓取需要验证的内容")
     print("   安装命令: pip install playwright && playwright install chromium")
 
@@ -33,34 +48,49 @@ env_path = pathlib.Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
 # 2. 初始化客户端
-try:
-    # DeepSeek 客户端（用于文本解析）
-    openai_client = OpenAI(
-        api_key=os.getenv("deepseek_API_KEY"),
-        base_url="https://api.deepseek.com"
-    )
-    
-    # 智谱AI GLM-4V 客户端（用于图片识别）
-    zhipu_api_key = os.getenv("ZHIPU_API_KEY")
-    zhipu_base_url = os.getenv("ZHIPU_BASE_URL", "https://open.bigmodel.cn/api/paas/v4")
-    zhipu_model = os.getenv("ZHIPU_MODEL", "glm-4v")
-    
-    if zhipu_api_key:
-        zhipu_client = OpenAI(
-            api_key=zhipu_api_key,
-            base_url=zhipu_base_url
+openai_client = None
+zhipu_client = None
+supabase: Client = None
+zhipu_model = os.getenv("ZHIPU_MODEL", "glm-4v")
+
+def init_clients():
+    """
+    创建 DeepSeek / 智谱AI / Supabase 客户端
+    模块导入时调用一次；多进程部署时由 gunicorn 的 post_fork 钩子在每个 worker 中重新调用，
+    避免 fork 前创建的连接池被多个进程共享
+    """
+    global openai_client, zhipu_client, supabase, zhipu_model
+    try:
+        # DeepSeek 客户端（用于文本解析）
+        openai_client = OpenAI(
+            api_key=os.getenv("deepseek_API_KEY"),
+            base_url="https://api.deepseek.com"
         )
-        print("✅ 智谱AI GLM-4V 客户端初始化成功")
-    else:
-        zhipu_client = None
-        print("⚠️ 智谱AI API Key 未配置，图片识别将使用OCR")
-    
-    url: str = os.getenv("SUPABASE_URL")
-    key: str = os.getenv("SUPABASE_KEY")
-    supabase: Client = create_client(url, key)
-except Exception as e:
-    print(f"❌ 初始化失败，请检查 .env 文件配置: {e}")
-    exit(1)
+        
+        # 智谱AI GLM-4V 客户端（用于图片识别）
+        zhipu_api_key = os.getenv("ZHIPU_API_KEY")
+        zhipu_base_url = os.getenv("ZHIPU_BASE_URL", "https://open.bigmodel.cn/api/paas/v4")
+        zhipu_model = os.getenv("ZHIPU_MODEL", "glm-4v")
+        
+        if zhipu_api_key:
+            zhipu_client = OpenAI(
+                api_key=zhipu_api_key,
+                base_url=zhipu_base_url
+            )
+            print("✅ 智谱AI GLM-4V 客户端初始化成功")
+        else:
+            zhipu_client = None
+            print("⚠️ 智谱AI API Key 未配置，图片识别将使用OCR")
+        glm4v_backend.configure(zhipu_client, zhipu_model)
+        
+        url: str = os.getenv("SUPABASE_URL")
+        key: str = os.getenv("SUPABASE_KEY")
+        supabase = create_client(url, key)
+    except Exception as e:
+        print(f"❌ 初始化失败，请检查 .env 文件配置: {e}")
+        exit(1)
+
+init_clients()
 
 # 3. 核心 Prompt
 SYSTEM_PROMPT = """
@@ -150,6 +180,34 @@ def normalize_title(title):
     normalized = normalized.replace('"', '').replace('"', '').replace('"', '').replace('"', '')
     return normalized.strip()
 
+DEDUP_LOCK_DIR = pathlib.Path(os.getenv('DEDUP_LOCK_DIR', pathlib.Path(__file__).parent.parent / 'uploads' / 'locks'))
+_dedup_locks = {}
+_dedup_locks_guard = threading.Lock()
+
+@contextmanager
+def dedup_lock(event_type):
+    """
+    串行化同一类型活动的「检查重复 + 写入」
+    批量采集并发处理、或批量条目与 /api/ingest 同时写入时，两条相同的活动可能都通过 check_duplicate 再各自插入；
+    去重按类型模糊比较标题（包含关系 + 相似度），无法按标题精确加锁，因此按类型加锁。
+    进程内使用 threading.Lock，多个 worker 进程之间使用 DEDUP_LOCK_DIR 中的文件锁
+    """
+    key = hashlib.sha1(str(event_type).encode('utf-8')).hexdigest()[:16]
+    with _dedup_locks_guard:
+        lock = _dedup_locks.setdefault(key, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        DEDUP_LOCK_DIR.mkdir(parents=True, exist_ok=True)
+        with open(DEDUP_LOCK_DIR / f'dedup-{key}.lock', 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+@metrics.timed('check_duplicate', outcome=lambda r: 'duplicate' if r[0] else 'ok')
 def check_duplicate(title, event_type, source_group=None):
     """
     检查是否存在重复数据（使用标准化标题）
@@ -193,205 +251,70 @@ def check_duplicate(title, event_type, source_group=None):
         
     except Exception as e:
         print(f"⚠️ 检查重复数据时出错: {e}")
+        metrics.provider_error('supabase', e)
         return False, None
 
 def _is_wechat_url(url):
     """检测是否为微信公众号链接"""
     return 'mp.weixin.qq.com' in url
 
-def _clean_html_content(html):
-    """清理 HTML 内容，移除脚本和样式"""
-    # 移除脚本
-    html = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    # 移除样式
-    html = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    return html
-
-def _extract_wechat_content(html):
-    """从微信公众号 HTML 中提取正文内容，包括图片中的文字（OCR）"""
-    soup = BeautifulSoup(html, 'html.parser')
-    
+def _extract_wechat_content(doc, stats=None):
+    """
+    从微信公众号页面中提取正文内容，包括图片中的文字（OCR）
+    doc: html_extract.parse_page() 的解析结果（每个页面只解析一次）
+    stats: 可选 dict，写入干扰信息清理的统计（keywords 为内容中残留的干扰关键词）
+    """
     # 检查是否是验证页面
-    page_text = soup.get_text()
+    page_text = doc['text']
     if '环境异常' in page_text or '完成验证后即可继续访问' in page_text:
         return None
     
-    # 微信公众号文章内容选择器
-    content_selectors = [
-        '#js_content',
-        '.rich_media_content',
-        '#activity-name',
-        '.rich_media_title'
-    ]
-    
+    # 微信公众号文章内容选择器（#js_content、.rich_media_content、#activity-name、.rich_media_title）
     article_parts = []
-    for selector in content_selectors:
-        elements = soup.select(selector)
-        for elem in elements:
-            text = elem.get_text(separator='\n', strip=True)
+    for selector, texts in doc['sections']:
+        for text in texts:
             if text and len(text) > 20:  # 过滤太短的内容
                 article_parts.append(text)
     
     # 如果没有找到特定选择器的内容，尝试从 body 提取
     # 注意：不要在这里返回 None，因为后面还有 OCR 处理
     if not article_parts:
-        body = soup.find('body')
-        if body:
-            body_text = body.get_text(separator='\n', strip=True)
-            # 如果内容长度足够，尝试提取（即使有干扰信息，也先提取，后面会清理）
-            if len(body_text) > 100:
-                article_parts.append(body_text)
+        body_text = doc['text']
+        # 如果内容长度足够，尝试提取（即使有干扰信息，也先提取，后面会清理）
+        if len(body_text) > 100:
+            article_parts.append(body_text)
     
     # 提取文章中的图片并OCR识别文字（即使正文为空也要执行）
+    ocr_texts = []  # 单独收集OCR文字，避免被清理
     if OCR_AVAILABLE:
         try:
-            # 查找文章内容区域中的所有图片
-            content_area = soup.select_one('#js_content, .rich_media_content')
-            if content_area:
-                images = content_area.find_all('img')
+            # 文章内容区域中的所有图片（微信公众号图片通常使用 data-src 懒加载）
+            images = doc['images']
+            if images:
                 print(f"📷 发现 {len(images)} 张图片，尝试OCR提取文字...")
                 
-                ocr_texts = []  # 单独收集OCR文字，避免被清理
-                
-                for idx, img in enumerate(images):
-                    # 微信公众号图片通常使用 data-src 懒加载
-                    img_url = img.get('data-src') or img.get('src') or img.get('data-original')
-                    if not img_url:
-                        print(f"  ⚠️ 图片 {idx+1} 没有找到URL")
-                        continue
-                    
-                    print(f"  🔍 图片 {idx+1} URL: {img_url[:100]}...")
-                    
-                    # 处理相对URL
-                    if img_url.startswith('//'):
-                        img_url = 'https:' + img_url
-                    elif img_url.startswith('/'):
-                        img_url = 'https://mp.weixin.qq.com' + img_url
-                    elif not img_url.startswith('http'):
-                        # 可能是相对路径
-                        img_url = 'https://mp.weixin.qq.com/' + img_url.lstrip('/')
-                    
-                    # 跳过小图标和表情，但保留可能的正文图片
-                    # 微信公众号正文图片通常包含 mmbiz、mmecoa 或 wx_fmt
-                    if 'mmbiz' not in img_url and 'mmecoa' not in img_url and 'wx_fmt' not in img_url and 'qpic.cn' not in img_url:
-                        # 检查图片尺寸，如果太小可能是图标
-                        img_width = img.get('width') or img.get('data-width')
-                        img_height = img.get('height') or img.get('data-height')
-                        if img_width and img_height:
-                            try:
-                                if int(img_width) < 100 or int(img_height) < 100:
-                                    print(f"  ⏭️ 图片 {idx+1} 尺寸太小，跳过")
-                                    continue
-                            except:
-                                pass
-                        # 如果无法判断尺寸，也尝试OCR（可能是正文图片）
-                    
-                    try:
-                        # 下载图片
-                        print(f"  📥 下载图片 {idx+1}...")
-                        resp = requests.get(img_url, timeout=15, headers={
-                            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-                            'Referer': 'https://mp.weixin.qq.com/'
-                        })
-                        if resp.status_code == 200:
-                            # 保存临时文件
-                            import tempfile
-                            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                                tmp_file.write(resp.content)
-                                tmp_path = tmp_file.name
-                            
-                            print(f"  🔍 开始OCR识别图片 {idx+1}...")
-                            # OCR提取文字
-                            ocr_text = extract_text_from_image(tmp_path)
-                            if ocr_text and len(ocr_text.strip()) > 10:
-                                print(f"  ✅ 图片 {idx+1} OCR成功: {len(ocr_text)} 字符")
-                                print(f"  📝 OCR内容预览: {ocr_text[:200]}...")
-                                ocr_texts.append(f"[图片{idx+1}文字]: {ocr_text}")
-                            else:
-                                print(f"  ⚠️ 图片 {idx+1} OCR未提取到有效文字")
-                            
-                            # 清理临时文件
-                            os.unlink(tmp_path)
-                        else:
-                            print(f"  ⚠️ 图片 {idx+1} 下载失败: HTTP {resp.status_code}")
-                    except Exception as e:
-                        print(f"  ⚠️ 图片 {idx+1} OCR失败: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        continue
-                
-                # 将OCR文字添加到内容中（在清理之前）
+                # 预筛选、缓存、并行下载和识别都在 image_ocr 中完成
+                refs = ((idx, src, attrs) for idx, (src, attrs) in enumerate(images))
+                ocr_texts = image_ocr.ocr_article_images(refs, headers=http_client.WECHAT_HEADERS)
                 if ocr_texts:
                     print(f"📝 共提取 {len(ocr_texts)} 张图片的文字，合并到正文...")
-                    article_parts.extend(ocr_texts)
         except Exception as e:
             print(f"⚠️ 图片OCR处理出错: {e}")
             import traceback
             traceback.print_exc()
     
-    if article_parts:
-        content = '\n\n'.join(article_parts)
-        
-        # 分离OCR文字和正文，保护OCR文字不被清理
-        lines = content.split('\n')
-        ocr_lines = []
-        text_lines = []
-        
-        for line in lines:
-            if line.strip().startswith('[图片') and '文字]:' in line:
-                ocr_lines.append(line)  # 保留OCR文字
-            else:
-                text_lines.append(line)
-        
-        # 只清理正文部分
-        text_content = '\n'.join(text_lines)
-        noise_patterns = [
-            r'在小说阅读器中沉浸阅读',
-            r'预览时标签不可点',
-            r'微信扫一扫[^，。]*',
-            r'关注该公众号',
-            r'继续滑动看下一个',
-            r'轻触阅读原文',
-            r'向上滑动看下一个',
-            r'知道了',
-            r'取消\s*允许',
-            r'允许\s*取消',
-            r'使用小程序',
-            r'分析',
-            r'使用完整服务',
-            r'视频',
-            r'小程序',
-            r'赞[^，。]*取消赞',
-            r'在看[^，。]*取消在看',
-            r'分享',
-            r'留言',
-            r'收藏',
-            r'听过',
-            r'×',
-            r'：\s*，',
-            r'，\s*，',
-            r'^\s*原创\s*$',
-            r'^\s*TIANYAN\s*$',
-        ]
-        for pattern in noise_patterns:
-            text_content = re.sub(pattern, '', text_content, flags=re.IGNORECASE | re.MULTILINE)
-        
-        # 清理多余空行和标点
-        text_content = re.sub(r'\n{3,}', '\n\n', text_content)
-        text_content = re.sub(r'[，。]{2,}', '。', text_content)
-        text_content = text_content.strip()
-        
-        # 合并清理后的正文和OCR文字
-        if ocr_lines:
-            content = text_content + '\n\n' + '\n\n'.join(ocr_lines)
-        else:
-            content = text_content
+    if article_parts or ocr_texts:
+        # 一次扫描清理正文中的干扰信息（规则见 config/noise_patterns.json），OCR文字不参与清理
+        stats = {} if stats is None else stats
+        content = noise_filter.wechat_noise_filter.clean('\n\n'.join(article_parts), stats)
+        if ocr_texts:
+            ocr_content = '\n\n'.join(ocr_texts)
+            noise_filter.wechat_noise_filter.scan(ocr_content, stats)
+            content = (content + '\n\n' + ocr_content) if content else ocr_content
         
         # 检查清理后的内容质量
         # 如果干扰信息占比过高，返回 None
-        remaining_noise = ['微信扫一扫', '关注该公众号', '取消', '允许', '知道了']
-        noise_ratio = sum(1 for keyword in remaining_noise if keyword in content) / max(len(content.split()), 1)
-        if noise_ratio > 0.1:  # 如果干扰信息占比超过10%，视为质量差
+        if noise_filter.NoiseFilter.noise_ratio(stats, content) > 0.1:  # 如果干扰信息占比超过10%，视为质量差
             return None
         
         # 如果清理后内容太少，返回 None
@@ -402,41 +325,53 @@ def _extract_wechat_content(html):
     
     return None
 
-def _fetch_url_content_http(url, is_wechat=False):
+@metrics.timed('http_fetch', outcome=lambda r: 'ok' if r[0] else 'empty')
+def _fetch_url_content_http(url, is_wechat=False, cancel=None, validators=None):
     """
     策略 A：快速 HTTP 抓取
     参考 VC Copilot 的实现方式
+    cancel: 并行抓取时由其他策略成功后设置，中断下载并抛出 FetchCancelled
+    validators: 可选 dict，写入响应头中的 etag / last_modified，用于缓存条件请求
     """
     try:
         headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
         }
         
         if is_wechat:
-            headers['Referer'] = 'https://mp.weixin.qq.com/'
+            headers.update(http_client.WECHAT_HEADERS)
         
-        resp = requests.get(url, headers=headers, timeout=30, allow_redirects=True)
+        resp = http_client.get(url, headers=headers, timeout=30, allow_redirects=True, stream=True)
         
         if resp.status_code != 200:
+            resp.close()
+            metrics.provider_error('http', f'http_{resp.status_code}')
+            if resp.status_code == 429:
+                domain_scheduler.report_blocked(url, 'http_429')
             return False, None
         
+        if validators is not None:
+            validators['etag'] = resp.headers.get('ETag')
+            validators['last_modified'] = resp.headers.get('Last-Modified')
+        page = http_client.read_text(resp, cancel)
+        
         # 先检查是否需要验证（在清理 HTML 前检查，更快）
-        if '环境异常' in resp.text or '完成验证后即可继续访问' in resp.text or '去验证' in resp.text:
+        if '环境异常' in page or '完成验证后即可继续访问' in page or '去验证' in page:
             print(f"⚠️ 检测到验证页面，HTTP 抓取失败")
+            domain_scheduler.report_blocked(url)
             return False, None
         
-        html = _clean_html_content(resp.text)
+        # 只解析一次：script / style 在解析后的文档树上删除，标题、正文和图片一次取出
+        doc = html_extract.parse_page(page)
         
         # 针对微信公众号的特殊处理
         if is_wechat:
-            content = _extract_wechat_content(html)
+            stats = {}
+            content = _extract_wechat_content(doc, stats)
             # 提高内容质量要求：至少 200 字符，且不能全是干扰信息
             if content and len(content) >= 200:
-                # 检查内容质量：如果干扰信息占比过高，视为失败
-                noise_keywords = ['微信扫一扫', '关注该公众号', '取消', '允许', '知道了']
-                noise_count = sum(1 for keyword in noise_keywords if keyword in content)
+                # 检查内容质量：如果干扰信息占比过高，视为失败（残留关键词在清理时已统计，不再扫描全文）
+                noise_count = len(stats.get('keywords', ()))
                 if noise_count > 3:  # 如果干扰关键词超过3个，可能内容质量差
                     print(f"⚠️ 提取的内容质量不足（干扰信息过多），尝试其他方法...")
                     return False, None
@@ -445,246 +380,279 @@ def _fetch_url_content_http(url, is_wechat=False):
                 print(f"⚠️ 提取的内容长度不足（{len(content)} 字符），可能包含干扰信息")
                 return False, None
         
-        # 普通网页：提取正文内容
-        soup = BeautifulSoup(html, 'html.parser')
-        text_content = soup.get_text(separator='\n', strip=True)
+        # 普通网页：提取正文内容（复用上面的解析结果）
+        text_content = '\n'.join(part for part in (doc['title'], doc['text']) if part)
         
         if len(text_content) > 100:
             return True, text_content[:5000]
         
         return False, None
         
-    except requests.exceptions.Timeout:
+    except http_client.FetchCancelled:
+        raise
+    except requests.exceptions.Timeout as e:
+        metrics.provider_error('http', e)
         return False, None
     except Exception as e:
         print(f"⚠️ HTTP 抓取失败: {e}")
+        metrics.provider_error('http', e)
         return False, None
 
+# 等待正文渲染完成的条件：#js_content 有文字，且其中的图片都已有地址（data-src 或 src）
+WECHAT_CONTENT_READY_JS = """() => {
+    const el = document.querySelector('#js_content') || document.querySelector('.rich_media_content');
+    if (!el || el.innerText.trim().length < 50) return false;
+    return Array.from(el.querySelectorAll('img')).every(img => img.getAttribute('data-src') || img.getAttribute('src'));
+}"""
+# 页面中提取正文文字和图片地址（在浏览器线程中执行，只返回普通数据）
+WECHAT_SNAPSHOT_JS = """(selectors) => selectors.map(selector => {
+    const el = document.querySelector(selector);
+    if (!el) return null;
+    return {
+        text: el.innerText,
+        images: Array.from(el.querySelectorAll('img')).map(img => ({
+            src: img.getAttribute('data-src') || img.getAttribute('src'),
+            attrs: Object.fromEntries(['data-w', 'data-ratio', 'data-type', 'width', 'height']
+                .filter(name => img.hasAttribute(name)).map(name => [name, img.getAttribute(name)])),
+        })),
+    };
+})"""
+WECHAT_CONTENT_SELECTORS = ['#js_content', '.rich_media_content']
+PLAYWRIGHT_WAIT_TIMEOUT = int(os.getenv('PLAYWRIGHT_WAIT_TIMEOUT', 8000))
+
+def _wechat_page_snapshot(page, url):
+    """在浏览器池线程中打开页面，等待正文渲染后返回各选择器的文字、图片地址和页面 HTML"""
+    page.goto(url, wait_until='domcontentloaded', timeout=30000)
+    try:
+        # 等待具体的 DOM 条件，而不是固定 sleep；条件满足后立即继续
+        page.wait_for_function(WECHAT_CONTENT_READY_JS, timeout=PLAYWRIGHT_WAIT_TIMEOUT)
+    except Exception:
+        pass  # 超时（如验证页面），按已渲染的内容处理
+    return {
+        'sections': page.evaluate(WECHAT_SNAPSHOT_JS, WECHAT_CONTENT_SELECTORS),
+        'html': page.content(),
+    }
+
+@metrics.timed('playwright', outcome=lambda r: 'ok' if r[0] else 'empty')
 def _fetch_wechat_with_playwright(url):
     """
     策略 B：Playwright 浏览器自动化抓取
     参考 VC Copilot 的实现方式
-    仅在 HTTP 抓取失败时使用
+    仅在 HTTP 抓取失败时使用；浏览器来自常驻的 browser_pool，不再每次冷启动
     """
     if not PLAYWRIGHT_AVAILABLE:
         return False, None
     
     try:
-        with sync_playwright() as p:
-            # 启动无头浏览器
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                viewport={'width': 1920, 'height': 1080}
-            )
-            page = context.new_page()
-            
-            # 访问页面
-            page.goto(url, wait_until='domcontentloaded', timeout=30000)
-            
-            # 等待页面完全加载（微信公众号内容可能需要 JavaScript 动态加载）
-            import time
-            time.sleep(3)  # 等待 3 秒让 JavaScript 执行
-            
-            # 尝试滚动页面以触发懒加载
-            page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            time.sleep(2)
-            page.evaluate("window.scrollTo(0, 0)")
-            time.sleep(1)
-            
-            # 等待内容加载（使用更宽松的条件）
-            try:
-                # 等待页面标题或任何内容元素
-                page.wait_for_load_state('networkidle', timeout=10000)
-            except:
-                pass  # 如果超时，继续处理
-            
-            # 尝试多种方式获取内容
-            content = None
-            
-            # 方法 1: 尝试获取 #js_content（包括图片OCR）
-            try:
-                js_content_elem = page.query_selector('#js_content')
-                if js_content_elem:
-                    content = js_content_elem.inner_text()
-                    
-                    # 提取图片并OCR
-                    if OCR_AVAILABLE:
-                        try:
-                            images = js_content_elem.query_selector_all('img')
-                            print(f"📷 Playwright 发现 {len(images)} 张图片，尝试OCR提取文字...")
-                            image_texts = []
-                            
-                            for idx, img in enumerate(images):
-                                try:
-                                    img_src = img.get_attribute('data-src') or img.get_attribute('src')
-                                    if not img_src or 'mmbiz' not in img_src and 'wx_fmt' not in img_src:
-                                        continue
-                                    
-                                    # 处理URL
-                                    if img_src.startswith('//'):
-                                        img_src = 'https:' + img_src
-                                    elif img_src.startswith('/'):
-                                        img_src = 'https://mp.weixin.qq.com' + img_src
-                                    
-                                    # 下载图片
-                                    resp = requests.get(img_src, timeout=10, headers={
-                                        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-                                    })
-                                    if resp.status_code == 200:
-                                        import tempfile
-                                        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                                            tmp_file.write(resp.content)
-                                            tmp_path = tmp_file.name
-                                        
-                                        ocr_text = extract_text_from_image(tmp_path)
-                                        if ocr_text and len(ocr_text.strip()) > 10:
-                                            print(f"  ✅ 图片 {idx+1} OCR成功: {len(ocr_text)} 字符")
-                                            image_texts.append(f"[图片{idx+1}文字]: {ocr_text}")
-                                        
-                                        os.unlink(tmp_path)
-                                except Exception as e:
-                                    print(f"  ⚠️ 图片 {idx+1} OCR失败: {e}")
-                                    continue
-                            
-                            if image_texts:
-                                content = content + '\n\n' + '\n\n'.join(image_texts)
-                        except Exception as e:
-                            print(f"⚠️ 图片OCR处理出错: {e}")
-                    
-                    if content and len(content) > 100:
-                        print(f"✅ Playwright 通过 #js_content 获取内容 {len(content)} 字符")
-                        browser.close()
-                        return True, content[:5000]
-            except:
-                pass
-            
-            # 方法 2: 尝试获取 .rich_media_content（包括图片OCR）
-            try:
-                rich_content_elem = page.query_selector('.rich_media_content')
-                if rich_content_elem:
-                    content = rich_content_elem.inner_text()
-                    
-                    # 提取图片并OCR（与方法1相同的逻辑）
-                    if OCR_AVAILABLE:
-                        try:
-                            images = rich_content_elem.query_selector_all('img')
-                            print(f"📷 Playwright 发现 {len(images)} 张图片，尝试OCR提取文字...")
-                            image_texts = []
-                            
-                            for idx, img in enumerate(images):
-                                try:
-                                    img_src = img.get_attribute('data-src') or img.get_attribute('src')
-                                    if not img_src or 'mmbiz' not in img_src and 'wx_fmt' not in img_src:
-                                        continue
-                                    
-                                    if img_src.startswith('//'):
-                                        img_src = 'https:' + img_src
-                                    elif img_src.startswith('/'):
-                                        img_src = 'https://mp.weixin.qq.com' + img_src
-                                    
-                                    resp = requests.get(img_src, timeout=10, headers={
-                                        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-                                    })
-                                    if resp.status_code == 200:
-                                        import tempfile
-                                        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                                            tmp_file.write(resp.content)
-                                            tmp_path = tmp_file.name
-                                        
-                                        ocr_text = extract_text_from_image(tmp_path)
-                                        if ocr_text and len(ocr_text.strip()) > 10:
-                                            print(f"  ✅ 图片 {idx+1} OCR成功: {len(ocr_text)} 字符")
-                                            image_texts.append(f"[图片{idx+1}文字]: {ocr_text}")
-                                        
-                                        os.unlink(tmp_path)
-                                except Exception as e:
-                                    print(f"  ⚠️ 图片 {idx+1} OCR失败: {e}")
-                                    continue
-                            
-                            if image_texts:
-                                content = content + '\n\n' + '\n\n'.join(image_texts)
-                        except Exception as e:
-                            print(f"⚠️ 图片OCR处理出错: {e}")
-                    
-                    if content and len(content) > 100:
-                        print(f"✅ Playwright 通过 .rich_media_content 获取内容 {len(content)} 字符")
-                        browser.close()
-                        return True, content[:5000]
-            except:
-                pass
-            
-            # 方法 3: 从整个页面 HTML 中提取
-            html = page.content()
-            browser.close()
-            
-            # 提取内容
-            html = _clean_html_content(html)
-            content = _extract_wechat_content(html)
+        with domain_scheduler.slot(url):
+            snapshot = browser_pool.run(lambda page: _wechat_page_snapshot(page, url))
+        if '环境异常' in snapshot['html'] or '完成验证后即可继续访问' in snapshot['html']:
+            print(f"⚠️ Playwright 遇到验证页面")
+            domain_scheduler.report_blocked(url)
+            return False, None
+        
+        # 方法 1 / 2: 依次尝试 #js_content、.rich_media_content（包括图片OCR）
+        for selector, section in zip(WECHAT_CONTENT_SELECTORS, snapshot['sections']):
+            if not section:
+                continue
+            content = section['text']
             
-            if content and len(content) >= 200:  # 提高质量要求
-                # 检查内容质量
-                noise_keywords = ['微信扫一扫', '关注该公众号', '取消', '允许', '知道了']
-                noise_count = sum(1 for keyword in noise_keywords if keyword in content)
-                if noise_count <= 3:  # 干扰信息不多
-                    print(f"✅ Playwright 通过 HTML 解析获取内容 {len(content)} 字符")
-                    return True, content[:5000]
+            if OCR_AVAILABLE:
+                try:
+                    print(f"📷 Playwright 发现 {len(section['images'])} 张图片，尝试OCR提取文字...")
+                    refs = ((idx, img['src'], img['attrs']) for idx, img in enumerate(section['images']))
+                    image_texts = image_ocr.ocr_article_images(refs, headers=http_client.WECHAT_HEADERS)
+                    if image_texts:
+                        content = content + '\n\n' + '\n\n'.join(image_texts)
+                except Exception as e:
+                    print(f"⚠️ 图片OCR处理出错: {e}")
             
-            return False, None
+            if content and len(content) > 100:
+                print(f"✅ Playwright 通过 {selector} 获取内容 {len(content)} 字符")
+                return True, content[:5000]
+        
+        # 方法 3: 从整个页面 HTML 中提取
+        stats = {}
+        content = _extract_wechat_content(html_extract.parse_page(snapshot['html']), stats)
+        
+        if content and len(content) >= 200:  # 提高质量要求
+            # 检查内容质量（残留的干扰关键词在清理时已统计）
+            noise_count = len(stats.get('keywords', ()))
+            if noise_count <= 3:  # 干扰信息不多
+                print(f"✅ Playwright 通过 HTML 解析获取内容 {len(content)} 字符")
+                return True, content[:5000]
+        
+        return False, None
             
     except Exception as e:
         print(f"⚠️ Playwright 抓取失败: {e}")
+        metrics.provider_error('playwright', e)
         return False, None
 
-def extract_content_from_url(url):
+@metrics.timed('jina', outcome=lambda r: 'ok' if r[0] else 'empty')
+def _fetch_url_content_jina(url, is_wechat=False, cancel=None, validators=None):
+    """
+    Jina Reader API 抓取（最可靠，支持微信公众号）
+    返回 (success, content)；cancel 的含义与 _fetch_url_content_http 相同
+    """
+    try:
+        resp = http_client.get(f"https://r.jina.ai/{url}", timeout=60, stream=True)
+        if resp.status_code != 200:
+            resp.close()
+            metrics.provider_error('jina', f'http_{resp.status_code}')
+            return False, None
+        text = http_client.read_text(resp, cancel)
+        # 检查是否是错误页面
+        if len(text) > 100 and '环境异常' not in text and '完成验证后即可继续访问' not in text:
+            return True, text[:5000]
+        return False, None
+    except http_client.FetchCancelled:
+        raise
+    except requests.exceptions.Timeout as e:
+        print(f"⚠️ Jina Reader 超时（60秒）")
+        metrics.provider_error('jina', e)
+        return False, None
+    except Exception as e:
+        print(f"⚠️ Jina Reader 失败: {e}")
+        metrics.provider_error('jina', e)
+        return False, None
+
+def _fetch_url_content_direct(url, is_wechat=False, cancel=None, validators=None):
+    """
+    直接 HTTP 抓取，内容不足 200 字符视为失败
+    直接访问源站，按域名限制并发和请求间隔（domain_scheduler），等待名额超时视为失败
+    """
+    try:
+        with domain_scheduler.slot(url, cancel=cancel):
+            success, content = _fetch_url_content_http(url, is_wechat=is_wechat, cancel=cancel, validators=validators)
+    except DomainSlotTimeout as e:
+        print(f"⏳ 跳过直接抓取: {e}")
+        return False, None
+    if success and content and len(content) >= 200:
+        domain_scheduler.report_ok(url)
+        return True, content
+    return False, None
+
+FETCH_STRATEGIES = {
+    'jina': _fetch_url_content_jina,
+    'http': _fetch_url_content_direct,
+}
+# hedged：同时启动所有策略，采用第一个通过质量检查的结果；sequential：按顺序逐个尝试（原实现）
+FETCH_MODE = os.getenv('FETCH_MODE', 'hedged')
+# 策略顺序：sequential 模式下的尝试顺序；hedged 模式下多个策略同时成功时的优先级
+FETCH_ORDER = [name.strip() for name in os.getenv('FETCH_ORDER', 'jina,http').split(',') if name.strip() in FETCH_STRATEGIES] or ['jina', 'http']
+# 每个进程用于并行抓取的线程数（每个链接占用 len(FETCH_ORDER) 个线程）
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', 16))
+# 直接访问源站的策略：域名冷却期内跳过，只用 Jina Reader
+DIRECT_STRATEGIES = {'http'}
+
+_fetch_executor = None
+_fetch_executor_pid = None
+_fetch_executor_lock = threading.Lock()
+
+def _get_fetch_executor():
+    # 线程池按进程懒创建，fork 后重新创建
+    global _fetch_executor, _fetch_executor_pid
+    with _fetch_executor_lock:
+        if _fetch_executor is None or _fetch_executor_pid != os.getpid():
+            _fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+            _fetch_executor_pid = os.getpid()
+        return _fetch_executor
+
+def _validators_of(validators, name):
+    """策略 name 写入 etag / last_modified 的 dict（各策略分开记录）"""
+    return None if validators is None else validators.setdefault(name, {})
+
+def _fetch_hedged(url, is_wechat, validators=None, order=None):
+    """
+    同时启动所有策略，返回 (策略名, 内容)，都失败时返回 (None, None)
+    validators: 可选 dict，策略名 -> 该策略写入的 etag / last_modified（各策略分开记录，只保存胜出策略的）
+    某个策略成功后设置 cancel：其他策略正在下载正文时立即中断；
+    仍在等待响应头的请求无法中断，会在各自超时内结束，结果被丢弃
+    """
+    cancel = threading.Event()
+    executor = _get_fetch_executor()
+    futures = {executor.submit(FETCH_STRATEGIES[name], url, is_wechat, cancel, _validators_of(validators, name)): name
+               for name in order or FETCH_ORDER}
+    try:
+        for future in as_completed(futures):
+            try:
+                success, content = future.result()
+            except Exception:
+                continue
+            if success:
+                return futures[future], content
+        return None, None
+    finally:
+        cancel.set()
+        for future in futures:
+            future.cancel()
+
+def _fetch_sequential(url, is_wechat, validators=None, order=None):
+    for name in order or FETCH_ORDER:
+        success, content = FETCH_STRATEGIES[name](url, is_wechat, validators=_validators_of(validators, name))
+        if success:
+            return name, content
+    return None, None
+
+@metrics.timed('fetch_url', outcome=lambda r: 'ok' if r else 'empty')
+def extract_content_from_url(url, use_cache=True):
     """
     抓取网页/公众号正文
-    参考 VC Copilot 的双策略抓取机制：
-    1. 先尝试快速 HTTP 抓取
-    2. 如果失败或内容不足，使用 Playwright（仅微信公众号）
+    0. 按规范化 URL 查抓取缓存（use_cache=False 时跳过，重新抓取并更新缓存）
+    1. Jina Reader 和直接 HTTP 抓取同时进行（FETCH_MODE=hedged），采用先成功的结果
+    2. 都失败时，使用 Playwright（仅微信公众号）
+    源站返回验证页后该域名进入冷却期（domain_scheduler），冷却期内跳过直接 HTTP 和 Playwright，只用 Jina Reader
+    各策略的耗时、结果和胜出次数记录在 /metrics 中，可据此调整 FETCH_ORDER / FETCH_MODE
     """
     print(f"🌐 正在抓取链接内容: {url}...")
     
-    is_wechat = _is_wechat_url(url)
+    if use_cache:
+        content = url_cache.get(url)
+        if content:
+            metrics.fetch_wins.inc(strategy='cache')
+            print(f"✅ 使用缓存内容 {len(content)} 字符")
+            return content
     
-    # 尝试方法 1: Jina Reader API（最可靠，支持微信公众号）
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        jina_url = f"https://r.jina.ai/{url}"
-        resp = requests.get(jina_url, headers=headers, timeout=60)
-        if resp.status_code == 200 and len(resp.text) > 100:
-            # 检查是否是错误页面
-            if '环境异常' not in resp.text and '完成验证后即可继续访问' not in resp.text:
-                content = resp.text[:5000]
-                print(f"✅ Jina Reader 成功抓取 {len(content)} 字符")
-                return content
-    except requests.exceptions.Timeout:
-        print(f"⚠️ Jina Reader 超时（60秒），尝试 HTTP 抓取...")
-    except Exception as e:
-        print(f"⚠️ Jina Reader 失败: {e}，尝试 HTTP 抓取...")
+    is_wechat = _is_wechat_url(url)
+    validators = {}
     
-    # 策略 A：快速 HTTP 抓取
-    print(f"⚡ 尝试快速 HTTP 抓取...")
-    success, content = _fetch_url_content_http(url, is_wechat=is_wechat)
+    order = FETCH_ORDER
+    cooling = domain_scheduler.in_cooldown(url)
+    if cooling:
+        order = [name for name in FETCH_ORDER if name not in DIRECT_STRATEGIES] or ['jina']
+        print(f"🚦 {domain_of(url)} 冷却中，跳过直接抓取")
     
-    if success and content and len(content) >= 200:
-        print(f"✅ HTTP 抓取成功 {len(content)} 字符")
+    if FETCH_MODE == 'sequential':
+        winner, content = _fetch_sequential(url, is_wechat, validators, order)
+    else:
+        print(f"⚡ 同时尝试 {' / '.join(order)} 抓取...")
+        winner, content = _fetch_hedged(url, is_wechat, validators, order)
+    
+    if winner:
+        metrics.fetch_wins.inc(strategy=winner)
+        print(f"✅ {winner} 抓取成功 {len(content)} 字符")
+        # 只保存胜出策略的 etag / last_modified：Jina 的内容不能用源站页面的 ETag 做条件请求
+        url_cache.put(url, content, validators.get(winner), source=winner)
         return content
     
-    # 策略 B：Playwright 浏览器自动化（仅微信公众号且 HTTP 失败时）
-    if is_wechat and (not success or not content or len(content) < 200):
+    # 策略 B：Playwright 浏览器自动化（仅微信公众号且其他策略都失败时；冷却期内同样会遇到验证页，跳过）
+    if is_wechat and (cooling or domain_scheduler.in_cooldown(url)):
+        print(f"🚦 {domain_of(url)} 冷却中，跳过 Playwright 抓取")
+    elif is_wechat:
         if PLAYWRIGHT_AVAILABLE:
-            print(f"🎭 HTTP 抓取失败或内容不足，尝试 Playwright 浏览器抓取...")
+            print(f"🎭 Jina / HTTP 抓取失败或内容不足，尝试 Playwright 浏览器抓取...")
             success, content = _fetch_wechat_with_playwright(url)
             
             if success and content:
+                metrics.fetch_wins.inc(strategy='playwright')
                 print(f"✅ Playwright 抓取成功 {len(content)} 字符")
+                url_cache.put(url, content, source='playwright')
                 return content
         else:
             print(f"💡 Playwright 未安装，无法使用浏览器自动化抓取")
     
+    metrics.fetch_wins.inc(strategy='none')
     print(f"❌ 无法抓取该链接内容")
     if is_wechat:
         print(f"💡 该微信公众号文章可能需要验证才能访问")
@@ -692,108 +660,93 @@ def extract_content_from_url(url):
         print(f"💡 或者：在浏览器中打开链接，完成验证后，再复制内容进行识别")
     return None
 
-def extract_text_from_image(image_path):
-    """使用 OCR 从图片中提取文字（备选方案，因为 DeepSeek 不支持图片输入）"""
-    if not OCR_AVAILABLE:
-        print("⚠️ OCR 功能不可用，请安装 pytesseract 和 Pillow")
-        return None
-    
+def _read_image_bytes(image_source):
+    """读取图片的原始字节，支持文件路径、bytes 或文件对象"""
+    if isinstance(image_source, (bytes, bytearray)):
+        return bytes(image_source)
+    if hasattr(image_source, 'read'):
+        if hasattr(image_source, 'seek'):
+            image_source.seek(0)
+        return image_source.read()
+    with open(image_source, 'rb') as f:
+        return f.read()
+
+def extract_text_from_image(image_source, backend=None, allow_paid=None):
+    """
+    从图片中提取文字（DeepSeek 不支持图片输入）
+    image_source 可以是文件路径、bytes 或文件对象
+    backend: 可选，首选的 OCR 后端名（见 ocr_backends）；默认由路由按图片和各后端近期表现选择，失败时自动改用下一个
+    allow_paid: 是否允许路由使用收费后端，默认按 OCR_ALLOW_PAID（未开启时只用本地识别）
+    """
     try:
         print(f"🔍 使用 OCR 提取图片文字...")
-        image = Image.open(image_path)
-        
-        # 使用中文和英文识别，使用更宽松的配置
-        text = pytesseract.image_to_string(image, lang='chi_sim+eng')
-        
-        if text and len(text.strip()) > 10:
-            print(f"✅ OCR 提取成功，共 {len(text)} 字符")
-            print(f"📝 OCR内容预览: {text[:300]}...")  # 显示前300字符用于调试
-            return text.strip()
-        else:
-            print("⚠️ OCR 未能提取到有效文字")
-            return None
+        # tesseract 在 OCR 进程池中使用常驻引擎执行，不再每张图片启动一个子进程
+        text, used = ocr_router.recognize(_read_image_bytes(image_source), prefer=backend,
+                                          executor=image_ocr.get_ocr_executor(), allow_paid=allow_paid)
     except Exception as e:
         print(f"❌ OCR 提取失败: {e}")
         return None
 
-def extract_text_from_image_with_vision(image_path):
-    """使用 GLM-4V 视觉模型从图片中提取文字和理解内容"""
-    if not zhipu_client:
-        print("⚠️ 智谱AI客户端未初始化，回退到OCR")
-        return extract_text_from_image(image_path)
-    
-    try:
-        print(f"🔍 使用 GLM-4V 视觉模型分析图片...")
-        
-        # 读取图片并转为base64
-        with open(image_path, 'rb') as f:
-            image_data = base64.b64encode(f.read()).decode('utf-8')
-        
-        # 构建请求
-        response = zhipu_client.chat.completions.create(
-            model=zhipu_model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_data}"
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": """请仔细分析这张图片，提取所有文字内容。
-
-要求：
-1. 按照图片中文字的布局顺序提取
-2. 保留所有重要信息（标题、日期、时间、地点、公司名称、岗位等）
-3. 如果是海报，请识别主标题、副标题、正文内容
-4. 提取所有数字、日期、时间信息
-5. 保留中英文内容
-
-请直接输出提取的文字内容，不要添加额外说明。"""
-                        }
-                    ]
-                }
-            ]
-        )
-        
-        text = response.choices[0].message.content
-        
-        if text and len(text.strip()) > 10:
-            print(f"✅ GLM-4V 提取成功，共 {len(text)} 字符")
-            print(f"📝 GLM-4V内容预览: {text[:300]}...")
-            return text.strip()
-        else:
-            print("⚠️ GLM-4V 未能提取到有效文字，回退到OCR")
-            return extract_text_from_image(image_path)
-            
-    except Exception as e:
-        print(f"❌ GLM-4V 提取失败: {e}，回退到OCR")
-        return extract_text_from_image(image_path)
+    if text:
+        print(f"✅ OCR 提取成功（{used}），共 {len(text)} 字符")
+        print(f"📝 OCR内容预览: {text[:300]}...")  # 显示前300字符用于调试
+        return text
+    print("⚠️ OCR 未能提取到有效文字")
+    return None
+
+def extract_text_from_image_with_vision(image_source):
+    """
+    优先使用 GLM-4V 视觉模型从图片中提取文字和理解内容（海报版面复杂时效果更好）
+    GLM-4V 不可用、失败或未识别出文字时由 OCR 路由改用其他后端（未设置 OCR_ALLOW_PAID 时只改用本地识别）
+    image_source 可以是文件路径、bytes 或文件对象
+    """
+    return extract_text_from_image(image_source, backend=glm4v_backend.name)
 
-def process_and_save(input_content, input_type="text"):
+@metrics.timed('ingest', outcome=lambda r: 'saved' if r['saved'] else r['reason'])
+def process_and_save(input_content, input_type="text", on_stage=None, use_cache=True):
     """
     核心流程：输入 -> AI 解析 -> 存入数据库
+    
+    on_stage: 可选回调 on_stage(stage)，进入每个阶段时调用，用于异步任务上报进度
+              阶段依次为 fetch（抓取链接）/ ocr（图片识别）、parse、dedup、save
+    use_cache: 为 False 时链接输入跳过抓取缓存，重新抓取
+    
+    返回处理结果：
+    {
+        "saved": True/False,
+        "reason": None | "no_content" | "ai_error" | "invalid" | "duplicate" | "db_error",
+        "event": AI 解析出的结构化数据（解析成功时）,
+        "existing_id": 重复数据的 ID（reason 为 duplicate 时）
+    }
     """
+    def stage(name):
+        if on_stage:
+            on_stage(name)
+    
+    def result(saved, reason=None, event=None, existing_id=None):
+        return {"saved": saved, "reason": reason, "event": event, "existing_id": existing_id}
+    
     messages = [{"role": "system", "content": SYSTEM_PROMPT}]
     is_image_input = False  # 标记是否为图片输入
     
     # --- 1. 预处理输入 ---
     if input_type == "link":
-        content = extract_content_from_url(input_content)
-        if not content: return
+        stage("fetch")
+        content = extract_content_from_url(input_content, use_cache=use_cache)
+        if not content: return result(False, "no_content")
         
         messages.append({"role": "user", "content": f"网页内容：\n{content}"})
     
     elif input_type == "image_url":
         # DeepSeek 不支持图片输入，使用 OCR 提取文字后作为文本处理
         is_image_input = True  # 标记为图片输入
-        if os.path.exists(input_content):
-            # 本地文件：使用 GLM-4V 视觉模型提取文字
-            print(f"📷 读取本地图片文件: {input_content}")
+        stage("ocr")
+        if not isinstance(input_content, str) or os.path.exists(input_content):
+            # 本地文件或内存中的图片（bytes / 文件对象）：使用 GLM-4V 视觉模型提取文字
+            if isinstance(input_content, str):
+                print(f"📷 读取本地图片文件: {input_content}")
+            else:
+                print(f"📷 读取上传的图片内容")
             text_content = extract_text_from_image_with_vision(input_content)
             if text_content:
                 messages.append({"role": "user", "content": f"""这是从海报图片中OCR提取的文字内容：
@@ -810,56 +763,61 @@ def process_and_save(input_content, input_type="text"):
 请从以上OCR文字中提取活动信息："""})
             else:
                 print("❌ 无法从图片中提取文字，请手动输入图片内容")
-                return
+                return result(False, "no_content")
         else:
             # URL：尝试下载后使用 OCR
             print(f"📷 下载图片: {input_content}")
             try:
-                resp = requests.get(input_content, timeout=15)
+                with metrics.track('image_download', provider='image'):
+                    resp = http_client.get(input_content, timeout=15)
                 if resp.status_code == 200:
-                    # 保存临时文件
-                    temp_path = "/tmp/temp_image.jpg"
-                    with open(temp_path, 'wb') as f:
-                        f.write(resp.content)
-                    text_content = extract_text_from_image_with_vision(temp_path)
+                    text_content = extract_text_from_image_with_vision(resp.content)
                     if text_content:
                         messages.append({"role": "user", "content": f"海报图片中的文字内容：\n{text_content}\n\n请从以上文字中提取活动信息："})
                     else:
                         print("❌ 无法从图片中提取文字")
-                        return
-                    # 清理临时文件
-                    os.remove(temp_path)
+                        return result(False, "no_content")
                 else:
                     print(f"❌ 下载图片失败: {resp.status_code}")
-                    return
+                    metrics.provider_error('image', f'http_{resp.status_code}')
+                    return result(False, "no_content")
             except Exception as e:
                 print(f"❌ 处理图片 URL 失败: {e}")
-                return
+                return result(False, "no_content")
     
     else: # text
         messages.append({"role": "user", "content": f"群消息：\n{input_content}"})
     
     # --- 2. 调用 AI ---
+    stage("parse")
     print("🤖 AI 正在解析...")
     try:
-        response = openai_client.chat.completions.create(
-            model="deepseek-chat", # DeepSeek 模型，支持中文理解和 JSON 输出
-            messages=messages,
-            response_format={"type": "json_object"},
-            temperature=0.1
-        )
+        with metrics.track('deepseek', provider='deepseek'):
+            response = openai_client.chat.completions.create(
+                model="deepseek-chat", # DeepSeek 模型，支持中文理解和 JSON 输出
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=0.1
+            )
         result_json = json.loads(response.choices[0].message.content)
     except Exception as e:
         print(f"❌ AI 解析出错: {e}")
-        return
+        return result(False, "ai_error")
     
     if not result_json.get("is_valid", True):
         print("⚠️ 内容被判定为无效信息，跳过存储。")
-        return
+        return result(False, "invalid", result_json)
     
     print(f"✅ 解析成功: {result_json['title']}")
     
-    # --- 3. 检查重复数据（使用智能去重） ---
+    # --- 3. 检查重复数据（使用智能去重），不重复时存入 Supabase ---
+    stage("dedup")
+    # 检查重复和写入在同一把锁内完成，避免并发的相同活动都通过检查后重复插入
+    with dedup_lock(result_json.get("type")):
+        return _dedup_and_save(input_content, is_image_input, result_json, stage, result)
+
+def _dedup_and_save(input_content, is_image_input, result_json, stage, result):
+    """检查重复数据，不重复时写入 Supabase（调用方持有 dedup_lock）"""
     title = result_json.get("title")
     event_type = result_json.get("type")
     source_group = result_json.get("source_group", "AI 采集")
@@ -873,9 +831,10 @@ def process_and_save(input_content, input_type="text"):
         print(f"   标准化后: {normalize_title(title)}")
         print(f"   类型: {event_type}")
         print("   💡 跳过插入，避免重复数据")
-        return
+        return result(False, "duplicate", result_json, existing_id)
     
     # --- 4. 存入 Supabase ---
+    stage("save")
     print("💾 正在写入数据库...")
     try:
         # 构造要写入的数据 (匹配数据库字段)
@@ -900,8 +859,10 @@ def process_and_save(input_content, input_type="text"):
             "status": "active"
         }
         
-        data, count = supabase.table("events").insert(db_data).execute()
+        with metrics.track('supabase_insert', provider='supabase'):
+            data, count = supabase.table("events").insert(db_data).execute()
         print("🎉 成功入库！小程序刷新可见。")
+        return result(True, event=result_json)
         
     except Exception as e:
         error_msg = str(e)
@@ -918,6 +879,7 @@ CREATE POLICY "Allow service role to insert events"
             print("或者使用 service_role key 而不是 anon key（更安全）")
         else:
             print(f"❌ 数据库写入失败: {e}")
+        return result(False, "db_error", result_json)
 
 # --- 🚀 运行入口 ---
 if __name__ == "__main__":
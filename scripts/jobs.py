@@ -0,0 +1,246 @@
+"""
+异步采集任务队列
+/api/ingest 在异步模式下把 process_and_save 放入队列，立即返回 job_id，
+客户端通过 /api/jobs/<job_id> 轮询各阶段进度和最终解析结果
+
+任务状态以 JSON 文件保存在 JOB_DIR 中，多进程部署（gunicorn 多 worker）时
+任意 worker 都能查询到其他 worker 提交的任务
+
+任务在提交它的 worker 进程的线程中执行，记录所属进程 pid；所属进程定期更新任务文件的修改时间作为心跳。
+worker 被回收（max_requests）或超时被杀时：
+- worker_exit 钩子调用 shutdown()，等待执行中的任务最多 INGEST_JOB_DRAIN_TIMEOUT 秒，其余任务标记为失败
+- 被强制杀死来不及处理时，get() 发现所属进程已不存在或心跳超过 INGEST_JOB_STALE_AFTER 秒未更新，将任务标记为失败
+JOB_DIR 只在同一台机器的 worker 之间共享（pid 只在本机有意义）
+"""
+
+import os
+import json
+import time
+import uuid
+import pathlib
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_DIR = pathlib.Path(os.getenv('JOB_DIR', pathlib.Path(__file__).parent.parent / 'uploads' / 'jobs'))
+# 每个进程同时执行的任务数
+JOB_WORKERS = int(os.getenv('INGEST_JOB_WORKERS', 4))
+# 每个进程最多排队（含执行中）的任务数，超过后拒绝提交
+JOB_QUEUE_SIZE = int(os.getenv('INGEST_JOB_QUEUE_SIZE', 100))
+# 已完成任务的保留时间（秒）
+JOB_TTL = int(os.getenv('INGEST_JOB_TTL', 24 * 3600))
+# 心跳间隔（秒）：所属进程按此间隔更新排队中 / 执行中任务文件的修改时间
+JOB_HEARTBEAT_INTERVAL = float(os.getenv('INGEST_JOB_HEARTBEAT_INTERVAL', 10))
+# 心跳超过该时间（秒）未更新的未完成任务视为已中断
+JOB_STALE_AFTER = float(os.getenv('INGEST_JOB_STALE_AFTER', 120))
+# worker 退出时等待执行中任务完成的最长时间（秒），应小于 gunicorn 的 graceful_timeout
+JOB_DRAIN_TIMEOUT = float(os.getenv('INGEST_JOB_DRAIN_TIMEOUT', 30))
+
+INTERRUPTED_ERROR = '任务所在的 worker 进程已退出，任务中断，请重新提交'
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+
+
+def _pid_alive(pid):
+    if not pid:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """有界线程池 + 文件任务状态存储"""
+
+    def __init__(self, job_dir=JOB_DIR, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE, ttl=JOB_TTL,
+                 heartbeat_interval=JOB_HEARTBEAT_INTERVAL, stale_after=JOB_STALE_AFTER):
+        self.job_dir = pathlib.Path(job_dir)
+        self.workers = workers
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._last_cleanup = 0
+        # 本进程提交、尚未结束的任务：job_id -> (任务记录, cleanup)
+        self._active = {}
+
+    def _get_executor(self):
+        # 线程池和心跳线程按进程懒创建：gunicorn preload 时 master 中不会启动线程
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ingest-job')
+                self._executor_pid = os.getpid()
+                self._active = {}
+                threading.Thread(target=self._heartbeat, args=(os.getpid(),), daemon=True,
+                                 name='ingest-job-heartbeat').start()
+            return self._executor
+
+    def _heartbeat(self, pid):
+        while self._executor_pid == pid:
+            time.sleep(self.heartbeat_interval)
+            for job_id in list(self._active):
+                try:
+                    os.utime(self._path(job_id))
+                except OSError:
+                    pass
+
+    def _path(self, job_id):
+        return self.job_dir / f'{job_id}.json'
+
+    def _write(self, job):
+        job['updated_at'] = time.time()
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.job_dir / f".{job['id']}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(job['id']))
+
+    def get(self, job_id):
+        """读取任务状态，不存在返回 None"""
+        # job_id 由 uuid4().hex 生成，拒绝其他格式，避免路径穿越
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(self._path(job_id), encoding='utf-8') as f:
+                heartbeat_at = os.fstat(f.fileno()).st_mtime
+                job = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if job['status'] in ('queued', 'running') and self._owner_lost(job, heartbeat_at):
+            print(f"⚠️ 任务 {job_id} 所属进程 {job.get('pid')} 已退出或心跳超时，标记为失败")
+            self._fail(job, INTERRUPTED_ERROR)
+        return job
+
+    def _owner_lost(self, job, heartbeat_at):
+        """任务的所属进程已不存在，或心跳超时"""
+        if job.get('pid') == os.getpid() and job['id'] in self._active:
+            return False
+        if time.time() - heartbeat_at > self.stale_after:
+            return True
+        return not _pid_alive(job.get('pid'))
+
+    def _fail(self, job, error):
+        now = time.time()
+        if job['stages'] and job['stages'][-1]['finished_at'] is None:
+            job['stages'][-1]['finished_at'] = now
+        job['status'] = 'failed'
+        job['error'] = error
+        job['finished_at'] = now
+        self._write(job)
+
+    def submit(self, func, *args, cleanup=None, meta=None, **kwargs):
+        """
+        提交任务，立即返回任务记录
+        func 会收到关键字参数 on_stage，用于上报阶段进度；返回值作为任务结果
+        cleanup: 任务结束后（无论成功失败）调用，用于删除临时文件
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError('任务队列已满，请稍后重试')
+
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'stage': None,
+            'stages': [],
+            'meta': meta or {},
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'pid': os.getpid(),
+        }
+        try:
+            executor = self._get_executor()
+            self._write(job)
+            self._active[job['id']] = (job, cleanup)
+            executor.submit(self._run, job, func, args, kwargs, cleanup)
+        except Exception:
+            self._active.pop(job['id'], None)
+            self._slots.release()
+            raise
+        self._maybe_cleanup()
+        return job
+
+    def _run(self, job, func, args, kwargs, cleanup):
+        def on_stage(name):
+            now = time.time()
+            if job['stages']:
+                job['stages'][-1]['finished_at'] = now
+            job['stages'].append({'name': name, 'started_at': now, 'finished_at': None})
+            job['stage'] = name
+            self._write(job)
+
+        try:
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+            self._write(job)
+            job['result'] = func(*args, on_stage=on_stage, **kwargs)
+            job['status'] = 'succeeded'
+        except Exception as e:
+            print(f"❌ 任务 {job['id']} 失败: {e}")
+            traceback.print_exc()
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        finally:
+            now = time.time()
+            if job['stages'] and job['stages'][-1]['finished_at'] is None:
+                job['stages'][-1]['finished_at'] = now
+            job['finished_at'] = now
+            try:
+                self._write(job)
+            finally:
+                self._active.pop(job['id'], None)
+                self._slots.release()
+                if cleanup:
+                    try:
+                        cleanup()
+                    except Exception:
+                        pass
+
+    def shutdown(self, timeout=JOB_DRAIN_TIMEOUT):
+        """
+        worker 进程退出前调用（gunicorn worker_exit 钩子）：
+        排队中的任务不再开始，执行中的任务最多等待 timeout 秒，仍未结束的任务标记为失败
+        """
+        if self._executor is None or self._executor_pid != os.getpid():
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        deadline = time.monotonic() + timeout
+        while (any(job['status'] == 'running' for job, _ in list(self._active.values()))
+               and time.monotonic() < deadline):
+            time.sleep(0.1)
+        for job_id, (job, cleanup) in list(self._active.items()):
+            queued = job['status'] == 'queued'
+            print(f"⚠️ worker 退出，任务 {job_id} 未完成（{job['status']}），标记为失败")
+            try:
+                self._fail(job, INTERRUPTED_ERROR)
+            except OSError:
+                pass
+            if queued and cleanup:
+                # 排队中被取消的任务不会执行 _run，在这里释放上传内容
+                cleanup()
+
+    def _maybe_cleanup(self):
+        """删除过期的任务文件（最多每分钟执行一次）"""
+        now = time.time()
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        try:
+            for path in self.job_dir.glob('*.json'):
+                if now - path.stat().st_mtime > self.ttl:
+                    path.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+
+job_queue = JobQueue()
@@ -0,0 +1,351 @@
+"""
+运行指标（Prometheus 文本格式，由 /metrics 输出）
+记录采集流程各阶段（Jina / HTTP 抓取 / Playwright / tesseract / GLM-4V / DeepSeek /
+去重 / 写库）的耗时直方图、调用次数、进行中数量，以及各服务的错误次数和缓存命中情况
+
+每次记录只是在锁内更新几个数字，可以在生产环境常开。
+多进程部署（gunicorn 多 worker）时，每个进程每隔 METRICS_FLUSH_INTERVAL 秒把自己的指标
+写入 METRICS_DIR/<pid>.json，/metrics 合并所有进程的数据后输出：
+计数器和直方图累加（已退出进程的数据保留 METRICS_RETENTION 秒，避免 worker 重启后计数回退），
+进行中数量（gauge）只统计仍在运行的进程
+"""
+
+import os
+import json
+import time
+import atexit
+import bisect
+import pathlib
+import functools
+import threading
+from contextlib import contextmanager
+from concurrent.futures import CancelledError
+
+METRICS_DIR = pathlib.Path(os.getenv('METRICS_DIR', pathlib.Path(__file__).parent.parent / 'uploads' / 'metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_RETENTION = int(os.getenv('METRICS_RETENTION', 24 * 3600))
+
+# 覆盖从本地缓存命中（毫秒级）到 Playwright / 大模型调用（分钟级）的范围
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_registry = {}  # name -> 指标
+_collectors = []
+_flusher_pid = None
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # 标签值元组 -> 数值
+        _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _samples(self):
+        return [[list(key), list(value) if isinstance(value, list) else value] for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _ensure_flusher()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _ensure_flusher()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # 找到第一个 >= value 的桶（le 语义），超过所有桶时落在 +Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # 各桶的（非累计）计数 + +Inf 桶 + 总和
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+        _ensure_flusher()
+
+
+def register_collector(collector):
+    """
+    注册采集函数，在输出指标时调用
+    collector() 返回 (名称, 类型, 说明, 标签 dict, 数值) 的可迭代对象，用于导出其他模块已有的统计
+    """
+    _collectors.append(collector)
+
+
+# ---------------------------------------------------------------------------
+# 采集流程指标
+# ---------------------------------------------------------------------------
+
+stage_duration = Histogram('ingest_stage_duration_seconds', '采集流程各阶段耗时（秒）', ['stage'])
+stage_total = Counter('ingest_stage_total', '采集流程各阶段调用次数（按结果分类）', ['stage', 'outcome'])
+stage_in_flight = Gauge('ingest_stage_in_flight', '采集流程各阶段进行中的调用数', ['stage'])
+provider_errors = Counter('ingest_provider_errors_total', '外部服务错误次数', ['provider', 'kind'])
+
+fetch_wins = Counter('ingest_fetch_wins_total', '抓取链接时最终采用的策略（cache / jina / http / playwright / none）', ['strategy'])
+
+http_duration = Histogram('http_request_duration_seconds', 'API 请求耗时（秒）', ['endpoint'])
+http_total = Counter('http_requests_total', 'API 请求次数', ['endpoint', 'method', 'status'])
+http_in_flight = Gauge('http_requests_in_flight', '处理中的 API 请求数')
+
+
+class _Tracker:
+    """track() 中可修改 outcome，记录本次调用的结果分类（默认 ok，抛出异常为 error，被取消为 cancelled）"""
+
+    def __init__(self):
+        self.outcome = 'ok'
+
+
+@contextmanager
+def track(stage, provider=None):
+    """
+    记录一个阶段的耗时、次数和进行中数量
+    provider: 指定时，阶段内抛出的异常同时计入该服务的错误次数
+    """
+    tracker = _Tracker()
+    stage_in_flight.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield tracker
+    except CancelledError:
+        tracker.outcome = 'cancelled'
+        raise
+    except Exception as e:
+        tracker.outcome = 'error'
+        if provider:
+            provider_error(provider, e)
+        raise
+    finally:
+        stage_in_flight.dec(stage=stage)
+        stage_duration.observe(time.perf_counter() - start, stage=stage)
+        stage_total.inc(stage=stage, outcome=tracker.outcome)
+
+
+def observe_stage(stage, seconds, outcome='ok'):
+    """记录在其他线程 / 进程中测得的阶段耗时（如进程池中的 OCR）"""
+    stage_duration.observe(seconds, stage=stage)
+    stage_total.inc(stage=stage, outcome=outcome)
+
+
+def timed(stage, outcome=None):
+    """
+    装饰器版本的 track()
+    outcome: 可选函数，根据返回值给出结果分类（如抓取失败返回 empty）
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(stage) as tracker:
+                result = func(*args, **kwargs)
+                if outcome:
+                    tracker.outcome = outcome(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def provider_error(provider, error):
+    """记录外部服务错误，error 可以是异常对象或错误类型字符串（如 http_503）"""
+    if isinstance(error, BaseException):
+        name = type(error).__name__
+        kind = 'timeout' if isinstance(error, TimeoutError) or 'Timeout' in name else name
+    else:
+        kind = str(error)
+    provider_errors.inc(provider=provider, kind=kind)
+
+
+def _cache_collector():
+    """导出 result_cache 中各缓存的命中 / 未命中次数，命中率可用 PromQL 计算"""
+    from result_cache import all_stats
+    for name, stats in all_stats().items():
+        if 'memory_hits' in stats:
+            yield ('cache_hits_total', 'counter', '缓存命中次数', {'cache': name, 'tier': 'memory'}, stats['memory_hits'])
+            yield ('cache_hits_total', 'counter', '缓存命中次数', {'cache': name, 'tier': 'disk'}, stats['disk_hits'])
+        else:
+            yield ('cache_hits_total', 'counter', '缓存命中次数', {'cache': name, 'tier': 'memory'}, stats['hits'])
+        yield ('cache_misses_total', 'counter', '缓存未命中次数', {'cache': name}, stats['misses'])
+
+
+register_collector(_cache_collector)
+
+
+# ---------------------------------------------------------------------------
+# 多进程汇总与输出
+# ---------------------------------------------------------------------------
+
+def _snapshot():
+    """当前进程的全部指标"""
+    with _lock:
+        data = {
+            name: {
+                'type': metric.kind,
+                'help': metric.help,
+                'labels': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': metric._samples(),
+            }
+            for name, metric in _registry.items()
+        }
+    for collector in _collectors:
+        try:
+            for name, kind, help, labels, value in collector():
+                entry = data.setdefault(name, {'type': kind, 'help': help, 'labels': list(labels), 'buckets': [], 'samples': []})
+                entry['samples'].append([[str(labels[label]) for label in entry['labels']], value])
+        except Exception as e:
+            print(f"⚠️ 指标采集失败: {e}")
+    return data
+
+
+def _write_snapshot():
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    pid = os.getpid()
+    tmp_path = METRICS_DIR / f'.{pid}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'pid': pid, 'updated_at': time.time(), 'metrics': _snapshot()}, f, ensure_ascii=False)
+    os.replace(tmp_path, METRICS_DIR / f'{pid}.json')
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            _write_snapshot()
+        except OSError:
+            pass
+
+
+def _ensure_flusher():
+    """首次记录指标时在当前进程启动写盘线程（gunicorn preload 时 master 中不会启动）"""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+    # worker 因 max_requests 重启时，保存最后几秒的数据
+    atexit.register(lambda: _write_snapshot() if _flusher_pid == os.getpid() else None)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(merged, snapshot, live):
+    for name, entry in snapshot.items():
+        if entry['type'] == 'gauge' and not live:
+            continue
+        target = merged.setdefault(name, {**entry, 'samples': {}})
+        samples = target['samples']
+        for labels, value in entry['samples']:
+            key = tuple(labels)
+            current = samples.get(key)
+            if current is None:
+                samples[key] = value
+            elif isinstance(value, list):
+                samples[key] = [a + b for a, b in zip(current, value)]
+            else:
+                samples[key] = current + value
+
+
+def _format_value(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def collect():
+    """合并当前进程与其他 worker 进程的指标，返回 {名称: 指标}"""
+    merged = {}
+    _merge(merged, _snapshot(), live=True)
+
+    now = time.time()
+    pid = os.getpid()
+    try:
+        paths = list(METRICS_DIR.glob('*.json'))
+    except OSError:
+        paths = []
+    for path in paths:
+        try:
+            other_pid = int(path.stem)
+        except ValueError:
+            continue
+        if other_pid == pid:
+            continue
+        alive = _pid_alive(other_pid)
+        try:
+            if not alive and now - path.stat().st_mtime > METRICS_RETENTION:
+                path.unlink(missing_ok=True)
+                continue
+            with open(path, encoding='utf-8') as f:
+                snapshot = json.load(f)['metrics']
+        except (OSError, ValueError, KeyError):
+            continue
+        _merge(merged, snapshot, live=alive)
+    return merged
+
+
+def render():
+    """输出 Prometheus 文本格式"""
+    lines = []
+    for name, entry in sorted(collect().items()):
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        labelnames = entry['labels']
+        for labels, value in sorted(entry['samples'].items()):
+            if entry['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(entry['buckets'] + ['+Inf'], value[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_format_labels(labelnames, labels)} {cumulative}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,283 @@
+"""
+微信文章正文干扰信息清理
+原实现对整篇文章依次执行约 27 次 re.sub，之后再逐个关键词扫描计算干扰信息占比；
+图片 OCR 文字较多时文章很长，每一次扫描都要遍历全文。这里：
+
+- 规则从 config/noise_patterns.json 加载（可用 NOISE_PATTERNS_FILE 指定其他文件）
+- 所有规则编译成一个正则分支，combined.sub 一次扫描删除全部匹配；按匹配到的文字分派到对应规则
+  （不用分组：捕获分组会让正则失去按首字符跳过的优化，比逐条替换还慢）
+- 逐条执行时，前面的规则删除内容后相邻文字可能拼成后面规则的匹配（如「，分享，」删除「分享」后变成「，，」，
+  再被连续逗号的规则删除）。这类连锁删除几乎都落在排在最后、只含标点的规则上，这几条不参与一次扫描，
+  在其余规则删除之后对全文逐条执行
+- 其余规则之间的连锁删除，以及一次扫描中靠后的规则的匹配覆盖了靠前的规则本该删除的内容，只发生在少数位置：
+  删除点两侧的字符同属某条靠后的规则，或匹配中含有靠前的规则的开头。出现时只对所在片段
+  （以「。」分隔，默认规则都不会匹配「。」，片段之间互不影响）按原顺序逐条执行
+- 整行规则在原实现中最后执行，这里同样在最后执行（以换行符开头，只在换行处尝试匹配）
+- 自定义规则可能匹配「。」或含锚点、环视时退回对全文逐条执行
+"""
+
+import os
+import re
+import json
+import pathlib
+
+NOISE_PATTERNS_FILE = os.getenv('NOISE_PATTERNS_FILE', str(pathlib.Path(__file__).parent / 'config' / 'noise_patterns.json'))
+
+# 清理后再合并多余空行和重复标点
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+_PUNCTUATION_RE = re.compile(r'[，。]{2,}')
+_PUNCTUATION_PAIRS = ('，，', '，。', '。，', '。。')
+# 匹配文字到规则序号的缓存上限
+_DISPATCH_CACHE_SIZE = 4096
+# 排除了某些字符的反向字符集，如 [^，。]
+_NEGATED_CLASS_RE = re.compile(r'\[\^[^\]]*\]')
+# \s 可以匹配的字符（都在 U+3000 以内）
+_SPACES = frozenset(c for c in map(chr, range(0x3001)) if c.isspace())
+_META = set('\\[](){}*+?|^$.')
+
+
+def _branch(pattern):
+    # 只对含英文字母的规则忽略大小写（局部标志会让该分支失去首字符优化，整行规则不受影响）
+    return f'(?i:{pattern})' if re.search(r'[A-Za-z]', pattern.replace('\\s', '')) else f'(?:{pattern})'
+
+
+def _may_match_period(pattern):
+    """规则是否可能匹配「。」（含「。」、任意字符 . 、\\S 等宽泛字符类，或未排除「。」的反向字符集）"""
+    # 先去掉排除了「。」的反向字符集，如 [^，。]
+    pattern = _NEGATED_CLASS_RE.sub(lambda m: '' if '。' in m.group() else m.group(), pattern)
+    return re.search(r'。|(?<!\\)\.|\\[SWD]|\[\^', pattern) is not None
+
+
+def _context_free(pattern):
+    """规则不含锚点和环视（匹配与否只取决于匹配到的文字，可以按片段执行、按文字分派）"""
+    return re.search(r'(?<!\\)[\^$]|\\[bBAZ]|\(\?<?[=!]', _NEGATED_CLASS_RE.sub('', pattern)) is None
+
+
+def _chars(pattern):
+    """
+    规则的匹配中可能出现的字符（不含反向字符集 [^...] 匹配的部分），无法确定时返回 None
+    删除点两侧的字符都在某条规则的集合中时，删除后才可能拼出这条规则的新匹配
+    """
+    if re.search(r'(?<!\\)\.|\\[SWDwd]|\[[^\]]*-', pattern):
+        return None
+    body = _NEGATED_CLASS_RE.sub('', pattern)
+    chars = set(re.sub(r'\\s|[\\\[\](){}*+?|^$]', '', body))
+    if '\\s' in body:
+        chars |= _SPACES
+    if re.search(r'[A-Za-z]', pattern):
+        chars |= {c.swapcase() for c in chars}
+    return chars
+
+
+def _punctuation_only(pattern):
+    """规则只匹配标点和空白（不含文字、字母和数字）"""
+    chars = _chars(pattern)
+    return bool(chars) and not any(c.isalnum() for c in chars)
+
+
+class NoiseFilter:
+    """
+    patterns: 正则列表，正文中匹配到即删除
+    line_patterns: 整行只有该内容（允许前后空白）时删除该行
+    keywords: 质量关键词，清理后仍残留的计入 stats['keywords']
+    """
+
+    def __init__(self, patterns=(), line_patterns=(), keywords=()):
+        patterns = list(patterns)
+        # 原实现的逐条规则，用于按片段逐条执行和不能一次扫描时的全文逐条执行
+        self._rules = [re.compile(p, re.IGNORECASE | re.MULTILINE)
+                       for p in patterns + [rf'^\s*{p}\s*$' for p in line_patterns]]
+        # 排在最后、只含标点和空白的规则（默认配置中的「×」「：，」「，，」）常由前面的删除拼出新的匹配，
+        # 不参与一次扫描，在其余规则之后对全文逐条执行（都以固定字符开头，扫描很快）
+        head = len(patterns)
+        while head and _punctuation_only(patterns[head - 1]):
+            head -= 1
+        self._patterns = self._rules[:head]
+        self._chained = self._rules[head:len(patterns)]
+        self._single_pass = not any(_may_match_period(p) or not _context_free(p) for p in patterns[:head])
+        branches = [_branch(p) for p in patterns]
+        self._combined = re.compile('|'.join(branches[:head])) if head else None
+        # 等价于 ^\s*规则\s*$（MULTILINE）：在文字前补一个换行符，从换行符开始匹配，删除时保留换行符
+        self._line_rules = [re.compile(rf'\n\s*{_branch(p)}\s*(?=\n|\Z)') for p in line_patterns]
+        self._analyze(patterns[:head], branches[:head])
+
+        if line_patterns:
+            lines = '|'.join(_branch(p) for p in line_patterns)
+            # 供 scan 使用：以换行符开头的整行分支
+            branches.append(rf'\n[^\S\n]*(?:{lines})[^\S\n]*(?=\n)')
+        self.all_keywords = list(keywords)
+        # 能被删除规则完整匹配的关键词清理后不可能残留，不需要单独的分支
+        self.keywords = {k for k in keywords if not any(re.fullmatch(p, k) for p in patterns)}
+        branches += [re.escape(k) for k in sorted(self.keywords, key=len, reverse=True)]
+        self._regex = re.compile('|'.join(branches))
+
+    def _analyze(self, patterns, branches):
+        """预先算出一次扫描结果可能与逐条执行不同的位置的判断条件"""
+        chars = [_chars(p) for p in patterns]
+        firsts = [p[0] if p and p[0] not in _META else None for p in patterns]
+        # 删除点两侧的字符：每个字符出现在哪些规则中（按位记录），无法确定字符集合的规则任何字符都算
+        self._char_rules = {}
+        wide = 0
+        for i, rule_chars in enumerate(chars):
+            if rule_chars is None:
+                wide |= 1 << i
+            for c in rule_chars or ():
+                self._char_rules[c] = self._char_rules.get(c, 0) | 1 << i
+        self._wide_rules = wide
+        self._joinable = None if wide else set(self._char_rules)
+        # 匹配中可能含有靠前的规则的开头的规则（含反向字符集的规则可以包含几乎任意文字）
+        self._earlier = {}
+        for j, pattern in enumerate(patterns):
+            earlier = firsts[:j]
+            body = _chars(pattern[1:]) if firsts[j] else None
+            if not earlier:
+                continue
+            if body is None or '[^' in pattern or None in earlier or body & {c for f in earlier for c in (f, f.swapcase())}:
+                self._earlier[j] = re.compile('|'.join(branches[:j]))
+        if any(firsts[j] is None for j in self._earlier):
+            self._overlap_firsts = None
+        else:
+            self._overlap_firsts = {c for j in self._earlier for c in (firsts[j], firsts[j].swapcase())}
+        # 按匹配到的文字分派：第一条能完整匹配这段文字的规则就是一次扫描中匹配到的分支
+        self._dispatch = [(i, re.compile(p, re.IGNORECASE)) for i, p in enumerate(patterns)]
+        self._dispatched = {}
+
+    def _rule_of(self, matched):
+        """匹配到的文字对应的规则序号（干扰信息大多是重复出现的固定文字，结果按文字缓存）"""
+        rule = self._dispatched.get(matched)
+        if rule is None:
+            rule = next(i for i, r in self._dispatch if r.fullmatch(matched))
+            if len(self._dispatched) < _DISPATCH_CACHE_SIZE:
+                self._dispatched[matched] = rule
+        return rule
+
+    def _creates_match(self, left, right, rule):
+        """第 rule 条规则删除后，两侧的字符 left / right 是否可能拼成靠后的规则的新匹配"""
+        later = -1 << (rule + 1)
+        rules = self._char_rules.get(left, 0) & self._char_rules.get(right, 0) | self._wide_rules
+        return bool(rules & later)
+
+    def _overlaps_earlier(self, text, start, end, rule):
+        """一次扫描删除的匹配中是否含有靠前的规则的匹配开头（逐条执行时会先删除那一条）"""
+        earlier = self._earlier.get(rule)
+        if earlier is None:
+            return False
+        stop = text.find('。', end)
+        match = earlier.search(text, start + 1, len(text) if stop < 0 else stop)
+        return match is not None and match.start() < end
+
+    def _cascade(self, text, rules):
+        removed = 0
+        for rule in rules:
+            text, count = rule.subn('', text)
+            removed += count
+        return text, removed
+
+    def _remove(self, text):
+        """删除非整行规则的匹配，返回 (文字, 删除条数)，结果与按原顺序逐条执行相同"""
+        if self._combined is None:
+            return text, 0
+        if not self._single_pass:
+            return self._cascade(text, self._patterns)
+        spans = []
+
+        def drop(match):
+            spans.append(match.span())
+            return ''
+
+        out = self._combined.sub(drop, text)
+        # 先只做字符判断：与上一处删除相邻的直接按原顺序逐条执行所在片段；
+        # 两侧字符都在某条规则中、或以可能含有靠前的规则开头的规则的首字符开头的，再按规则检查
+        flagged = []
+        joinable, overlap_firsts, size = self._joinable, self._overlap_firsts, len(text)
+        last = -1
+        for start, end in spans:
+            if start == last:
+                flagged.append(start)
+            elif (start and end < size and (joinable is None or (text[start - 1] in joinable and text[end] in joinable))
+                  and self._creates_match(text[start - 1], text[end], self._rule_of(text[start:end]))):
+                flagged.append(start)
+            if ((overlap_firsts is None or text[start] in overlap_firsts)
+                    and self._overlaps_earlier(text, start, end, self._rule_of(text[start:end]))):
+                flagged.append(start)
+            last = end
+        if not flagged:
+            return out, len(spans)
+        return self._redo(text, out, len(spans), sorted(flagged))
+
+    def _redo(self, text, out, removed, flagged):
+        """
+        对 flagged 所在的片段按原顺序逐条执行，替换一次扫描的结果
+        规则不匹配「。」也不含锚点，这些片段用「。」连起来一起逐条执行，与逐个片段执行结果相同
+        """
+        indexes = []
+        index = last = 0
+        for start in flagged:
+            index += text.count('。', last, start)
+            last = start
+            if not indexes or indexes[-1] != index:
+                indexes.append(index)
+        originals = text.split('。')
+        redone = '。'.join(originals[k] for k in indexes)
+        cleaned, count = self._cascade(redone, self._patterns)
+        parts = out.split('。')
+        for k, part in zip(indexes, cleaned.split('。')):
+            parts[k] = part
+        # 删除条数：这些片段改为逐条执行的条数
+        return '。'.join(parts), removed - self._combined.subn('', redone)[1] + count
+
+    def clean(self, text, stats=None):
+        """
+        删除干扰信息并整理空行和标点，返回清理后的文字（与原实现逐条 re.sub 的结果相同）
+        stats: 可选 dict，写入 removed（删除的干扰信息条数）和 keywords（残留的质量关键词集合）
+        """
+        stats = {} if stats is None else stats
+        found = stats.setdefault('keywords', set())
+        text, removed = self._remove(text)
+        text, count = self._cascade(text, self._chained)
+        removed += count
+        if self._line_rules and self._single_pass:
+            text = '\n' + text
+            for rule in self._line_rules:
+                text, count = rule.subn('\n', text)
+                removed += count
+            text = text[1:]
+        elif self._line_rules:
+            text, count = self._cascade(text, self._rules[len(self._patterns):])
+            removed += count
+        # 合并多余空行和重复标点；大多数文章没有，先用子串查找跳过整篇扫描
+        if '\n\n\n' in text:
+            text = _BLANK_LINES_RE.sub('\n\n', text)
+        if any(pair in text for pair in _PUNCTUATION_PAIRS):
+            text = _PUNCTUATION_RE.sub('。', text)
+        text = text.strip()
+        found.update(k for k in self.all_keywords if k in text)
+        stats['removed'] = stats.get('removed', 0) + removed
+        return text
+
+    def scan(self, text, stats=None):
+        """只统计残留的质量关键词，不修改文字（用于不参与清理的 OCR 文字）"""
+        stats = {} if stats is None else stats
+        found = stats.setdefault('keywords', set())
+        # 首尾补换行与清理时一致；被删除规则匹配到的内容里也可能包含关键词
+        for match in self._regex.finditer(f'\n{text}\n'):
+            matched = match.group()
+            if matched in self.keywords:
+                found.add(matched)
+            else:
+                found.update(k for k in self.all_keywords if k in matched)
+        return stats
+
+    @staticmethod
+    def noise_ratio(stats, content):
+        """干扰信息占比：残留的质量关键词种数 / 内容按空白切分的词数"""
+        return len(stats.get('keywords', ())) / max(len(content.split()), 1)
+
+
+def load(path=NOISE_PATTERNS_FILE):
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    return NoiseFilter(config.get('patterns', []), config.get('line_patterns', []), config.get('quality_keywords', []))
+
+
+wechat_noise_filter = load()
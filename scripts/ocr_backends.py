@@ -0,0 +1,425 @@
+"""
+可插拔 OCR 后端 + 按延迟和成本选择后端的路由
+原来有三条互不相干的识别路径：tesseract（extract_text_from_image）、GLM-4V（extract_text_from_image_with_vision）
+和从未接入的 ocr_baidu.py，调用方无法按请求选择，某个服务变慢或额度用完时也不会自动切换。这里：
+
+- 每种识别方式是一个注册的后端（OCRBackend），统一为「图片字节 -> 文字」
+- OCRRouter 按图片选择后端：图片尺寸（本地识别耗时随像素数增长）、文字密度（密集小字优先用识别精度高的后端）、
+  各后端近期延迟（EWMA）和错误率、每日额度、单次费用（按 OCR_COST_WEIGHT 折算成延迟）综合打分，分数低的优先
+- 首选后端出错（或没有识别出文字）时自动改用下一个；近期错误率过高的后端暂停使用一段时间
+- 每日额度按天计数，计数写入 OCR_STATE_DIR，多个 worker 进程共享（额度是整个账号的）
+- 各后端的耗时和次数按阶段名（后端名）记入 metrics，吞吐量可由 ingest_stage_total 计算；
+  EWMA 延迟、错误率、额度用量由采集函数导出，当前进程的统计也可通过 /api/ocr/backends 查看
+
+调用方可以用 prefer 指定首选后端（如 /api/ocr 的 backend 参数），指定的后端不可用时按路由结果继续
+
+默认只使用免费的本地识别：按次收费的后端（百度、GLM-4V）即使配置了 Key 也不参与路由，
+设置 OCR_ALLOW_PAID=1 或调用方传 allow_paid=True（如 /api/ocr 的 allow_paid 参数）后才会使用；
+调用方用 prefer 明确指定的收费后端视为已允许，但失败后只改用免费后端
+"""
+
+import io
+import os
+import json
+import time
+import pathlib
+import threading
+from collections import deque
+from datetime import date
+
+import image_filter
+import metrics
+import ocr_preprocess
+import tesseract_engine
+import vision_encoder
+
+OCR_STATE_DIR = pathlib.Path(os.getenv('OCR_STATE_DIR', pathlib.Path(__file__).parent.parent / 'uploads' / 'ocr_state'))
+# 参与路由的后端（按名称，逗号分隔）
+OCR_BACKENDS = [name.strip() for name in os.getenv('OCR_BACKENDS', 'tesseract,baidu_general,baidu_accurate,glm4v').split(',') if name.strip()]
+# 是否允许路由使用按次收费的后端（默认只用本地识别，避免配置了 Key 就产生费用）
+OCR_ALLOW_PAID = os.getenv('OCR_ALLOW_PAID', '0').lower() in ('1', 'true')
+# 每日调用次数上限，JSON：{"后端名": 次数}；未列出的后端不限
+OCR_DAILY_QUOTAS = json.loads(os.getenv('OCR_DAILY_QUOTAS') or '{"baidu_general": 500, "baidu_accurate": 200, "glm4v": 1000}')
+# 单次调用费用（元），JSON 覆盖各后端的默认值
+OCR_COSTS = json.loads(os.getenv('OCR_COSTS') or '{}')
+# 每 1 元费用折算成多少秒延迟参与打分（越大越倾向免费的本地识别）
+OCR_COST_WEIGHT = float(os.getenv('OCR_COST_WEIGHT', 200))
+# 缩略图强边缘比例超过该值视为文字密集，识别精度不足的后端加罚 OCR_QUALITY_PENALTY 秒
+OCR_DENSE_TEXT = float(os.getenv('OCR_DENSE_TEXT', 0.15))
+OCR_QUALITY_PENALTY = float(os.getenv('OCR_QUALITY_PENALTY', 5))
+# 近期错误率（EWMA）超过该值的后端暂停 OCR_ERROR_PAUSE 秒
+OCR_MAX_ERROR_RATE = float(os.getenv('OCR_MAX_ERROR_RATE', 0.5))
+OCR_ERROR_PAUSE = float(os.getenv('OCR_ERROR_PAUSE', 60))
+# 延迟和错误率的 EWMA 系数
+OCR_EWMA_ALPHA = 0.3
+# 识别出的文字超过该长度才视为有效
+OCR_MIN_TEXT_LENGTH = 10
+
+routed_total = metrics.Counter('ingest_ocr_routed_total', 'OCR 路由选择的首选后端次数', ['backend'])
+fallback_total = metrics.Counter('ingest_ocr_fallbacks_total', 'OCR 后端失败或未识别出文字后改用下一个后端的次数', ['backend'])
+
+GLM4V_PROMPT = """请仔细分析这张图片，提取所有文字内容。
+
+要求：
+1. 按照图片中文字的布局顺序提取
+2. 保留所有重要信息（标题、日期、时间、地点、公司名称、岗位等）
+3. 如果是海报，请识别主标题、副标题、正文内容
+4. 提取所有数字、日期、时间信息
+5. 保留中英文内容
+
+请直接输出提取的文字内容，不要添加额外说明。"""
+
+
+class OCRBackend:
+    """
+    OCR 后端：recognize(图片字节) 返回文字，失败时抛出异常
+    子类通过类属性描述自身特点，供路由打分
+    """
+    name = ''
+    provider = ''           # metrics 中的外部服务名
+    cost = 0.0              # 单次调用费用（元）
+    quality = 1             # 识别精度：1 普通，2 中文识别好，3 高精度（密集小字、复杂版面）
+    latency = 1.0           # 没有实测数据前的预估延迟（秒；scales_with_size 时为每百万像素秒数）
+    scales_with_size = False  # 耗时是否随像素数增长（本地识别）
+    local = False           # CPU 密集的本地识别，调用方提供进程池时在进程池中执行
+    max_bytes = None        # 接口能接受的最大图片字节数
+    max_side = None         # 接口能接受的最长边（像素）
+
+    def available(self):
+        return True
+
+    def recognize(self, data):
+        raise NotImplementedError
+
+    def run(self, data, executor=None):
+        """执行识别，返回 (文字, 耗时秒数)；本地后端在 executor（OCR 进程池）中执行，耗时不含排队时间"""
+        if self.local and executor is not None:
+            return executor.submit(_timed_recognize, self, data).result()
+        return _timed_recognize(self, data)
+
+    def accepts(self, size, info):
+        if self.max_bytes and size > self.max_bytes:
+            return False
+        if self.max_side and info and max(info[0], info[1]) > self.max_side:
+            return False
+        return True
+
+
+class TesseractBackend(OCRBackend):
+    name = 'tesseract'
+    provider = 'tesseract'
+    latency = 2.0
+    scales_with_size = True
+    local = True
+
+    def available(self):
+        return tesseract_engine.available()
+
+    def recognize(self, data):
+        return self.run(data)[0]
+
+    def run(self, data, executor=None):
+        """
+        先预处理（灰度、按文字行高缩小），长图切成多块（见 ocr_preprocess），
+        各块提交到 OCR 进程池并行识别（每个进程使用常驻引擎，见 tesseract_engine），再按顺序拼接
+        耗时为预处理和各块识别耗时之和（不含排队时间）
+        """
+        from PIL import Image
+        start = time.perf_counter()
+        tiles = ocr_preprocess.prepare(Image.open(io.BytesIO(data)))
+        elapsed = time.perf_counter() - start
+        if executor is None:
+            results = [tesseract_engine.recognize_timed(tile) for tile, _ in tiles]
+        else:
+            futures = [executor.submit(tesseract_engine.recognize_timed, tile) for tile, _ in tiles]
+            results = [future.result() for future in futures]
+        text = ocr_preprocess.stitch([(text, overlapped) for (text, _), (_, overlapped) in zip(results, tiles)])
+        return text, elapsed + sum(seconds for _, seconds in results)
+
+
+class BaiduBackend(OCRBackend):
+    """百度文字识别（通用 / 高精度），API Key 从 BAIDU_OCR_API_KEY / BAIDU_OCR_SECRET_KEY 读取"""
+    provider = 'baidu'
+    max_bytes = 3 * 1024 * 1024   # base64 编码后不超过 4MB
+    max_side = 4096
+
+    def __init__(self, accurate):
+        self.accurate = accurate
+        self.name = 'baidu_accurate' if accurate else 'baidu_general'
+        self.cost = 0.03 if accurate else 0.008
+        self.quality = 3 if accurate else 2
+        self.latency = 1.5 if accurate else 0.8
+
+    def available(self):
+        return bool(os.getenv('BAIDU_OCR_API_KEY') and os.getenv('BAIDU_OCR_SECRET_KEY'))
+
+    def recognize(self, data):
+        import ocr_baidu
+        return ocr_baidu.recognize(data, os.getenv('BAIDU_OCR_API_KEY'), os.getenv('BAIDU_OCR_SECRET_KEY'),
+                                   accurate=self.accurate)
+
+
+class GLM4VBackend(OCRBackend):
+    """智谱 GLM-4V 视觉模型，客户端由 ingest_multimodal.init_clients() 通过 configure() 设置"""
+    name = 'glm4v'
+    provider = 'zhipu'
+    cost = 0.05
+    quality = 3
+    latency = 6.0
+    # 原图不限大小：上传前由 vision_encoder 缩小并压缩到 VISION_MAX_BYTES 以内
+
+    def __init__(self):
+        self.client = None
+        self.model = 'glm-4v'
+
+    def configure(self, client, model):
+        self.client = client
+        self.model = model
+
+    def available(self):
+        return self.client is not None
+
+    def recognize(self, data):
+        # 按真实格式标注，大图缩小并重新编码后上传（见 vision_encoder）
+        image_url = vision_encoder.image_data_url(data)
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": image_url}},
+                    {"type": "text", "text": GLM4V_PROMPT},
+                ]
+            }]
+        )
+        return response.choices[0].message.content
+
+
+def _timed_recognize(backend, data):
+    """执行识别并返回 (文字, 耗时秒数)；本地后端在 OCR 进程中执行，耗时不含排队时间"""
+    start = time.perf_counter()
+    text = backend.recognize(data)
+    return text, time.perf_counter() - start
+
+
+class _DailyQuota:
+    """
+    按天计数的调用额度，多个 worker 进程共享
+    每次调用向当天的计数文件追加 1 字节（O_APPEND 的小写入是原子的），文件大小即当天调用次数；
+    服务端返回额度用完时写入标记文件，当天不再使用该后端
+    """
+
+    def __init__(self, state_dir, limits):
+        self.state_dir = pathlib.Path(state_dir)
+        self.limits = limits
+
+    def _path(self, name, suffix):
+        return self.state_dir / f'{name}-{date.today():%Y%m%d}.{suffix}'
+
+    def used(self, name):
+        try:
+            return self._path(name, 'count').stat().st_size
+        except OSError:
+            return 0
+
+    def remaining(self, name):
+        if self._path(name, 'exhausted').exists():
+            return 0
+        limit = self.limits.get(name)
+        if limit is None:
+            return None
+        return max(0, limit - self.used(name))
+
+    def consume(self, name):
+        if name not in self.limits:
+            return
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self._path(name, 'count'), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, b'.')
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"⚠️ 记录 OCR 额度用量失败: {e}")
+
+    def exhaust(self, name):
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            self._path(name, 'exhausted').touch()
+        except OSError as e:
+            print(f"⚠️ 记录 OCR 额度用完失败: {e}")
+
+
+class _BackendStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = None      # EWMA（scales_with_size 的后端为每百万像素秒数）
+        self.error_rate = 0.0    # EWMA
+        self.calls = 0
+        self.errors = 0
+        self.empty = 0
+        self.paused_until = 0.0
+        self.finished = deque(maxlen=1024)   # 最近完成的时间，用于计算吞吐量
+
+
+def _megapixels(info):
+    return max(info[0] * info[1] / 1e6, 0.1) if info else 1.0
+
+
+class OCRRouter:
+    """按图片和各后端近期表现选择 OCR 后端，失败时自动改用下一个"""
+
+    def __init__(self, backends=(), state_dir=OCR_STATE_DIR, quotas=None, enabled=None, allow_paid=True):
+        self.backends = {}
+        self.enabled = enabled
+        # 调用方未指定 allow_paid 时是否使用收费后端
+        self.allow_paid = allow_paid
+        self.quota = _DailyQuota(state_dir, OCR_DAILY_QUOTAS if quotas is None else quotas)
+        self._stats = {}
+        for backend in backends:
+            self.register(backend)
+
+    def register(self, backend):
+        self.backends[backend.name] = backend
+        self._stats.setdefault(backend.name, _BackendStats())
+
+    def get(self, name):
+        return self.backends[name]
+
+    def cost(self, backend):
+        """单次调用费用（元），OCR_COSTS 中的配置优先"""
+        return OCR_COSTS.get(backend.name, backend.cost)
+
+    def estimate(self, backend, info):
+        """预估该后端识别这张图片的代价（秒）：延迟 × 错误率惩罚 + 费用折算 + 精度不足惩罚"""
+        stats = self._stats[backend.name]
+        latency = backend.latency if stats.latency is None else stats.latency
+        if backend.scales_with_size:
+            latency *= _megapixels(info)
+        score = latency * (1 + 4 * stats.error_rate) + OCR_COST_WEIGHT * self.cost(backend)
+        if info and info[2] >= OCR_DENSE_TEXT and backend.quality < 2:
+            score += OCR_QUALITY_PENALTY
+        return score
+
+    def plan(self, data, prefer=None, info=None, allow_paid=None):
+        """
+        返回本次识别依次尝试的后端列表（prefer 指定的后端可用时排在最前）
+        allow_paid: 是否使用收费后端，None 时按 self.allow_paid；prefer 指定的后端不受限制
+        """
+        if prefer and prefer not in self.backends:
+            raise ValueError(f'未知的 OCR 后端: {prefer}')
+        allow_paid = self.allow_paid if allow_paid is None else allow_paid
+        now = time.monotonic()
+        candidates = []
+        for name, backend in self.backends.items():
+            if self.enabled is not None and name not in self.enabled and name != prefer:
+                continue
+            if not allow_paid and self.cost(backend) > 0 and name != prefer:
+                continue
+            if not backend.available() or not backend.accepts(len(data), info):
+                continue
+            if self._stats[name].paused_until > now or self.quota.remaining(name) == 0:
+                continue
+            candidates.append(backend)
+        candidates.sort(key=lambda b: (b.name != prefer, self.estimate(b, info)))
+        if prefer and (not candidates or candidates[0].name != prefer):
+            print(f"⚠️ OCR 后端 {prefer} 当前不可用，按路由选择")
+        return candidates
+
+    def _record(self, backend, elapsed, info, outcome):
+        stats = self._stats[backend.name]
+        with stats.lock:
+            stats.calls += 1
+            error = outcome == 'error'
+            stats.errors += error
+            stats.empty += outcome == 'empty'
+            stats.error_rate += OCR_EWMA_ALPHA * (error - stats.error_rate)
+            if elapsed is not None:
+                sample = elapsed / _megapixels(info) if backend.scales_with_size else elapsed
+                stats.latency = sample if stats.latency is None else stats.latency + OCR_EWMA_ALPHA * (sample - stats.latency)
+            stats.finished.append(time.monotonic())
+            if error and stats.calls >= 2 and stats.error_rate >= OCR_MAX_ERROR_RATE:
+                stats.paused_until = time.monotonic() + OCR_ERROR_PAUSE
+                print(f"⏸️ OCR 后端 {backend.name} 近期错误率 {stats.error_rate:.0%}，暂停 {OCR_ERROR_PAUSE:.0f} 秒")
+
+    def recognize(self, data, prefer=None, executor=None, retry_empty=True, allow_paid=None):
+        """
+        识别图片字节，返回 (文字, 后端名)；未识别出有效文字时文字为空字符串，
+        没有可用的后端或全部出错时后端名为 None（调用方不应缓存这样的结果）
+        executor: 可选进程池，本地后端（tesseract）在其中执行
+        retry_empty: 后端正常返回但没有有效文字时是否继续尝试下一个后端
+                     （文章配图已经过预筛选，不含文字的图片不值得再付费识别一次，可传 False）
+        allow_paid: 是否使用收费后端，None 时按 self.allow_paid（全局路由为 OCR_ALLOW_PAID）
+        """
+        info = image_filter.text_density(data)
+        plan = self.plan(data, prefer, info, allow_paid)
+        if not plan:
+            print("⚠️ 没有可用的 OCR 后端")
+            return '', None
+        routed_total.inc(backend=plan[0].name)
+        last = None
+        for i, backend in enumerate(plan):
+            if i:
+                fallback_total.inc(backend=plan[i - 1].name)
+                print(f"↪️ 改用 {backend.name} 识别")
+            self.quota.consume(backend.name)
+            try:
+                text, elapsed = backend.run(data, executor)
+            except Exception as e:
+                print(f"⚠️ OCR 后端 {backend.name} 识别失败: {e}")
+                if getattr(e, 'quota_exceeded', False):
+                    self.quota.exhaust(backend.name)
+                self._record(backend, None, info, 'error')
+                metrics.stage_total.inc(stage=backend.name, outcome='error')
+                metrics.provider_error(backend.provider, e)
+                continue
+            text = (text or '').strip()
+            outcome = 'ok' if len(text) > OCR_MIN_TEXT_LENGTH else 'empty'
+            last = backend.name
+            self._record(backend, elapsed, info, outcome)
+            metrics.observe_stage(backend.name, elapsed, outcome)
+            if outcome == 'ok':
+                return text, backend.name
+            if not retry_empty:
+                break
+        return '', last
+
+    def stats(self):
+        """各后端当前进程的统计：EWMA 延迟、错误率、最近一分钟吞吐量、额度用量"""
+        now = time.monotonic()
+        result = {}
+        for name, backend in self.backends.items():
+            stats = self._stats[name]
+            with stats.lock:
+                result[name] = {
+                    'available': backend.available(),
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'empty': stats.empty,
+                    'latency_ewma': None if stats.latency is None else round(stats.latency, 3),
+                    'error_rate': round(stats.error_rate, 3),
+                    'per_minute': sum(1 for t in stats.finished if t > now - 60),
+                    'paused_for': max(0, round(stats.paused_until - now, 1)),
+                }
+            result[name]['quota_used'] = self.quota.used(name)
+            result[name]['quota_remaining'] = self.quota.remaining(name)
+        return result
+
+
+glm4v_backend = GLM4VBackend()
+ocr_router = OCRRouter([TesseractBackend(), BaiduBackend(accurate=False), BaiduBackend(accurate=True), glm4v_backend],
+                       enabled=OCR_BACKENDS, allow_paid=OCR_ALLOW_PAID)
+
+
+def _router_collector():
+    """导出各 OCR 后端的 EWMA 延迟、错误率和当日额度用量"""
+    for name, stats in ocr_router.stats().items():
+        if stats['latency_ewma'] is not None:
+            yield ('ocr_backend_latency_ewma_seconds', 'gauge', 'OCR 后端近期延迟（EWMA，tesseract 为每百万像素秒数）',
+                   {'backend': name}, stats['latency_ewma'])
+        yield ('ocr_backend_error_rate', 'gauge', 'OCR 后端近期错误率（EWMA）', {'backend': name}, stats['error_rate'])
+        yield ('ocr_backend_quota_used', 'gauge', 'OCR 后端当日已用调用次数（所有 worker 合计）', {'backend': name}, stats['quota_used'])
+
+
+metrics.register_collector(_router_collector)
@@ -1,78 +1,225 @@
 """
 百度OCR API集成
 提供更准确的中文图片识别
+
+原实现每识别一张图片都先请求一次 access_token（每张图片两次 HTTP 往返），也不复用连接。BaiduOCRClient：
+- access_token 缓存到过期前 BAIDU_TOKEN_REFRESH_MARGIN 秒；多个线程同时发现需要刷新时只有一个线程请求，其余等待结果
+- 接口返回 token 无效 / 过期时刷新一次后重试
+- 通过 http_client 的共享连接池发送请求（按进程复用 keep-alive 连接）
+- 按 BAIDU_OCR_QPS 限制每秒请求数（免费额度 QPS 较低，超出返回错误码 18），触发限流时稍后重试
+- recognize_many() 在线程池中并发提交多张图片，结果按输入顺序返回
+
+BAIDU_OCR_BASE_URL 可指向本地模拟服务（测试用）
 """
-import requests
+import os
 import base64
-import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import http_client
+
+BAIDU_OCR_BASE_URL = os.getenv('BAIDU_OCR_BASE_URL', 'https://aip.baidubce.com')
+BAIDU_OCR_TIMEOUT = float(os.getenv('BAIDU_OCR_TIMEOUT', 15))
+# 每秒最多请求数（按进程计算）
+BAIDU_OCR_QPS = float(os.getenv('BAIDU_OCR_QPS', 2))
+# recognize_many() 的并发数
+BAIDU_OCR_WORKERS = int(os.getenv('BAIDU_OCR_WORKERS', 4))
+# access_token 在过期前多少秒刷新
+BAIDU_TOKEN_REFRESH_MARGIN = float(os.getenv('BAIDU_TOKEN_REFRESH_MARGIN', 3600))
+# 当日调用量已用完 / 免费额度已用完
+QUOTA_ERROR_CODES = {17, 19}
+# QPS 超限
+RATE_LIMIT_ERROR_CODES = {18}
+# access_token 无效 / 过期
+TOKEN_ERROR_CODES = {110, 111}
+# 触发 QPS 限制时的最多重试次数
+RATE_LIMIT_RETRIES = 2
+
+
+class BaiduOCRError(Exception):
+    """百度 OCR 接口返回的错误（code 为百度错误码）"""
+
+    def __init__(self, code, message):
+        super().__init__(f'{code}: {message}')
+        self.code = code
+
+    @property
+    def quota_exceeded(self):
+        return self.code in QUOTA_ERROR_CODES
+
+
+class _RateLimiter:
+    """按固定间隔放行请求（多个线程共享）"""
+
+    def __init__(self, qps):
+        self.interval = 1 / qps if qps > 0 else 0
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            start = max(time.monotonic(), self.next_start)
+            self.next_start = start + self.interval
+        delay = start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class BaiduOCRClient:
+    """百度文字识别客户端（线程安全，同一组 API Key 在进程内共用一个实例，见 get_client）"""
+
+    def __init__(self, api_key, secret_key, base_url=None, qps=None, workers=None, timeout=None):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.base_url = (base_url or BAIDU_OCR_BASE_URL).rstrip('/')
+        self.timeout = BAIDU_OCR_TIMEOUT if timeout is None else timeout
+        self.workers = BAIDU_OCR_WORKERS if workers is None else workers
+        self._limiter = _RateLimiter(BAIDU_OCR_QPS if qps is None else qps)
+        self._token = None
+        self._token_refresh_at = 0.0
+        self._token_lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self.token_requests = 0
+
+    def _fetch_token(self):
+        response = http_client.get_session().post(
+            f'{self.base_url}/oauth/2.0/token',
+            params={'grant_type': 'client_credentials', 'client_id': self.api_key, 'client_secret': self.secret_key},
+            timeout=self.timeout)
+        self.token_requests += 1
+        result = response.json() if response.content else {}
+        token = result.get('access_token')
+        if response.status_code != 200 or not token:
+            raise BaiduOCRError(result.get('error'), result.get('error_description', f'HTTP {response.status_code}'))
+        # expires_in 为秒（通常 30 天）；有效期很短时在过半时刷新
+        expires_in = float(result.get('expires_in', 0))
+        return token, time.monotonic() + max(expires_in - BAIDU_TOKEN_REFRESH_MARGIN, expires_in / 2)
+
+    def access_token(self, stale=None):
+        """
+        返回缓存的 access_token，快过期时刷新（单飞：只有一个线程发起请求）
+        stale: 调用方刚被告知无效的 token，与缓存相同时强制刷新
+        """
+        token = self._token
+        if token and token != stale and time.monotonic() < self._token_refresh_at:
+            return token
+        with self._token_lock:
+            # 等待锁期间其他线程可能已经刷新
+            if self._token and self._token != stale and time.monotonic() < self._token_refresh_at:
+                return self._token
+            self._token, self._token_refresh_at = self._fetch_token()
+            return self._token
+
+    def _post(self, endpoint, token, image_data):
+        self._limiter.wait()
+        response = http_client.get_session().post(
+            f'{self.base_url}/rest/2.0/ocr/v1/{endpoint}',
+            params={'access_token': token},
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            data={'image': base64.b64encode(image_data).decode('utf-8')},
+            timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def recognize(self, image_data, accurate=False):
+        """
+        识别图片字节，返回识别出的文字（每行一段）
+        接口返回错误码时抛出 BaiduOCRError，供 OCR 路由统计错误率和当日额度
+        """
+        endpoint = 'accurate_basic' if accurate else 'general_basic'
+        token = self.access_token()
+        rate_limited = 0
+        refreshed = False
+        while True:
+            result = self._post(endpoint, token, image_data)
+            code = result.get('error_code')
+            if code is None:
+                # 提取所有识别的文字
+                return '\n'.join(item['words'] for item in result.get('words_result', []))
+            if code in TOKEN_ERROR_CODES and not refreshed:
+                token = self.access_token(stale=token)
+                refreshed = True
+            elif code in RATE_LIMIT_ERROR_CODES and rate_limited < RATE_LIMIT_RETRIES:
+                rate_limited += 1
+                time.sleep(self._limiter.interval or 0.5)
+            else:
+                raise BaiduOCRError(code, result.get('error_msg', ''))
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='baidu-ocr')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def recognize_many(self, images, accurate=False):
+        """
+        并发识别多张图片（受 QPS 限制），按输入顺序返回结果列表：
+        识别成功为文字，失败为对应的异常对象（不影响其他图片）
+        """
+        executor = self._get_executor()
+        futures = [executor.submit(self.recognize, data, accurate) for data in images]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except (BaiduOCRError, requests.RequestException, ValueError) as e:
+                results.append(e)
+        return results
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key, secret_key):
+    """同一组 API Key 共用一个客户端（共享 access_token 缓存和 QPS 限制）"""
+    with _clients_lock:
+        client = _clients.get((api_key, secret_key))
+        if client is None:
+            client = _clients[(api_key, secret_key)] = BaiduOCRClient(api_key, secret_key)
+        return client
+
 
 def get_baidu_access_token(api_key, secret_key):
     """
-    获取百度OCR的access_token
+    获取百度OCR的access_token（使用缓存，快过期时才重新请求）
     """
-    url = "https://aip.baidubce.com/oauth/2.0/token"
-    params = {
-        "grant_type": "client_credentials",
-        "client_id": api_key,
-        "client_secret": secret_key
-    }
-    response = requests.post(url, params=params)
-    if response.status_code == 200:
-        return response.json().get("access_token")
-    return None
+    try:
+        return get_client(api_key, secret_key).access_token()
+    except (BaiduOCRError, requests.RequestException, ValueError):
+        return None
 
 def baidu_ocr_general(image_path, api_key, secret_key):
     """
     使用百度通用文字识别API
     """
-    access_token = get_baidu_access_token(api_key, secret_key)
-    if not access_token:
-        return None
-    
-    url = f"https://aip.baidubce.com/rest/2.0/ocr/v1/general_basic?access_token={access_token}"
-    
-    # 读取图片并转为base64
     with open(image_path, 'rb') as f:
-        image_data = base64.b64encode(f.read()).decode('utf-8')
-    
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    data = {'image': image_data}
-    
-    response = requests.post(url, headers=headers, data=data)
-    
-    if response.status_code == 200:
-        result = response.json()
-        if 'words_result' in result:
-            # 提取所有识别的文字
-            text_lines = [item['words'] for item in result['words_result']]
-            return '\n'.join(text_lines)
-    
-    return None
+        return _recognize_or_none(f.read(), api_key, secret_key, accurate=False)
 
 def baidu_ocr_accurate(image_path, api_key, secret_key):
     """
     使用百度高精度文字识别API（更准确但调用次数有限）
     """
-    access_token = get_baidu_access_token(api_key, secret_key)
-    if not access_token:
-        return None
-    
-    url = f"https://aip.baidubce.com/rest/2.0/ocr/v1/accurate_basic?access_token={access_token}"
-    
-    # 读取图片并转为base64
     with open(image_path, 'rb') as f:
-        image_data = base64.b64encode(f.read()).decode('utf-8')
-    
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    data = {'image': image_data}
-    
-    response = requests.post(url, headers=headers, data=data)
-    
-    if response.status_code == 200:
-        result = response.json()
-        if 'words_result' in result:
-            # 提取所有识别的文字
-            text_lines = [item['words'] for item in result['words_result']]
-            return '\n'.join(text_lines)
-    
-    return None
+        return _recognize_or_none(f.read(), api_key, secret_key, accurate=True)
+
+def _recognize_or_none(image_data, api_key, secret_key, accurate):
+    try:
+        return recognize(image_data, api_key, secret_key, accurate=accurate)
+    except (BaiduOCRError, requests.RequestException, ValueError):
+        return None
+
+def recognize(image_data, api_key, secret_key, accurate=False):
+    """
+    识别图片字节，返回识别出的文字（每行一段）
+    接口返回错误码时抛出 BaiduOCRError，供 OCR 路由统计错误率和当日额度
+    """
+    return get_client(api_key, secret_key).recognize(image_data, accurate=accurate)
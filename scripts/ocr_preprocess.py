@@ -0,0 +1,196 @@
+"""
+OCR 前的图片预处理和长图切分
+微信海报常是 750×8000 像素的长图，原来按原尺寸、RGB 直接交给 tesseract：单张识别很慢，也只能用一个进程。这里：
+
+- 转为灰度（透明背景先铺白底）
+- 按行投影估计文字行高，行高明显大于 OCR_TARGET_TEXT_HEIGHT 时按比例缩小（tesseract 对二三十像素高的文字识别最好，
+  大字海报缩小后速度快很多，识别率不降）
+- 可选二值化（OCR_BINARIZE=1，Otsu 阈值；彩色背景、渐变背景的海报可以打开）
+- 缩放后高度超过 OCR_TILE_HEIGHT 的长图切成多块，交给 OCR 进程池并行识别，再按顺序拼接：
+  切分点优先选在切分位置附近的空白行（不切断文字行）；找不到空白行时相邻两块重叠 OCR_TILE_OVERLAP 像素，
+  拼接时去掉重叠区域重复识别出的行
+
+行投影不依赖 numpy：把图片用 BOX 滤波缩成 1 像素宽，每个像素就是该行的平均灰度
+"""
+
+import os
+import difflib
+
+from PIL import Image
+
+OCR_PREPROCESS = os.getenv('OCR_PREPROCESS', '1') != '0'
+# 缩放后的目标文字行高（像素，按行投影中一段连续有字的行计算）
+OCR_TARGET_TEXT_HEIGHT = int(os.getenv('OCR_TARGET_TEXT_HEIGHT', 40))
+# 最多缩小到原尺寸的比例
+OCR_MIN_SCALE = float(os.getenv('OCR_MIN_SCALE', 0.3))
+OCR_BINARIZE = os.getenv('OCR_BINARIZE', '0') == '1'
+# 缩放后超过该高度的图片切分识别
+OCR_TILE_HEIGHT = int(os.getenv('OCR_TILE_HEIGHT', 2400))
+OCR_TILE_OVERLAP = int(os.getenv('OCR_TILE_OVERLAP', 120))
+
+# 一行中深色像素比例低于该值视为空白行
+_BLANK_ROW = 0.005
+# 短于该高度的连续有字行视为噪点，不参与行高估计
+_MIN_LINE_HEIGHT = 4
+# 拼接时最多比较的重叠行数
+_MAX_SEAM_LINES = 8
+
+
+def to_gray(image):
+    """转为灰度图，带透明通道的图片先铺白底"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, 'white')
+        image = Image.alpha_composite(background, image)
+    return image.convert('L')
+
+
+def otsu_threshold(gray):
+    """Otsu 阈值：使前景和背景两类灰度的类间方差最大"""
+    hist = gray.histogram()
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    weight_bg = sum_bg = 0
+    best, threshold = -1.0, 128
+    for i, h in enumerate(hist):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * h
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+    return threshold
+
+
+def binarize(gray, threshold=None):
+    """二值化为黑字白底（深色像素占多数时视为深色背景上的浅色字，反转）"""
+    threshold = otsu_threshold(gray) if threshold is None else threshold
+    binary = gray.point(lambda v: 0 if v <= threshold else 255)
+    if binary.histogram()[0] > binary.width * binary.height / 2:
+        binary = binary.point(lambda v: 255 - v)
+    return binary
+
+
+def row_profile(binary):
+    """每行文字像素比例（binary 为黑字白底的二值图）"""
+    column = binary.resize((1, binary.height), Image.Resampling.BOX)
+    return [1 - v / 255 for v in column.tobytes()]
+
+
+def estimate_text_height(profile):
+    """按行投影中连续有字的行段估计文字行高（中位数），没有文字行时返回 None"""
+    runs = []
+    run = 0
+    for ink in profile + [0.0]:
+        if ink > _BLANK_ROW:
+            run += 1
+        elif run:
+            if run >= _MIN_LINE_HEIGHT:
+                runs.append(run)
+            run = 0
+    if not runs:
+        return None
+    runs.sort()
+    return runs[len(runs) // 2]
+
+
+def plan_tiles(profile, tile_height=None, overlap=None):
+    """
+    规划切分区域，返回 [(上边界, 下边界, 是否与上一块重叠)]
+    每块高度不超过 tile_height；切分点优先选在最后 overlap 像素内最靠下的空白行，找不到时与下一块重叠 overlap 像素
+    """
+    tile_height = OCR_TILE_HEIGHT if tile_height is None else tile_height
+    overlap = OCR_TILE_OVERLAP if overlap is None else overlap
+    height = len(profile)
+    tiles = []
+    top = 0
+    overlapped = False
+    while True:
+        if height - top <= tile_height:
+            tiles.append((top, height, overlapped))
+            return tiles
+        bottom = top + tile_height
+        cut = next((y for y in range(bottom - 1, bottom - overlap - 1, -1) if profile[y] <= _BLANK_ROW), None)
+        if cut is not None:
+            tiles.append((top, cut, overlapped))
+            top, overlapped = cut, False
+        else:
+            tiles.append((top, bottom, overlapped))
+            top, overlapped = bottom - overlap, True
+
+
+def prepare(image):
+    """
+    预处理一张图片，返回按从上到下顺序的 [(图块, 是否与上一块重叠)]
+    OCR_PREPROCESS=0 时原样返回一块
+    """
+    if not OCR_PREPROCESS:
+        return [(image, False)]
+    gray = to_gray(image)
+    binary = binarize(gray)
+    profile = row_profile(binary)
+
+    line_height = estimate_text_height(profile)
+    if line_height and line_height > OCR_TARGET_TEXT_HEIGHT * 1.25:
+        scale = max(OCR_TARGET_TEXT_HEIGHT / line_height, OCR_MIN_SCALE)
+        size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+        gray = gray.resize(size, Image.Resampling.LANCZOS)
+        binary = binarize(gray)
+        profile = row_profile(binary)
+    source = binary if OCR_BINARIZE else gray
+
+    if source.height <= OCR_TILE_HEIGHT:
+        return [(source, False)]
+    return [(source.crop((0, top, source.width, bottom)), overlapped)
+            for top, bottom, overlapped in plan_tiles(profile)]
+
+
+def _normalize(line):
+    return ''.join(line.split())
+
+
+def _same_line(a, b):
+    a, b = _normalize(a), _normalize(b)
+    return a == b or difflib.SequenceMatcher(None, a, b).ratio() >= 0.8
+
+
+def _seam(prev, current):
+    """
+    在前一块末尾几行和后一块开头几行中寻找重复识别的行，返回 (前一块保留的行数, 后一块跳过的行数)
+    重叠区域边缘被切断的半行会被识别成乱码，所以允许匹配段之后（前一块）和之前（后一块）各有一行残行
+    """
+    window = prev[-_MAX_SEAM_LINES:]
+    offset = len(prev) - len(window)
+    best = (0, len(prev), 0)
+    for i in range(len(window)):
+        for j in range(min(2, len(current))):
+            k = 0
+            while i + k < len(window) and j + k < len(current) and _same_line(window[i + k], current[j + k]):
+                k += 1
+            if k > best[0] and i + k >= len(window) - 1:
+                best = (k, offset + i + k, j + k)
+    return best[1], best[2]
+
+
+def stitch(parts):
+    """
+    按顺序拼接各块的识别文字 [(文字, 是否与上一块重叠)]
+    重叠的两块之间去掉重复识别的行（允许少量识别差异）和重叠边缘的残行
+    """
+    if len(parts) == 1:
+        return parts[0][0] or ''
+    lines = []
+    for text, overlapped in parts:
+        current = [line for line in (text or '').splitlines() if line.strip()]
+        if overlapped and lines:
+            keep, skip = _seam(lines, current)
+            del lines[keep:]
+            current = current[skip:]
+        lines.extend(current)
+    return '\n'.join(lines)
@@ -0,0 +1,129 @@
+"""
+og:image 封面图提取
+流式读取网页，读到 </head> 就停止下载，只解析 <head> 中的 meta 标签；
+微信文章在 head 中找不到时，继续在后续内容中查找 msg_cdn_url，找到即停止，
+每次只扫描新读到的数据块（加上一小段重叠），不重复扫描整个页面
+"""
+
+import os
+import re
+import time
+import html
+from urllib.parse import urljoin
+
+import http_client
+from result_cache import TTLCache
+
+OG_CHUNK_SIZE = 16 * 1024
+# <head> 最多读取的字节数，超过后按已读内容解析
+OG_HEAD_MAX_BYTES = int(os.getenv('OG_HEAD_MAX_BYTES', 512 * 1024))
+# 查找 msg_cdn_url 时最多读取的字节数
+OG_SCAN_MAX_BYTES = int(os.getenv('OG_SCAN_MAX_BYTES', 2 * 1024 * 1024))
+OG_CACHE_TTL = int(os.getenv('OG_CACHE_TTL', 6 * 3600))
+# 未找到封面图 / 请求失败的负缓存时间
+OG_NEGATIVE_TTL = int(os.getenv('OG_NEGATIVE_TTL', 600))
+
+HEAD_END_RE = re.compile(rb'</head\s*>', re.IGNORECASE)
+META_RE = re.compile(rb'<meta\b[^>]*>', re.IGNORECASE)
+ATTR_RE = re.compile(rb'([a-zA-Z_:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+MSG_CDN_URL_RE = re.compile(rb'var\s+msg_cdn_url\s*=\s*["\']([^"\']+)["\']')
+# 跨数据块匹配 msg_cdn_url 时保留的尾部长度
+SCAN_OVERLAP = 1024
+
+og_cache = TTLCache('og_image', ttl=OG_CACHE_TTL)
+
+
+def _meta_image(head):
+    """从 <head> 字节中按 og:image > twitter:image 的优先级取图片地址"""
+    found = {}
+    for tag in META_RE.finditer(head):
+        attrs = {}
+        for m in ATTR_RE.finditer(tag.group(0)):
+            value = m.group(2) if m.group(2) is not None else (m.group(3) if m.group(3) is not None else m.group(4))
+            attrs[m.group(1).lower()] = value
+        name = (attrs.get(b'property') or attrs.get(b'name') or b'').lower()
+        content = attrs.get(b'content')
+        if content and name in (b'og:image', b'twitter:image') and name not in found:
+            found[name] = html.unescape(content.decode('utf-8', errors='replace')).strip()
+    return found.get(b'og:image') or found.get(b'twitter:image')
+
+
+def fetch_og_image(url, timeout=15, session=None):
+    """
+    提取封面图，返回 (image_url 或 None, 信息)
+    信息包含 status_code、bytes（实际下载字节数）、source（og:image / msg_cdn_url）
+    请求失败（非 200）时 image_url 为 None，status_code 为实际状态码
+    """
+    info = {'status_code': None, 'bytes': 0, 'source': None}
+    if session is None:
+        resp = http_client.get(url, timeout=timeout, stream=True)
+    else:
+        resp = session.get(url, timeout=timeout, stream=True)
+    try:
+        info['status_code'] = resp.status_code
+        if resp.status_code != 200:
+            return None, info
+
+        chunks = resp.iter_content(OG_CHUNK_SIZE)
+        data = bytearray()
+        head_end = None
+        for chunk in chunks:
+            # 只在新数据块附近查找 </head>
+            search_from = max(0, len(data) - 8)
+            data += chunk
+            m = HEAD_END_RE.search(data, search_from)
+            if m:
+                head_end = m.end()
+                break
+            if len(data) >= OG_HEAD_MAX_BYTES:
+                break
+
+        image = _meta_image(bytes(data[:head_end] if head_end else data))
+        if image:
+            info['source'] = 'og:image'
+        elif 'mp.weixin.qq.com' in url:
+            # 微信文章的封面图可能在正文脚本的 msg_cdn_url 中
+            scan_from = 0
+            while True:
+                m = MSG_CDN_URL_RE.search(data, scan_from)
+                if m:
+                    image = m.group(1).decode('utf-8', errors='replace')
+                    info['source'] = 'msg_cdn_url'
+                    break
+                if len(data) >= OG_SCAN_MAX_BYTES:
+                    break
+                chunk = next(chunks, None)
+                if not chunk:
+                    break
+                scan_from = max(0, len(data) - SCAN_OVERLAP)
+                data += chunk
+
+        info['bytes'] = len(data)
+    finally:
+        # 关闭连接，丢弃未读取的剩余内容
+        resp.close()
+
+    if image:
+        if image.startswith('//'):
+            image = 'https:' + image
+        elif not image.startswith('http'):
+            image = urljoin(url, image)
+    return image, info
+
+
+def extract_og_image(url, use_cache=True):
+    """
+    带缓存的封面图提取，返回 (image_url 或 None, 信息)
+    找到的结果缓存 OG_CACHE_TTL 秒；未找到或请求失败缓存 OG_NEGATIVE_TTL 秒；网络异常不缓存
+    """
+    if use_cache:
+        cached = og_cache.get(url)
+        if cached is not None:
+            image, info = cached
+            return image, {**info, 'cached': True}
+
+    start = time.perf_counter()
+    image, info = fetch_og_image(url)
+    info['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    og_cache.set(url, (image, info), ttl=None if image else OG_NEGATIVE_TTL)
+    return image, {**info, 'cached': False}
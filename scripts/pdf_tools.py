@@ -0,0 +1,322 @@
+"""
+PDF 文字提取
+按页分块并行提取（进程池），支持页码范围和逐页流式输出
+
+后端（按 PDF_TEXT_BACKEND 或调用参数选择，默认 auto 依次尝试）：
+- pdfplumber：与原实现一致，版面还原最好，速度最慢
+- pymupdf：速度最快
+- pypdf2：纯 Python 兜底（PyPDF2 或 pypdf）
+"""
+
+import io
+import os
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+PDF_TEXT_BACKEND = os.getenv('PDF_TEXT_BACKEND', 'auto')
+# 每个 API worker 进程内的 PDF 提取进程数
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', min(4, os.cpu_count() or 1)))
+# 每个任务处理的页数，太小会增加进程间通信开销
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 4))
+# 页数不超过该值时直接在当前进程串行提取
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 8))
+
+BACKEND_ORDER = ['pdfplumber', 'pymupdf', 'pypdf2']
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class NoPdfBackendError(ImportError):
+    """没有可用的 PDF 处理库"""
+
+
+def _backend_available(name):
+    try:
+        if name == 'pdfplumber':
+            import pdfplumber  # noqa: F401
+        elif name == 'pymupdf':
+            import fitz  # noqa: F401
+        elif name == 'pypdf2':
+            try:
+                import PyPDF2  # noqa: F401
+            except ImportError:
+                import pypdf  # noqa: F401
+        else:
+            return False
+        return True
+    except ImportError:
+        return False
+
+
+def available_backends():
+    return [name for name in BACKEND_ORDER if _backend_available(name)]
+
+
+def resolve_backend(backend=None):
+    """确定实际使用的后端，没有可用后端时抛出 NoPdfBackendError"""
+    backend = backend or PDF_TEXT_BACKEND
+    if backend != 'auto':
+        if not _backend_available(backend):
+            raise NoPdfBackendError(f'PDF 后端 {backend} 不可用')
+        return backend
+    for name in BACKEND_ORDER:
+        if _backend_available(name):
+            return name
+    raise NoPdfBackendError('未安装 PDF 处理库 (pdfplumber、PyMuPDF 或 PyPDF2)')
+
+
+def _as_input(source):
+    """路径直接使用，bytes 包装为文件对象"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def _open_pypdf(source):
+    try:
+        import PyPDF2 as pypdf
+    except ImportError:
+        import pypdf
+    return pypdf.PdfReader(_as_input(source))
+
+
+def page_count(source, backend):
+    if backend == 'pymupdf':
+        import fitz
+        doc = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype='pdf')
+        try:
+            return doc.page_count
+        finally:
+            doc.close()
+    if backend == 'pdfplumber':
+        import pdfplumber
+        with pdfplumber.open(_as_input(source)) as pdf:
+            return len(pdf.pages)
+    return len(_open_pypdf(source).pages)
+
+
+def _iter_pages(source, backend, page_indices):
+    """只打开一次文档，逐页产出 (页序号, 文字)"""
+    if backend == 'pymupdf':
+        import fitz
+        doc = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype='pdf')
+        try:
+            for i in page_indices:
+                yield i, doc[i].get_text() or ''
+        finally:
+            doc.close()
+    elif backend == 'pdfplumber':
+        import pdfplumber
+        with pdfplumber.open(_as_input(source)) as pdf:
+            for i in page_indices:
+                page = pdf.pages[i]
+                yield i, page.extract_text() or ''
+                # 释放已解析页面的缓存，避免大文档内存持续增长
+                page.close()
+    else:
+        reader = _open_pypdf(source)
+        for i in page_indices:
+            yield i, reader.pages[i].extract_text() or ''
+
+
+def extract_pages(source, backend, page_indices):
+    """
+    提取指定页（从 0 开始）的文字，返回 [(页序号, 文字)]
+    作为进程池任务执行，因此 source 只能是文件路径或 bytes
+    """
+    return list(_iter_pages(source, backend, page_indices))
+
+
+def parse_page_ranges(spec, total):
+    """
+    解析页码范围（从 1 开始，与阅读器一致），返回从 0 开始的页序号列表
+    例如 "1-3,5,8-" 表示第 1~3 页、第 5 页、第 8 页到最后一页；空值表示全部
+    超出范围的页码会被忽略，格式错误抛出 ValueError
+    """
+    if not spec:
+        return list(range(total))
+    pages = []
+    seen = set()
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            start = int(start) if start.strip() else 1
+            end = int(end) if end.strip() else total
+        else:
+            start = end = int(part)
+        if start < 1 or end < start:
+            raise ValueError(f'无效的页码范围: {part}')
+        for page_no in range(start, min(end, total) + 1):
+            if page_no not in seen:
+                seen.add(page_no)
+                pages.append(page_no - 1)
+    return pages
+
+
+def _get_pool():
+    """进程池按 API worker 进程懒创建（fork 后重新创建）"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # 使用 spawn：API worker 是多线程进程，直接 fork 可能继承被其他线程持有的锁
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def iter_pdf_text(source, pages=None, backend=None, workers=None):
+    """
+    按完成顺序逐页产出 (页序号, 文字)，页序号从 0 开始
+    source: 文件路径或 bytes；pages: 页码范围字符串（见 parse_page_ranges）
+    workers: 本次提取最多同时占用的进程数（默认 PDF_WORKERS，不超过进程池大小 PDF_WORKERS）；
+             为 1 时在当前进程串行提取
+    """
+    backend = resolve_backend(backend)
+    if hasattr(source, 'read'):
+        source.seek(0)
+        source = source.read()
+    indices = parse_page_ranges(pages, page_count(source, backend))
+    workers = PDF_WORKERS if workers is None else min(workers, PDF_WORKERS)
+
+    if workers <= 1 or len(indices) <= PDF_PARALLEL_MIN_PAGES:
+        yield from _iter_pages(source, backend, indices)
+        return
+
+    chunks = iter([indices[i:i + PDF_PAGES_PER_TASK] for i in range(0, len(indices), PDF_PAGES_PER_TASK)])
+    pool = _get_pool()
+    # 同时提交的任务数不超过 workers，完成一个再提交下一个
+    running = {pool.submit(extract_pages, source, backend, chunk) for chunk in itertools.islice(chunks, workers)}
+    try:
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    running.add(pool.submit(extract_pages, source, backend, chunk))
+                yield from future.result()
+    finally:
+        # 调用方提前结束（如客户端断开）时取消尚未开始的任务
+        for future in running:
+            future.cancel()
+
+
+def extract_pdf_text(source, pages=None, backend=None, workers=None):
+    """提取 PDF 文字，按页码顺序拼接"""
+    texts = dict(iter_pdf_text(source, pages=pages, backend=backend, workers=workers))
+    return ''.join(texts[i] for i in sorted(texts))
+
+
+# ---------------------------------------------------------------------------
+# 首页缩略图
+# ---------------------------------------------------------------------------
+
+# 按速度排序：PyMuPDF 直接在进程内渲染；pdf2image 需要调用 poppler 子进程；pdfplumber 最慢
+THUMBNAIL_RENDERER_ORDER = ['pymupdf', 'pdf2image', 'pdfplumber']
+# 默认宽度约等于 A4 页面 150 dpi，与原实现的输出尺寸一致
+THUMBNAIL_DEFAULT_WIDTH = int(os.getenv('PDF_THUMBNAIL_WIDTH', 1240))
+THUMBNAIL_MIN_WIDTH = 32
+THUMBNAIL_MAX_WIDTH = 2480
+THUMBNAIL_FORMATS = {'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+THUMBNAIL_QUALITY = int(os.getenv('PDF_THUMBNAIL_QUALITY', 85))
+
+_thumbnail_renderer = None
+_thumbnail_renderer_probed = False
+_thumbnail_lock = threading.Lock()
+
+
+def _minimal_pdf():
+    """生成一个 1 页空白 PDF，用于探测渲染器是否真正可用（如 pdf2image 依赖的 poppler 是否安装）"""
+    objects = [
+        b'<</Type/Catalog/Pages 2 0 R>>',
+        b'<</Type/Pages/Count 1/Kids[3 0 R]>>',
+        b'<</Type/Page/MediaBox[0 0 72 72]/Resources<<>>/Parent 2 0 R>>',
+    ]
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<</Size %d/Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _render_first_page(renderer, source, width):
+    """用指定渲染器直接按目标宽度渲染第一页，返回 RGB 的 PIL Image"""
+    from PIL import Image
+
+    if renderer == 'pymupdf':
+        import fitz
+        doc = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype='pdf')
+        try:
+            page = doc[0]
+            zoom = width / page.rect.width
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+        finally:
+            doc.close()
+
+    if renderer == 'pdf2image':
+        from pdf2image import convert_from_path, convert_from_bytes
+        # size=(width, None) 让 poppler 直接渲染到目标宽度，高度按比例
+        if isinstance(source, str):
+            images = convert_from_path(source, first_page=1, last_page=1, size=(width, None))
+        else:
+            images = convert_from_bytes(source, first_page=1, last_page=1, size=(width, None))
+        return images[0].convert('RGB')
+
+    import pdfplumber
+    with pdfplumber.open(_as_input(source)) as pdf:
+        return pdf.pages[0].to_image(width=width).original.convert('RGB')
+
+
+def get_thumbnail_renderer():
+    """返回可用的最快渲染器名称（首次调用时探测一次，之后直接复用）；都不可用时返回 None"""
+    global _thumbnail_renderer, _thumbnail_renderer_probed
+    with _thumbnail_lock:
+        if not _thumbnail_renderer_probed:
+            probe = _minimal_pdf()
+            for renderer in THUMBNAIL_RENDERER_ORDER:
+                try:
+                    _render_first_page(renderer, probe, THUMBNAIL_MIN_WIDTH)
+                except Exception:
+                    continue
+                _thumbnail_renderer = renderer
+                break
+            _thumbnail_renderer_probed = True
+        return _thumbnail_renderer
+
+
+def render_thumbnail(source, width=None, fmt='jpeg', quality=THUMBNAIL_QUALITY):
+    """
+    渲染 PDF 首页缩略图，返回编码后的图片 bytes
+    source: 文件路径或 bytes；width: 目标宽度（像素）；fmt: jpeg | webp
+    没有可用渲染器时抛出 NoPdfBackendError，参数错误抛出 ValueError
+    """
+    fmt = (fmt or 'jpeg').lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in THUMBNAIL_FORMATS:
+        raise ValueError(f'不支持的缩略图格式: {fmt}（可选 jpeg、webp）')
+    width = int(width or THUMBNAIL_DEFAULT_WIDTH)
+    if not THUMBNAIL_MIN_WIDTH <= width <= THUMBNAIL_MAX_WIDTH:
+        raise ValueError(f'width 必须在 {THUMBNAIL_MIN_WIDTH}~{THUMBNAIL_MAX_WIDTH} 之间')
+
+    renderer = get_thumbnail_renderer()
+    if renderer is None:
+        raise NoPdfBackendError('无法生成 PDF 缩略图，请安装 PyMuPDF 或 pdf2image 库')
+
+    image = _render_first_page(renderer, source, width)
+    out = io.BytesIO()
+    image.save(out, format=fmt.upper(), quality=quality)
+    return out.getvalue()
@@ -0,0 +1,269 @@
+"""
+按内容寻址的结果缓存
+以「输入字节的 SHA-256 + 提取器版本」为键，缓存 OCR 文字、PDF 文字、缩略图等结果，
+同一张海报或同一个 PDF 被重复上传时直接返回，不再重新跑 tesseract / pdfplumber / pdf2image
+
+两级存储：
+- 内存 LRU：按条目数和总字节数限制
+- 磁盘：CACHE_DIR 下的 JSON 文件，总大小超过上限时按最近使用时间淘汰；
+  多个 gunicorn worker 共享同一个目录
+"""
+
+import os
+import json
+import time
+import hashlib
+import pathlib
+import threading
+from collections import OrderedDict
+
+CACHE_DIR = pathlib.Path(os.getenv('CACHE_DIR', pathlib.Path(__file__).parent.parent / 'uploads' / 'cache'))
+CACHE_MEMORY_ITEMS = int(os.getenv('CACHE_MEMORY_ITEMS', 512))
+CACHE_MEMORY_BYTES = int(os.getenv('CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+CACHE_DISK_BYTES = int(os.getenv('CACHE_DISK_BYTES', 512 * 1024 * 1024))
+# 设置 CACHE_DISABLED=1 可关闭所有结果缓存
+CACHE_DISABLED = os.getenv('CACHE_DISABLED', '').lower() in ('1', 'true')
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 所有缓存实例，按名称索引，用于 /api/cache/stats
+CACHES = {}
+
+
+def hash_content(data, version=''):
+    """计算内容哈希，data 可以是 bytes 或文件对象（分块读取）"""
+    sha = hashlib.sha256(version.encode('utf-8') + b'\0')
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        sha.update(data)
+    else:
+        data.seek(0)
+        while True:
+            chunk = data.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+        data.seek(0)
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """内存 LRU + 磁盘两级缓存，值必须可以 JSON 序列化"""
+
+    def __init__(self, name, version, memory_items=CACHE_MEMORY_ITEMS, memory_bytes=CACHE_MEMORY_BYTES,
+                 disk_bytes=CACHE_DISK_BYTES, cache_dir=CACHE_DIR):
+        self.name = name
+        self.version = version
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.disk_dir = pathlib.Path(cache_dir) / name
+        self._memory = OrderedDict()  # key -> (value, size)
+        self._memory_size = 0
+        self._disk_size = None  # 首次写入时统计
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+        CACHES[name] = self
+
+    def key(self, data, variant=''):
+        """variant 用于区分同一输入的不同提取参数（如页码范围、缩略图尺寸）"""
+        return hash_content(data, f'{self.version}|{variant}' if variant else self.version)
+
+    def _path(self, key):
+        return self.disk_dir / key[:2] / f'{key}.json'
+
+    def get(self, key, default=None):
+        """读取缓存，未命中返回 default"""
+        if CACHE_DISABLED:
+            return default
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return entry[0]
+
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                payload = f.read()
+            value = json.loads(payload)['value']
+        except (FileNotFoundError, ValueError, KeyError):
+            with self._lock:
+                self._stats['misses'] += 1
+            return default
+
+        # 更新修改时间，磁盘淘汰时按最近使用排序
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._stats['disk_hits'] += 1
+            self._remember(key, value, len(payload))
+        return value
+
+    def set(self, key, value):
+        if CACHE_DISABLED:
+            return
+        payload = json.dumps({'value': value, 'created_at': time.time()}, ensure_ascii=False)
+        with self._lock:
+            self._stats['sets'] += 1
+            self._remember(key, value, len(payload))
+        self._write_disk(key, payload)
+
+    def get_or_compute(self, data, compute, variant=''):
+        """
+        按 data 的内容哈希查缓存，未命中时调用 compute() 并写入缓存
+        compute() 返回 None（提取失败）时不缓存，下次仍会重试
+        返回 (value, hit)
+        """
+        key = self.key(data, variant)
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        value = compute()
+        if value is not None:
+            self.set(key, value)
+        return value, False
+
+    def _remember(self, key, value, size):
+        """写入内存层（调用方持有锁）"""
+        if size > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= old[1]
+        self._memory[key] = (value, size)
+        self._memory_size += size
+        while self._memory and (len(self._memory) > self.memory_items or self._memory_size > self.memory_bytes):
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_size -= evicted_size
+
+    def _write_disk(self, key, payload):
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            data = payload.encode('utf-8')
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            # 覆盖已有的键时总大小只增加两者之差
+            try:
+                old_size = path.stat().st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 缓存写入失败 ({self.name}): {e}")
+            return
+
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._scan_disk_size()
+            else:
+                self._disk_size += len(data) - old_size
+            over_limit = self._disk_size > self.disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _scan_disk_size(self):
+        return sum(p.stat().st_size for p in self.disk_dir.glob('*/*.json'))
+
+    def _evict_disk(self):
+        """按修改时间从旧到新删除，直到总大小降到上限的 90%"""
+        files = []
+        for p in self.disk_dir.glob('*/*.json'):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.disk_bytes * 0.9
+        evicted = 0
+        for _, size, p in files:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_size = total
+            self._stats['evictions'] += evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['memory_hits'] + self._stats['disk_hits'] + self._stats['misses']
+            hits = self._stats['memory_hits'] + self._stats['disk_hits']
+            return {
+                **self._stats,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_items': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'disk_bytes': self._disk_size,
+                'version': self.version,
+            }
+
+
+def all_stats():
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+class TTLCache:
+    """
+    带过期时间的内存 LRU 缓存（按键缓存，如 URL -> 结果）
+    支持负缓存：set(..., ttl=较短时间) 缓存「未找到」等结果，避免短时间内重复请求
+    """
+
+    def __init__(self, name, ttl, max_items=1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_items = max_items
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'sets': 0}
+        CACHES[name] = self
+
+    def get(self, key, default=None):
+        if CACHE_DISABLED:
+            return default
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            if entry[0] <= now:
+                del self._items[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._items.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        if CACHE_DISABLED:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            self._stats['sets'] += 1
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'items': len(self._items),
+                'ttl': self.ttl,
+            }
@@ -37,14 +37,15 @@ fi
 
 # 启动服务
 echo "🚀 启动 API 服务..."
-echo "📍 服务地址: http://localhost:5000"
-echo "📝 健康检查: http://localhost:5000/health"
-echo "📥 采集接口: http://localhost:5000/api/ingest"
+echo "📍 服务地址: http://localhost:${API_PORT:-5001}"
+echo "📝 健康检查: http://localhost:${API_PORT:-5001}/health"
+echo "📥 采集接口: http://localhost:${API_PORT:-5001}/api/ingest"
+echo "💡 生产模式: ./start_api.sh --mode prod --workers 4 --threads 4"
 echo ""
 echo "按 Ctrl+C 停止服务"
 echo ""
 
-python3 api_server.py
+python3 api_server.py "$@"
 
 
 
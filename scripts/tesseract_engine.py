@@ -0,0 +1,87 @@
+"""
+常驻的 tesseract 识别引擎
+pytesseract.image_to_string() 每识别一张图片都要启动一个 tesseract 子进程，并重新加载 chi_sim + eng 语言模型，
+长文章十几张图片时启动开销占了大部分时间。这里：
+
+- 安装了 tesserocr（libtesseract 的 Python 绑定）时，每个线程保留一个已初始化的 PyTessBaseAPI，语言模型只加载一次；
+  OCR 进程池的每个进程只有一个执行线程，即每个 OCR 进程一个常驻引擎（进程启动时由 warm_up() 预先加载）；
+  每个引擎常驻一份语言模型，整机引擎数 = API_WORKERS × image_ocr.ocr_process_count()（默认每个 worker 1~2 个）
+- 未安装 tesserocr 或引擎初始化失败（如找不到语言数据）时回退到 pytesseract 子进程，识别结果相同
+
+TESSERACT_ENGINE=subprocess 可强制使用 pytesseract（用于对比测试）
+"""
+
+import os
+import time
+import shutil
+import threading
+
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+try:
+    import pytesseract
+    PYTESSERACT_AVAILABLE = shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+except ImportError:
+    PYTESSERACT_AVAILABLE = False
+
+TESSERACT_ENGINE = os.getenv('TESSERACT_ENGINE', 'auto')
+OCR_LANG = 'chi_sim+eng'
+
+_local = threading.local()
+_init_failed = False
+
+
+def _use_resident():
+    return TESSEROCR_AVAILABLE and TESSERACT_ENGINE != 'subprocess' and not _init_failed
+
+
+def available():
+    """是否有可用的 tesseract（常驻引擎或命令行）"""
+    return _use_resident() or PYTESSERACT_AVAILABLE
+
+
+def _engine():
+    """当前线程的常驻引擎，首次使用时初始化（加载语言模型）；初始化失败时返回 None"""
+    global _init_failed
+    api = getattr(_local, 'api', None)
+    if api is None and _use_resident():
+        try:
+            # 与 pytesseract 的默认设置一致：自动版面分析（--psm 3）
+            api = _local.api = tesserocr.PyTessBaseAPI(lang=OCR_LANG, psm=tesserocr.PSM.AUTO)
+        except Exception as e:
+            _init_failed = True
+            print(f"⚠️ tesseract 常驻引擎初始化失败，改用 pytesseract: {e}")
+    return api
+
+
+def warm_up():
+    """预先初始化当前线程的引擎（OCR 进程池的 initializer 中调用，首张图片不再等待模型加载）"""
+    _engine()
+
+
+def image_to_string(image):
+    """识别 PIL 图片，返回文字"""
+    api = _engine()
+    if api is None:
+        return pytesseract.image_to_string(image, lang=OCR_LANG)
+    try:
+        api.SetImage(image)
+        return api.GetUTF8Text()
+    finally:
+        # 释放本次识别的图片和结果，语言模型保留
+        api.Clear()
+
+
+def recognize_timed(image):
+    """识别 PIL 图片，返回 (文字, 耗时秒数)（在 OCR 进程中执行，耗时不含排队时间）"""
+    start = time.perf_counter()
+    text = image_to_string(image)
+    return text, time.perf_counter() - start
+
+
+def engine_name():
+    return 'tesserocr' if _use_resident() else 'pytesseract'
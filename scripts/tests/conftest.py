@@ -0,0 +1,26 @@
+"""
+测试共用设置
+"""
+
+import sys
+import pathlib
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import metrics
+
+
+@pytest.fixture(scope='session', autouse=True)
+def session_metrics_dir(tmp_path_factory):
+    """
+    指标快照写到临时目录，不写入仓库的 uploads/metrics（在第一个测试记录指标之前设置）
+    后台写盘线程和退出时的 atexit 都在测试结束后才可能执行，模块属性不恢复；
+    环境变量供测试中启动的子进程使用
+    """
+    path = tmp_path_factory.mktemp('metrics')
+    metrics.METRICS_DIR = path
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('METRICS_DIR', str(path))
+        yield path
@@ -0,0 +1,258 @@
+"""
+测试 API 服务的上传和异步任务
+用 Flask 测试客户端发请求，AI 解析和 Supabase 替换为本地模拟对象
+"""
+
+import io
+import sys
+import json
+import time
+import pathlib
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import api_server
+import ingest_multimodal
+import uploads
+from ocr_backends import OCRBackend, OCRRouter
+
+
+def _read_content(content):
+    if hasattr(content, 'read'):
+        return content.read()
+    with open(content, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(api_server.job_queue, 'job_dir', tmp_path / 'jobs')
+    monkeypatch.setattr(uploads, 'UPLOAD_DIR', tmp_path / 'uploads')
+    return api_server.app.test_client()
+
+
+def _wait_job(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = api_server.job_queue.get(job_id)
+        if job and job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'任务 {job_id} 未在 {timeout}s 内结束')
+
+
+@pytest.mark.parametrize('size', [30, 20 * 1024 * 1024])
+def test_async_multipart_upload_completes(client, monkeypatch, size):
+    """异步任务在请求结束（request.files 被关闭）之后才读取上传内容；大文件为转存的临时文件"""
+    def slow_process(content, input_type, use_cache=True, on_stage=None):
+        time.sleep(0.2)
+        return {'type': input_type, 'bytes': len(_read_content(content))}
+
+    monkeypatch.setattr(api_server, 'process_and_save', slow_process)
+    response = client.post('/api/ingest?async=1', data={'file': (io.BytesIO(b'x' * size), 'poster.jpg')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    job = _wait_job(response.json['job_id'])
+    assert job['status'] == 'succeeded', job['error']
+    assert job['result'] == {'type': 'image_url', 'bytes': size}
+
+
+class FakeEvents:
+    """模拟 Supabase events 表：查询较慢，放大「检查重复」和「插入」之间的竞争窗口"""
+
+    def __init__(self):
+        self.rows = []
+
+    def table(self, name):
+        return self
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def gte(self, *args):
+        return self
+
+    def execute(self):
+        time.sleep(0.05)
+        return SimpleNamespace(data=list(self.rows))
+
+    def insert(self, row):
+        def execute():
+            self.rows.append({'id': len(self.rows) + 1, **row})
+            return ('data', [row]), ('count', None)
+        return SimpleNamespace(execute=execute)
+
+
+def _fake_ai(title):
+    content = json.dumps({'is_valid': True, 'title': title, 'type': 'recruit', 'summary': ''}, ensure_ascii=False)
+    response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: response)))
+
+
+def test_batch_duplicate_items_saved_once(client, monkeypatch, tmp_path):
+    """同一批次中的相同活动并发处理时只写入一条"""
+    events = FakeEvents()
+    monkeypatch.setattr(ingest_multimodal, 'supabase', events)
+    monkeypatch.setattr(ingest_multimodal, 'openai_client', _fake_ai('美团-商业分析实习生-商业化战略方向'))
+    monkeypatch.setattr(ingest_multimodal, 'DEDUP_LOCK_DIR', tmp_path / 'locks')
+
+    items = [{'content': f'招聘消息 {i}', 'type': 'text'} for i in range(4)]
+    response = client.post('/api/ingest/batch', json={'items': items, 'concurrency': 4})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert len(events.rows) == 1
+    assert sum(r['result']['saved'] for r in results) == 1
+    assert sorted(str(r['result']['reason']) for r in results) == ['None', 'duplicate', 'duplicate', 'duplicate']
+
+
+@pytest.mark.parametrize('body', [
+    {'items': 'abc'},
+    {'items': {'content': '招聘消息'}},
+    {'items': []},
+    {'items': ['招聘消息']},
+    [{'content': '招聘消息'}],
+])
+def test_batch_rejects_malformed_items(client, monkeypatch, body):
+    """items 不是非空的对象数组时直接返回 400，不按字符或键逐个处理"""
+    monkeypatch.setattr(api_server, '_process_batch_item', lambda index, item: pytest.fail('不应处理条目'))
+    response = client.post('/api/ingest/batch', json=body)
+    assert response.status_code == 400
+
+
+def test_batch_caps_item_count(client, monkeypatch):
+    monkeypatch.setattr(api_server, 'BATCH_MAX_ITEMS', 3)
+    monkeypatch.setattr(api_server, '_process_batch_item', lambda index, item: pytest.fail('不应处理条目'))
+    response = client.post('/api/ingest/batch', json={'items': [{'content': '招聘消息'}] * 4})
+    assert response.status_code == 400
+    assert '3' in response.json['error']
+
+
+@pytest.mark.parametrize('mode', ['hedged', 'sequential'])
+def test_fetch_caches_validators_of_winning_strategy(monkeypatch, mode):
+    """Jina 胜出时不保存直接抓取拿到的源站 ETag，直接抓取胜出时保存"""
+    saved = []
+    winners = []
+
+    def jina(url, is_wechat=False, cancel=None, validators=None):
+        return (True, 'Jina 提取的正文' * 20) if winners[-1] == 'jina' else (False, None)
+
+    def direct(url, is_wechat=False, cancel=None, validators=None):
+        validators['etag'] = '"raw-page"'
+        return (True, '源站页面正文' * 40) if winners[-1] == 'http' else (False, None)
+
+    monkeypatch.setattr(ingest_multimodal, 'FETCH_MODE', mode)
+    monkeypatch.setattr(ingest_multimodal, 'FETCH_ORDER', ['jina', 'http'])
+    monkeypatch.setitem(ingest_multimodal.FETCH_STRATEGIES, 'jina', jina)
+    monkeypatch.setitem(ingest_multimodal.FETCH_STRATEGIES, 'http', direct)
+    monkeypatch.setattr(ingest_multimodal.domain_scheduler, 'in_cooldown', lambda url: False)
+    monkeypatch.setattr(ingest_multimodal.url_cache, 'put',
+                        lambda url, content, validators=None, source=None: saved.append((source, validators)))
+
+    for winner in ('jina', 'http'):
+        winners.append(winner)
+        assert ingest_multimodal.extract_content_from_url('https://example.com/news', use_cache=False)
+    assert saved == [('jina', {}), ('http', {'etag': '"raw-page"'})]
+
+
+def _pdf_bytes(pages):
+    fitz = pytest.importorskip('fitz')
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f'page-{i + 1}')
+    return doc.tobytes()
+
+
+def test_pdf_stream_reports_unexpected_errors(client, monkeypatch):
+    """流式提取中途出现任意异常时，最后一行为 {"done": true, "error": ...}"""
+    def broken(source, pages=None, backend=None):
+        yield 0, 'page-1'
+        raise RuntimeError('A process in the process pool was terminated abruptly')
+
+    monkeypatch.setattr(api_server.pdf_tools, 'iter_pdf_text', broken)
+    response = client.post('/api/pdf-extract?stream=1&backend=pymupdf', data=_pdf_bytes(2),
+                           content_type='application/pdf')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[0] == {'page': 1, 'text': 'page-1'}
+    assert lines[-1]['done'] is True
+    assert 'terminated abruptly' in lines[-1]['error']
+
+
+def test_pdf_stream_releases_upload_without_iteration(client, monkeypatch):
+    """客户端在第一行输出前断开（响应从未被迭代）时，上传内容同样被释放"""
+    closed = []
+    original_close = uploads.UploadBuffer.close
+
+    def tracking_close(self):
+        closed.append(self)
+        original_close(self)
+
+    monkeypatch.setattr(uploads.UploadBuffer, 'close', tracking_close)
+    with api_server.app.test_request_context('/api/pdf-extract?stream=1&backend=pymupdf', method='POST',
+                                             data=_pdf_bytes(2), content_type='application/pdf'):
+        response = api_server.pdf_extract()
+    assert not closed
+    response.close()
+    assert len(closed) == 1
+
+
+class FakeOCR(OCRBackend):
+    def __init__(self, name, cost):
+        self.name = self.provider = name
+        self.cost = cost
+        self.quality = 3 if cost else 1
+        self.latency = 0.1 if cost else 5.0
+        self.calls = 0
+
+    def recognize(self, data):
+        self.calls += 1
+        return f'{self.name} 识别出的海报文字内容'
+
+
+def test_ocr_uses_paid_backends_only_when_allowed(client, monkeypatch, tmp_path):
+    """配置了收费后端（且打分更优）时，/api/ocr 默认仍只用本地识别，传 allow_paid 后才使用"""
+    local, paid = FakeOCR('local', 0), FakeOCR('paid', 0.01)
+    router = OCRRouter([local, paid], state_dir=tmp_path, quotas={}, allow_paid=False)
+    monkeypatch.setattr(api_server, 'ocr_router', router)
+    monkeypatch.setattr(ingest_multimodal, 'ocr_router', router)
+    variants = []
+
+    def no_cache(data, compute, variant=''):
+        variants.append(variant)
+        return compute(), False
+
+    monkeypatch.setattr(api_server.ocr_cache, 'get_or_compute', no_cache)
+    image = io.BytesIO()
+    Image.new('L', (400, 300), 255).save(image, 'PNG')
+
+    # 收费后端打分更优，允许时使用
+    response = client.post('/api/ocr?allow_paid=1', data=image.getvalue(), content_type='image/png')
+    assert response.json['text'].startswith('paid')
+    response = client.post('/api/ocr', data=image.getvalue(), content_type='image/png')
+    assert response.json['text'].startswith('local')
+    assert paid.calls == 1
+    # 结果按是否允许收费后端分别缓存
+    assert variants == ['|paid', '']
+
+    # 服务端开启 OCR_ALLOW_PAID 时默认允许收费后端，按实际是否允许缓存；请求传 false 时只用本地识别
+    # （本地后端此时已有实测耗时，路由不一定选收费后端，这里检查传给路由的值）
+    router.allow_paid = True
+    allowed = []
+    recognize = router.recognize
+
+    def record(data, **kwargs):
+        allowed.append(kwargs['allow_paid'])
+        return recognize(data, **kwargs)
+
+    monkeypatch.setattr(router, 'recognize', record)
+    client.post('/api/ocr', data=image.getvalue(), content_type='image/png')
+    response = client.post('/api/ocr?allow_paid=false', data=image.getvalue(), content_type='image/png')
+    assert response.json['text'].startswith('local')
+    assert allowed == [True, False]
+    assert variants == ['|paid', '', '|paid', '']
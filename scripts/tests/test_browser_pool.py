@@ -0,0 +1,131 @@
+"""
+测试 Playwright 浏览器池
+用假的 Playwright 对象验证：页面操作在浏览器所属线程执行、浏览器复用与按页数回收、断开后重启，
+以及页面操作卡住时关闭并替换浏览器
+"""
+
+import sys
+import pathlib
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import browser_pool
+
+
+class FakeBrowser:
+    def __init__(self, launches):
+        self.connected = True
+        self.owner = threading.get_ident()
+        # 浏览器进程被结束时置位，阻塞中的页面调用随即返回
+        self.closed = threading.Event()
+        self.pid = 40000 + len(launches)
+        launches.append(self)
+
+    def is_connected(self):
+        return self.connected
+
+    def new_browser_cdp_session(self):
+        processes = [{'id': self.pid + 1, 'type': 'renderer'}, {'id': self.pid, 'type': 'browser'}]
+        return SimpleNamespace(send=lambda method: {'processInfo': processes}, detach=lambda: None)
+
+    def new_context(self, **kwargs):
+        browser = self
+
+        class Context:
+            def route(self, pattern, handler):
+                pass
+
+            def new_page(self):
+                assert threading.get_ident() == browser.owner
+                return type('Page', (), {'browser': browser, 'close': lambda self: None})()
+
+            def close(self):
+                pass
+
+        return Context()
+
+    def close(self):
+        self.connected = False
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    launches = []
+
+    class FakePlaywright:
+        def start(self):
+            chromium = type('Chromium', (), {'launch': lambda self, **kw: FakeBrowser(launches)})()
+            return type('PW', (), {'chromium': chromium, 'stop': lambda self: None})()
+
+    monkeypatch.setattr(browser_pool, 'PLAYWRIGHT_AVAILABLE', True)
+    monkeypatch.setattr(browser_pool, 'sync_playwright', FakePlaywright, raising=False)
+    monkeypatch.setattr(browser_pool, 'BROWSER_MAX_PAGES', 3)
+    monkeypatch.setattr(browser_pool, '_kill', lambda pid: next(b for b in launches if b.pid == pid).closed.set())
+    pool = browser_pool.BrowserPool(size=1)
+    yield pool, launches
+    pool.close()
+
+
+def test_reuses_browser_and_recycles(pool):
+    pool, launches = pool
+    callers = set()
+    for _ in range(4):
+        callers.add(pool.run(lambda page: threading.get_ident()))
+    # 所有页面操作都在同一个浏览器线程中执行，且不是调用方线程
+    assert len(callers) == 1 and threading.get_ident() not in callers
+    # 处理 3 个页面后回收，第 4 个页面使用新启动的浏览器
+    assert len(launches) == 2
+
+
+def test_relaunches_disconnected_browser(pool):
+    pool, launches = pool
+    first = pool.run(lambda page: page.browser)
+    first.connected = False
+    assert pool.run(lambda page: page.browser) is not first
+    with pytest.raises(ValueError):
+        pool.run(lambda page: (_ for _ in ()).throw(ValueError('boom')))
+    # 出错后浏览器仍可继续使用
+    assert pool.run(lambda page: 'ok') == 'ok'
+
+
+def test_hung_page_call_replaces_browser(pool):
+    pool, launches = pool
+
+    def hang(page):
+        # 模拟永不返回的 page.evaluate：只有浏览器被关闭时才抛出异常
+        page.browser.closed.wait(10)
+        raise RuntimeError('Target page, context or browser has been closed')
+
+    with pytest.raises(browser_pool.BrowserTaskTimeout):
+        pool.run(hang, timeout=0.2)
+    assert launches[0].closed.is_set()
+    # 卡住的浏览器被替换，租用名额没有减少
+    assert pool.run(lambda page: 'ok', lease_timeout=1) == 'ok'
+    assert pool.run(lambda page: 'ok', lease_timeout=1) == 'ok'
+    assert pool.stats()['idle'] == 1
+
+
+def test_warm_does_not_wait_for_busy_browser(pool, monkeypatch):
+    """预热时浏览器被占用（或卡住）不会一直等待"""
+    pool, launches = pool
+    monkeypatch.setattr(browser_pool, 'BROWSER_LEASE_TIMEOUT', 0.2)
+    started, release = threading.Event(), threading.Event()
+
+    def busy(page):
+        started.set()
+        release.wait(5)
+
+    caller = threading.Thread(target=pool.run, args=(busy,))
+    caller.start()
+    started.wait(5)
+    warmer = threading.Thread(target=pool.warm)
+    warmer.start()
+    warmer.join(2)
+    assert not warmer.is_alive()
+    release.set()
+    caller.join(5)
+    assert pool.run(lambda page: 'ok', lease_timeout=1) == 'ok'
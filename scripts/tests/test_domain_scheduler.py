@@ -0,0 +1,84 @@
+"""
+测试按域名的抓取调度
+验证最小请求间隔、并发上限、被拦截后的退避和冷却（多进程共享），以及取消等待
+"""
+
+import sys
+import time
+import pathlib
+import threading
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import domain_scheduler
+from domain_scheduler import DomainScheduler, DomainSlotTimeout
+
+URL = 'https://mp.weixin.qq.com/s/abc'
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return DomainScheduler(tmp_path, policies={'mp.weixin.qq.com': {'concurrency': 2, 'min_interval': 0.1}})
+
+
+def test_spacing_and_concurrency(scheduler):
+    starts = []
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def fetch():
+        with scheduler.slot(URL):
+            with lock:
+                starts.append(time.monotonic())
+                active['now'] += 1
+                active['max'] = max(active['max'], active['now'])
+            time.sleep(0.15)
+            with lock:
+                active['now'] -= 1
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    starts.sort()
+    assert active['max'] == 2
+    assert all(b - a >= 0.09 for a, b in zip(starts, starts[1:]))
+
+    # 其他域名不受影响
+    begin = time.monotonic()
+    with scheduler.slot('https://example.com/a'):
+        pass
+    assert time.monotonic() - begin < 0.05
+
+
+def test_block_backoff_and_shared_cooldown(scheduler, tmp_path, monkeypatch):
+    monkeypatch.setattr(domain_scheduler, 'DOMAIN_COOLDOWN', 60)
+    assert not scheduler.in_cooldown(URL)
+    scheduler.report_blocked(URL)
+    scheduler.report_blocked(URL)
+    stats = scheduler.stats()['mp.weixin.qq.com']
+    assert stats['backoff'] == 4 and stats['blocks'] == 2
+    # 连续被拦截时冷却时间加倍
+    assert 110 < stats['cooldown_remaining'] <= 120
+    assert scheduler.in_cooldown(URL)
+
+    # 另一个 worker 进程读取共享的冷却状态
+    other = DomainScheduler(tmp_path)
+    assert other.in_cooldown('https://mp.weixin.qq.com/s/other')
+    assert not other.in_cooldown('https://example.com/a')
+
+    scheduler.report_ok(URL)
+    stats = scheduler.stats()['mp.weixin.qq.com']
+    assert stats['backoff'] == 2 and stats['blocks'] == 0
+
+
+def test_cancel_while_waiting(scheduler):
+    cancel = threading.Event()
+    with scheduler.slot(URL), scheduler.slot(URL):
+        threading.Timer(0.2, cancel.set).start()
+        with pytest.raises(DomainSlotTimeout):
+            with scheduler.slot(URL, cancel=cancel):
+                pass
@@ -0,0 +1,57 @@
+"""
+测试网页正文提取
+每种可用的解析器（selectolax / lxml / BeautifulSoup）对同一页面应给出相同结果
+"""
+
+import sys
+import pathlib
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import html_extract
+
+WECHAT_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>公众号标题</title>
+<script>var msg_title = "不是正文"; if (a < b) { document.write("<p>x</p>"); }</script>
+<style>.rich_media_content { color: red; }</style></head>
+<body>
+<h1 class="rich_media_title" id="activity-name">  讲座预告：人工智能与未来教育  </h1>
+<div class="rich_media_content js_underline_content" id="js_content">
+  <p>时间：10 月 20 日 14:00，地点：图书馆报告厅，欢迎同学们报名参加。</p>
+  <!-- 注释不是正文 -->
+  <section><span>报名方式：</span><strong>扫描下方二维码</strong></section>
+  <script>window.__x = "也不是正文";</script>
+  <img data-src="https://mmbiz.qpic.cn/mmbiz_jpg/abc/640?wx_fmt=jpeg" data-w="1080" data-ratio="1.5">
+  <p><img src="//mmbiz.qpic.cn/mmbiz_png/def/0?wx_fmt=png"></p>
+</div>
+</body></html>"""
+
+
+@pytest.mark.parametrize('parser', html_extract.available_parsers())
+def test_parse_wechat_page(parser):
+    doc = html_extract.parse_page(WECHAT_PAGE, parser=parser)
+    assert doc['parser'] == parser
+    assert doc['title'] == '讲座预告：人工智能与未来教育'
+
+    sections = dict(doc['sections'])
+    assert sections['#js_content'] == [
+        '时间：10 月 20 日 14:00，地点：图书馆报告厅，欢迎同学们报名参加。\n报名方式：\n扫描下方二维码']
+    assert sections['.rich_media_content'] == sections['#js_content']
+    assert sections['#activity-name'] == ['讲座预告：人工智能与未来教育']
+
+    assert '不是正文' not in doc['text'] and '注释' not in doc['text']
+    assert doc['text'].startswith('讲座预告')
+
+    assert [src for src, _ in doc['images']] == [
+        'https://mmbiz.qpic.cn/mmbiz_jpg/abc/640?wx_fmt=jpeg', '//mmbiz.qpic.cn/mmbiz_png/def/0?wx_fmt=png']
+    assert doc['images'][0][1]['data-ratio'] == '1.5'
+
+
+@pytest.mark.parametrize('parser', html_extract.available_parsers())
+def test_parse_generic_page(parser):
+    doc = html_extract.parse_page('<html><head><title>通知</title></head><body><p>正文</p></body></html>', parser)
+    assert doc['title'] == '通知'
+    assert doc['text'] == '正文'
+    assert doc['images'] == [] and dict(doc['sections'])['#js_content'] == []
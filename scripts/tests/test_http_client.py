@@ -0,0 +1,72 @@
+"""
+测试共享 HTTP 客户端
+验证连接复用、5xx 重试以及不保存 Cookie
+"""
+
+import sys
+import pathlib
+import threading
+import http.server
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import http_client
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(http_client, 'HTTP_BACKOFF', 0)
+    http_client.reset()
+    state = {'connections': 0, 'flaky': 0, 'cookies': []}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            state['connections'] += 1
+            super().setup()
+
+        def do_GET(self):
+            state['cookies'].append(self.headers.get('Cookie'))
+            status = 200
+            if self.path == '/flaky':
+                state['flaky'] += 1
+                status = 503 if state['flaky'] < 3 else 200
+            self.send_response(status)
+            self.send_header('Set-Cookie', 'sid=1; Path=/')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, *a):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_port}', state
+    httpd.shutdown()
+    http_client.reset()
+
+
+def test_reuses_connection_without_cookies(server):
+    base, state = server
+    for _ in range(5):
+        assert http_client.get(base + '/page', timeout=5).status_code == 200
+    assert state['connections'] == 1
+    assert state['cookies'] == [None] * 5
+
+
+def test_retries_server_errors(server):
+    base, state = server
+    resp = http_client.get(base + '/flaky', timeout=5)
+    assert resp.status_code == 200
+    assert state['flaky'] == 3
+
+
+def test_read_text_keeps_connection(server):
+    base, state = server
+    for _ in range(3):
+        assert http_client.read_text(http_client.get(base + '/page', timeout=5, stream=True)) == 'ok'
+    assert state['connections'] == 1
@@ -0,0 +1,69 @@
+"""
+测试 OCR 前的图片预筛选
+验证属性过滤和去重、图片头部尺寸解析，以及缩略图文字判断
+"""
+
+import io
+import sys
+import random
+import pathlib
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import image_filter
+
+
+def encode(image, fmt):
+    buf = io.BytesIO()
+    image.save(buf, fmt)
+    return buf.getvalue()
+
+
+def test_select_images_by_attrs():
+    base = 'https://mmbiz.qpic.cn/mmbiz_jpg/abc{}/640?wx_fmt={}'
+    items = [
+        (0, base.format(1, 'jpeg'), {'data-w': '1080', 'data-ratio': '1.5'}),
+        (1, base.format(2, 'gif'), {'data-w': '300', 'data-ratio': '1'}),
+        (2, base.format(3, 'png'), {'data-w': '1080', 'data-ratio': '0.02'}),     # 分割线
+        (3, base.format(4, 'png'), {'data-w': '64', 'data-ratio': '1'}),          # 小图标
+        (4, 'https://mmbiz.qpic.cn/mmbiz_jpg/abc1/0?wx_fmt=jpeg&from=appmsg', {}),  # 与第 1 张相同
+        (5, base.format(5, 'png'), {}),                                            # 无尺寸信息，保留
+    ]
+    assert [idx for idx, _ in image_filter.select_images(items)] == [0, 5]
+
+
+@pytest.mark.parametrize('fmt', ['PNG', 'GIF', 'JPEG', 'WEBP'])
+def test_parse_image_size(fmt):
+    data = encode(Image.new('RGB', (321, 123), 'white'), fmt)
+    assert image_filter.parse_image_size(data[:image_filter.IMAGE_HEADER_BYTES])[1:] == (321, 123)
+
+
+def test_header_reason():
+    assert image_filter.header_reason(encode(Image.new('RGB', (640, 640)), 'GIF')) == 'gif'
+    assert image_filter.header_reason(encode(Image.new('RGB', (1080, 20)), 'PNG')) == 'small'
+    assert image_filter.header_reason(encode(Image.new('RGB', (1080, 800)), 'JPEG')) is None
+    assert image_filter.header_reason(b'not an image') is None
+
+
+def test_text_reason():
+    poster = Image.new('RGB', (1080, 1200), 'white')
+    draw = ImageDraw.Draw(poster)
+    font = ImageFont.load_default(size=36)
+    for y in range(40, 1160, 60):
+        draw.text((40, y), 'Lecture on 10/20 at Room 301, sign up before Friday', fill='black', font=font)
+    assert image_filter.text_reason(encode(poster, 'JPEG')) is None
+
+    blank = Image.new('RGB', (1080, 600), (240, 200, 200))
+    assert image_filter.text_reason(encode(blank, 'JPEG')) == 'no_text'
+
+    rng = random.Random(1)
+    qrcode = Image.new('L', (348, 348), 255)
+    draw = ImageDraw.Draw(qrcode)
+    for i in range(29):
+        for j in range(29):
+            if rng.random() < 0.5:
+                draw.rectangle([j * 12, i * 12, j * 12 + 11, i * 12 + 11], fill=0)
+    assert image_filter.text_reason(encode(qrcode, 'PNG')) == 'qrcode'
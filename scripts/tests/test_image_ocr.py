@@ -0,0 +1,148 @@
+"""
+测试文章图片并行下载 + OCR
+验证结果按图片序号排序、同一主机并发上限、超出时间预算后跳过剩余图片，以及流式产出和识别结果缓存
+"""
+
+import sys
+import time
+import pathlib
+import threading
+import http.server
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import image_ocr
+from result_cache import ResultCache
+
+
+def fake_ocr(data):
+    """用图片内容充当识别结果，序号越小越慢，检验结果是否重新排序"""
+    index = int(data.decode())
+    time.sleep(0.01 * (10 - index))
+    return f'poster slice number {index}', 0.01
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    monkeypatch.setattr(image_ocr, 'ocr_cache', ResultCache('image_ocr_test', 'v1', cache_dir=tmp_path))
+    monkeypatch.setattr(image_ocr, 'OCR_PROCESSES', 0)
+    monkeypatch.setattr(image_ocr, 'OCR_PER_HOST_LIMIT', 2)
+    monkeypatch.setattr(image_ocr, '_executor_pid', None)
+    state = {'active': 0, 'max_active': 0, 'requests': 0}
+    lock = threading.Lock()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                state['active'] += 1
+                state['requests'] += 1
+                state['max_active'] = max(state['max_active'], state['active'])
+            time.sleep(float(self.path.split('delay=')[1]) if 'delay=' in self.path else 0.05)
+            body = self.path.split('/')[1].split('?')[0].encode()
+            with lock:
+                state['active'] -= 1
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_port}', state
+    httpd.shutdown()
+    monkeypatch.setattr(image_ocr, '_executor_pid', None)
+
+
+def test_results_in_image_order(server):
+    base, state = server
+    items = [(i, f'{base}/{i}') for i in range(8)]
+    results = image_ocr.ocr_image_urls(items, ocr_func=fake_ocr)
+    assert [idx for idx, _ in results] == list(range(8))
+    assert results[3][1] == 'poster slice number 3'
+    assert state['max_active'] == 2
+
+
+def test_budget_skips_remaining_images(server):
+    base, _ = server
+    items = [(0, f'{base}/0'), (1, f'{base}/1?delay=2')]
+    start = time.monotonic()
+    results = image_ocr.ocr_image_urls(items, budget=0.5, ocr_func=fake_ocr)
+    assert time.monotonic() - start < 1.5
+    assert [idx for idx, _ in results] == [0]
+
+
+def test_stream_yields_as_completed_and_caches(server):
+    base, state = server
+    urls = [f'{base}/0?delay=0.5'] + [f'{base}/{i}' for i in range(1, 4)]
+    # 第 1 张图片下载最慢，流式产出按完成顺序而不是图片顺序
+    refs = ((i, url, {}) for i, url in enumerate(urls))
+    assert [idx for idx, _ in image_ocr.iter_image_ocr(refs, ocr_func=fake_ocr)][-1] == 0
+
+    # 再次识别同一批图片直接使用缓存，不再下载
+    state['requests'] = 0
+    texts = image_ocr.ocr_article_images(list(enumerate(urls)))
+    assert texts[1] == '[图片2文字]: poster slice number 1'
+    assert state['requests'] == 0
+
+
+def test_ocr_process_count_follows_worker_count(monkeypatch):
+    """OCR 进程池按 worker 创建：默认按 CPU 核数 / worker 数分配，不随 worker 数成倍增加"""
+    monkeypatch.setattr(image_ocr, 'OCR_PROCESSES', None)
+    monkeypatch.setattr(image_ocr.os, 'cpu_count', lambda: 8)
+    # gunicorn 默认 2×CPU+1 个 worker
+    monkeypatch.setenv('API_WORKERS', '17')
+    assert image_ocr.ocr_process_count() == 1
+    monkeypatch.setenv('API_WORKERS', '4')
+    assert image_ocr.ocr_process_count() == 2
+    monkeypatch.setenv('API_WORKERS', '1')
+    assert image_ocr.ocr_process_count() == image_ocr.OCR_MAX_PROCESSES
+    monkeypatch.setattr(image_ocr, 'OCR_PROCESSES', 3)
+    assert image_ocr.ocr_process_count() == 3
+
+
+def test_ocr_process_count_without_worker_count(monkeypatch):
+    """未设置 API_WORKERS（开发模式、脚本）时不按 gunicorn 默认 worker 数分摊，按 CPU 核数分配"""
+    monkeypatch.setattr(image_ocr, 'OCR_PROCESSES', None)
+    monkeypatch.setattr(image_ocr, 'OCR_MAX_PROCESSES', 4)
+    monkeypatch.delenv('API_WORKERS', raising=False)
+    monkeypatch.setattr(image_ocr.os, 'cpu_count', lambda: 8)
+    assert image_ocr.ocr_process_count() == 4
+    monkeypatch.setattr(image_ocr.os, 'cpu_count', lambda: 2)
+    assert image_ocr.ocr_process_count() == 2
+
+
+def test_gunicorn_exports_worker_count(monkeypatch):
+    """gunicorn 在每个 worker 中导出实际 worker 数，OCR 进程数按它分配"""
+    import types
+    import gunicorn_conf
+    # post_fork 重新创建的外部服务客户端与这里无关
+    monkeypatch.setitem(sys.modules, 'ingest_multimodal', types.SimpleNamespace(init_clients=lambda: None))
+    monkeypatch.setitem(sys.modules, 'http_client', types.SimpleNamespace(reset=lambda: None))
+    monkeypatch.delenv('BROWSER_POOL_PREWARM', raising=False)
+    monkeypatch.delenv('API_WORKERS', raising=False)
+    server = types.SimpleNamespace(cfg=types.SimpleNamespace(workers=6), log=types.SimpleNamespace(info=lambda msg: None))
+    gunicorn_conf.post_fork(server, types.SimpleNamespace(pid=1))
+    assert image_ocr.os.environ['API_WORKERS'] == '6'
+    monkeypatch.setattr(image_ocr, 'OCR_PROCESSES', None)
+    monkeypatch.setattr(image_ocr.os, 'cpu_count', lambda: 12)
+    assert image_ocr.ocr_process_count() == 2
+
+
+def test_single_image_path_creates_only_ocr_pool(monkeypatch):
+    """单张图片识别只创建按部署规模分配的 OCR 进程池（进程按需启动），不创建文章图片的下载线程池"""
+    monkeypatch.setattr(image_ocr, 'OCR_PROCESSES', None)
+    monkeypatch.setenv('API_WORKERS', str(2 * (image_ocr.os.cpu_count() or 1) + 1))
+    monkeypatch.setattr(image_ocr, '_executor_pid', None)
+    executor = image_ocr.get_ocr_executor()
+    try:
+        assert executor._max_workers == 1
+        assert image_ocr.get_ocr_executor() is executor
+        assert image_ocr._download_executor is None
+    finally:
+        executor.shutdown()
+        monkeypatch.setattr(image_ocr, '_executor_pid', None)
@@ -0,0 +1,79 @@
+"""
+测试异步采集任务队列
+验证所属 worker 进程退出或心跳超时的任务被标记为失败，以及 worker 退出时的任务处理
+"""
+
+import os
+import sys
+import json
+import time
+import pathlib
+import threading
+import subprocess
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from jobs import JobQueue, INTERRUPTED_ERROR
+
+
+def _wait_status(queue, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'任务状态未变为 {status}: {job}')
+
+
+def test_job_of_exited_worker_marked_failed(tmp_path):
+    """任务文件停留在 running，所属进程已不存在"""
+    queue = JobQueue(job_dir=tmp_path)
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    job = {'id': 'ab' * 16, 'status': 'running', 'stage': 'ocr',
+           'stages': [{'name': 'ocr', 'started_at': time.time(), 'finished_at': None}],
+           'meta': {}, 'result': None, 'error': None, 'created_at': time.time(), 'pid': dead.pid}
+    (tmp_path / f"{job['id']}.json").write_text(json.dumps(job))
+
+    job = queue.get(job['id'])
+    assert job['status'] == 'failed'
+    assert job['error'] == INTERRUPTED_ERROR
+    assert job['stages'][0]['finished_at'] is not None
+    # 结果已写回文件
+    assert json.loads((tmp_path / f"{job['id']}.json").read_text())['status'] == 'failed'
+
+
+def test_heartbeat_keeps_long_job_alive(tmp_path):
+    """执行中的任务由心跳保持有效；心跳停止（如进程被冻结）超时后视为中断"""
+    queue = JobQueue(job_dir=tmp_path, heartbeat_interval=0.05, stale_after=0.3)
+    release = threading.Event()
+    job = queue.submit(lambda on_stage: release.wait(5))
+    _wait_status(queue, job['id'], 'running')
+    time.sleep(0.6)
+    assert queue.get(job['id'])['status'] == 'running'
+    release.set()
+    _wait_status(queue, job['id'], 'succeeded')
+
+    stale_id = 'cd' * 16
+    path = tmp_path / f'{stale_id}.json'
+    path.write_text(json.dumps({'id': stale_id, 'status': 'queued', 'stages': [], 'pid': os.getpid()}))
+    past = time.time() - 1
+    os.utime(path, (past, past))
+    assert queue.get(stale_id)['status'] == 'failed'
+
+
+def test_shutdown_fails_unfinished_jobs(tmp_path):
+    """worker 退出：等待执行中的任务，超时后与排队中的任务一起标记为失败，排队任务的上传内容被释放"""
+    queue = JobQueue(job_dir=tmp_path, workers=1)
+    release = threading.Event()
+    cleaned = []
+    running = queue.submit(lambda on_stage: release.wait(5))
+    queued = queue.submit(lambda on_stage: 'never', cleanup=lambda: cleaned.append('queued'))
+    _wait_status(queue, running['id'], 'running')
+
+    queue.shutdown(timeout=0.2)
+    assert queue.get(running['id'])['status'] == 'failed'
+    assert queue.get(queued['id'])['error'] == INTERRUPTED_ERROR
+    assert cleaned == ['queued']
+    release.set()
@@ -0,0 +1,59 @@
+"""
+测试运行指标
+验证直方图分桶、阶段计时，以及多进程指标文件的合并
+"""
+
+import sys
+import json
+import pathlib
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', tmp_path)
+    return tmp_path
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = metrics.Histogram('test_latency_seconds', '测试', ['stage'], buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        hist.observe(value, stage='a')
+    text = metrics.render()
+    assert 'test_latency_seconds_bucket{stage="a",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="1"} 3' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{stage="a"} 4' in text
+
+
+def test_track_records_outcome_and_provider_error():
+    with metrics.track('unit_ok') as tracker:
+        tracker.outcome = 'empty'
+    with pytest.raises(TimeoutError):
+        with metrics.track('unit_fail', provider='unit'):
+            raise TimeoutError()
+    text = metrics.render()
+    assert 'ingest_stage_total{stage="unit_ok",outcome="empty"} 1' in text
+    assert 'ingest_stage_total{stage="unit_fail",outcome="error"} 1' in text
+    assert 'ingest_provider_errors_total{provider="unit",kind="timeout"} 1' in text
+    assert 'ingest_stage_in_flight{stage="unit_fail"} 0' in text
+
+
+def test_merge_other_workers(metrics_dir):
+    """其他进程的计数器累加；已退出进程的 gauge 不计入"""
+    dead_pid = 2 ** 22 + 12345
+    snapshot = {
+        'test_jobs_total': {'type': 'counter', 'help': '测试', 'labels': [], 'buckets': [], 'samples': [[[], 5]]},
+        'test_busy': {'type': 'gauge', 'help': '测试', 'labels': [], 'buckets': [], 'samples': [[[], 3]]},
+    }
+    (metrics_dir / f'{dead_pid}.json').write_text(json.dumps({'pid': dead_pid, 'metrics': snapshot}))
+    metrics.Counter('test_jobs_total', '测试').inc(2)
+    metrics.Gauge('test_busy', '测试').inc()
+    text = metrics.render()
+    assert 'test_jobs_total 7' in text
+    assert 'test_busy 1' in text
@@ -0,0 +1,134 @@
+"""
+测试正文干扰信息清理
+一次扫描的结果应与原来逐条 re.sub 的结果一致，并在同一次扫描中统计残留的干扰关键词
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import pathlib
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import noise_filter
+
+SAMPLE = """原创
+讲座预告：人工智能与未来教育
+时间：10 月 20 日 14:00，地点：图书馆报告厅
+  TianYan
+微信扫一扫关注该公众号
+点赞 1 取消赞 在看 3 取消在看
+报名请联系 张老师×，电话：，123
+继续滑动看下一个
+轻触阅读原文
+
+
+
+预览时标签不可点 取消 允许
+欢迎同学们参加。。"""
+
+
+def legacy_clean(text):
+    """原实现：逐条 re.sub，再合并空行和标点"""
+    config = json.loads(pathlib.Path(noise_filter.NOISE_PATTERNS_FILE).read_text(encoding='utf-8'))
+    patterns = config['patterns'] + [rf'^\s*{p}\s*$' for p in config['line_patterns']]
+    for pattern in patterns:
+        text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = re.sub(r'[，。]{2,}', '。', text)
+    return text.strip()
+
+
+# 每条规则的一个匹配样例，以及规则之间的相互作用：删除后相邻文字拼成后面规则的匹配、标点相邻、整行规则
+RULE_SAMPLES = ['在小说阅读器中沉浸阅读', '预览时标签不可点', '微信扫一扫', '微信扫一扫关注', '关注该公众号',
+                '继续滑动看下一个', '轻触阅读原文', '向上滑动看下一个', '知道了', '取消 允许', '允许取消', '使用小程序',
+                '分析', '使用完整服务', '视频', '小程序', '赞 12 取消赞', '在看 3 取消在看', '分享', '留言', '收藏',
+                '听过', '×', '： ，', '， ，', '原创', 'TianYan', '取消', '允许']
+EDGE_CASES = ['，分享，', '，分享，正文', '：分享，', '留分享言', '知道分享了', '取消分享允许', '分享原创',
+              '分享\n原创\n分享', '正文。，分享，。结尾', '，，，', '。。', '原创\n\n\n\n正文', '  原创  \n正文',
+              '正文\n tianyan ', '赞，取消赞', '在看分享取消在看', '微信扫一扫。关注该公众号', '×，×，', '：\n\n，',
+              '正文。原创。正文', '分享\n\n\n\n分享', '']
+FUZZ_TOKENS = RULE_SAMPLES + ['，', '。', '：', '\n', '\n\n', ' ', '正文', '讲座', '地点：图书馆', 'A509', '享', '分', '赞', '看']
+
+
+def legacy_keywords(content):
+    config = json.loads(pathlib.Path(noise_filter.NOISE_PATTERNS_FILE).read_text(encoding='utf-8'))
+    return {k for k in config['quality_keywords'] if k in content}
+
+
+@pytest.mark.parametrize('text', RULE_SAMPLES + EDGE_CASES + [SAMPLE])
+def test_differential_corpus(text):
+    """规则样例和边界情况：清理结果和残留关键词与原实现一致"""
+    stats = {}
+    cleaned = noise_filter.wechat_noise_filter.clean(text, stats)
+    assert cleaned == legacy_clean(text)
+    assert stats['keywords'] == legacy_keywords(cleaned)
+
+
+def test_differential_random():
+    """随机拼接规则样例、标点、换行和正文，与原实现逐条 re.sub 的结果一致"""
+    rng = random.Random(20261017)
+    for _ in range(3000):
+        text = ''.join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(1, 40)))
+        stats = {}
+        cleaned = noise_filter.wechat_noise_filter.clean(text, stats)
+        assert cleaned == legacy_clean(text), repr(text)
+        assert stats['keywords'] == legacy_keywords(cleaned), repr(text)
+
+
+def _best_time(fn, text, rounds=10):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.parametrize('every', [10, 3, 1])
+def test_faster_than_legacy_cascade(every):
+    """每 every 句就有一处干扰信息（含连锁删除的「，分享，」）时，一次扫描仍比逐条 re.sub 快"""
+    rng = random.Random(every)
+    sentence = '讲座预告：人工智能与未来教育论坛将在图书馆报告厅举行，欢迎同学们报名参加'
+    noise = ['分享', '点赞，分享，在看', '微信扫一扫关注该公众号', '视频', '，分享，', '收藏', '赞 12 取消赞',
+             '原创\n', '轻触阅读原文', '×']
+    text = '。'.join(sentence + (rng.choice(noise) if i % every == 0 else '') for i in range(3000))
+    clean = noise_filter.wechat_noise_filter.clean
+    assert clean(text) == legacy_clean(text)
+    assert _best_time(clean, text) < _best_time(legacy_clean, text)
+
+
+def test_matches_legacy_cleaning():
+    stats = {}
+    cleaned = noise_filter.wechat_noise_filter.clean(SAMPLE, stats)
+    assert cleaned == legacy_clean(SAMPLE)
+    assert '原创' not in cleaned and 'TianYan' not in cleaned and '取消' not in cleaned
+    assert stats['keywords'] == set()
+    assert stats['removed'] > 5
+
+
+def test_keyword_stats_in_same_pass():
+    stats = {}
+    cleaned = noise_filter.wechat_noise_filter.clean('请点击取消按钮，然后允许通知', stats)
+    assert cleaned == '请点击取消按钮，然后允许通知'
+    assert stats['keywords'] == {'取消', '允许'}
+
+    # OCR 文字只统计、不清理
+    ocr = '[图片1文字]: 微信扫一扫 关注该公众号'
+    stats = noise_filter.wechat_noise_filter.scan(ocr)
+    assert stats['keywords'] == {'微信扫一扫', '关注该公众号'}
+    assert noise_filter.NoiseFilter.noise_ratio(stats, ocr) == 2 / 3
+
+
+def test_load_custom_config(tmp_path):
+    path = tmp_path / 'noise.json'
+    path.write_text(json.dumps({'patterns': ['广告'], 'line_patterns': ['END'], 'quality_keywords': ['推广']}),
+                    encoding='utf-8')
+    custom = noise_filter.load(str(path))
+    stats = {}
+    assert custom.clean('正文广告内容\nend\n推广', stats) == '正文内容\n\n推广'
+    assert stats == {'keywords': {'推广'}, 'removed': 2}
@@ -0,0 +1,162 @@
+"""
+测试 OCR 后端路由
+验证按图片大小 / 文字密度 / 费用选择后端、出错后自动改用下一个并暂停、每日额度（多进程共享）和指定首选后端
+"""
+
+import io
+import sys
+import pathlib
+
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import ocr_backends
+from ocr_backends import OCRBackend, OCRRouter
+
+
+class FakeBackend(OCRBackend):
+    def __init__(self, name, cost=0.0, quality=1, latency=1.0, scales_with_size=False, fail=False):
+        self.name = name
+        self.provider = name
+        self.cost = cost
+        self.quality = quality
+        self.latency = latency
+        self.scales_with_size = scales_with_size
+        self.fail = fail
+        self.calls = 0
+
+    def recognize(self, data):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError('服务不可用')
+        return f'{self.name} 识别出的海报文字内容'
+
+
+def make_image(rows, size=(800, 600)):
+    image = Image.new('L', size, 255)
+    draw = ImageDraw.Draw(image)
+    for row in range(rows):
+        draw.text((10, 10 + row * 12), 'Lecture 2024 AI Future Education Room A509 ' * 3, fill=0)
+    buf = io.BytesIO()
+    image.save(buf, 'PNG')
+    return buf.getvalue()
+
+
+@pytest.fixture
+def backends():
+    return {
+        'local': FakeBackend('local', latency=2.0, scales_with_size=True),
+        'cloud': FakeBackend('cloud', cost=0.008, quality=2, latency=0.8),
+        'accurate': FakeBackend('accurate', cost=0.03, quality=3, latency=1.5),
+    }
+
+
+@pytest.fixture
+def router(backends, tmp_path):
+    return OCRRouter(backends.values(), state_dir=tmp_path, quotas={'cloud': 2})
+
+
+def test_route_by_size_and_density(router):
+    # 文字密集：本地识别精度不足，改用中文识别好且较便宜的后端
+    assert router.recognize(make_image(48))[1] == 'cloud'
+    # 文字稀疏但像素很多：本地识别耗时随像素数增长，云端更快
+    assert router.recognize(make_image(2, (3000, 2000)))[1] == 'cloud'
+    # 文字稀疏的小图：免费的本地识别
+    text, used = router.recognize(make_image(2, (400, 300)))
+    assert used == 'local' and text.startswith('local')
+
+
+def test_fallback_and_pause_on_errors(backends, router, monkeypatch):
+    monkeypatch.setattr(ocr_backends, 'OCR_ERROR_PAUSE', 60)
+    backends['cloud'].fail = True
+    dense = make_image(48)
+    for _ in range(3):
+        text, used = router.recognize(dense)
+        assert used != 'cloud' and text
+    stats = router.stats()['cloud']
+    assert stats['errors'] == 2 and stats['paused_for'] > 0
+    # 暂停期间不再尝试
+    assert backends['cloud'].calls == 2
+    assert 'cloud' not in [b.name for b in router.plan(dense)]
+
+
+def test_daily_quota_shared(backends, router, tmp_path):
+    dense = make_image(48)
+    # 额度用完后按剩余后端的代价选择（高精度后端费用较高，本地识别即使加罚也更划算）
+    assert [router.recognize(dense)[1] for _ in range(3)] == ['cloud', 'cloud', 'local']
+    # 另一个 worker 进程读取同一份额度计数
+    other = OCRRouter(backends.values(), state_dir=tmp_path, quotas={'cloud': 2})
+    assert other.stats()['cloud']['quota_used'] == 2
+    assert other.stats()['cloud']['quota_remaining'] == 0
+
+
+def test_prefer_backend(backends, router):
+    sparse = make_image(2, (400, 300))
+    assert router.recognize(sparse, prefer='accurate')[1] == 'accurate'
+    backends['accurate'].fail = True
+    assert router.recognize(sparse, prefer='accurate')[1] == 'local'
+    with pytest.raises(ValueError):
+        router.plan(sparse, prefer='missing')
+
+
+def test_paid_backends_skipped_unless_enabled(backends, tmp_path):
+    router = OCRRouter(backends.values(), state_dir=tmp_path, allow_paid=False)
+    dense = make_image(48)
+    # 收费后端更快、更准也不使用
+    assert [b.name for b in router.plan(dense)] == ['local']
+    assert router.recognize(dense)[1] == 'local'
+    assert backends['cloud'].calls == backends['accurate'].calls == 0
+    # 调用方允许时按代价选择
+    assert router.recognize(dense, allow_paid=True)[1] == 'cloud'
+    # 明确指定的收费后端可以使用，失败后只改用免费后端
+    backends['accurate'].fail = True
+    assert [b.name for b in router.plan(dense, prefer='accurate')] == ['accurate', 'local']
+    assert router.recognize(dense, prefer='accurate')[1] == 'local'
+    assert backends['cloud'].calls == 1
+
+
+
+def test_tall_poster_tiles_recognized_in_parallel(monkeypatch):
+    """长图切块后各块同时识别：默认配置（未设置 OCR_PROCESSES / API_WORKERS）的 OCR 池不止一个进程"""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from PIL import ImageFont
+    import image_ocr
+    monkeypatch.setattr(image_ocr, 'OCR_PROCESSES', None)
+    monkeypatch.delenv('API_WORKERS', raising=False)
+    monkeypatch.setattr(image_ocr.os, 'cpu_count', lambda: 4)
+    processes = image_ocr.ocr_process_count()
+    assert processes >= 2
+
+    image = Image.new('RGB', (750, 8000), (250, 240, 220))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=40)
+    for y in range(20, 8000 - 40, 90):
+        draw.text((20, y), f'Lecture {y} Room A509', fill=(20, 20, 80), font=font)
+    buf = io.BytesIO()
+    image.save(buf, 'PNG')
+
+    lock = threading.Lock()
+    running = [0, 0]   # 正在识别的块数、同时识别的最大块数
+    overlapped = threading.Event()
+
+    def recognize_timed(tile):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+            if running[0] > 1:
+                overlapped.set()
+        # 串行识别时等不到第二块，超时后继续，最大并发数停在 1
+        overlapped.wait(2)
+        with lock:
+            running[0] -= 1
+        return f'tile {tile.height}', 0.01
+
+    monkeypatch.setattr(ocr_backends.tesseract_engine, 'recognize_timed', recognize_timed)
+    # 进程池中看不到 monkeypatch，用同样大小的线程池代替
+    with ThreadPoolExecutor(max_workers=processes) as executor:
+        text, _ = ocr_backends.TesseractBackend().run(buf.getvalue(), executor)
+    assert running[1] > 1
+    assert text.count('tile ') == 4
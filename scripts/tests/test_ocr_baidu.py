@@ -0,0 +1,139 @@
+"""
+测试百度 OCR 客户端
+用本地模拟服务代替百度接口，验证 access_token 缓存和单飞刷新、token 失效后重试、连接复用、并发提交时的 QPS 限制
+"""
+
+import sys
+import json
+import time
+import base64
+import pathlib
+import threading
+import http.server
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import ocr_baidu
+from ocr_baidu import BaiduOCRClient, BaiduOCRError
+
+
+class StubBaidu(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.token_calls = 0
+        self.expires_in = 2592000
+        self.valid_tokens = set()
+        self.ocr_times = []
+        self.ports = set()
+        self.daily_limit = None
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        form = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+        with server.lock:
+            server.ports.add(self.client_address[1])
+        if url.path == '/oauth/2.0/token':
+            time.sleep(0.05)
+            with server.lock:
+                server.token_calls += 1
+                token = f'token-{server.token_calls}'
+                server.valid_tokens.add(token)
+            return self._reply({'access_token': token, 'expires_in': server.expires_in})
+
+        token = query.get('access_token', [''])[0]
+        if token not in server.valid_tokens:
+            return self._reply({'error_code': 110, 'error_msg': 'Access token invalid or no longer valid'})
+        with server.lock:
+            if server.daily_limit is not None and len(server.ocr_times) >= server.daily_limit:
+                return self._reply({'error_code': 17, 'error_msg': 'Open api daily request limit reached'})
+            server.ocr_times.append(time.monotonic())
+        words = base64.b64decode(form['image'][0]).decode('utf-8')
+        self._reply({'words_result': [{'words': line} for line in words.split('|')], 'words_result_num': 1})
+
+
+@pytest.fixture
+def stub():
+    server = StubBaidu()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(stub, **kwargs):
+    return BaiduOCRClient('key', 'secret', base_url=f'http://127.0.0.1:{stub.server_port}', **kwargs)
+
+
+def test_token_cached_and_single_flight(stub):
+    client = make_client(stub, qps=0, workers=8)
+    images = [f'讲座{i}|地点：A509'.encode('utf-8') for i in range(20)]
+    results = client.recognize_many(images)
+    assert results == [f'讲座{i}\n地点：A509' for i in range(20)]
+    # 8 个线程同时开始时只请求一次 token
+    assert stub.token_calls == 1
+    # 复用连接：连接数远少于请求数
+    assert len(stub.ports) <= 9
+
+
+def test_refresh_before_expiry_and_on_invalid_token(stub):
+    client = make_client(stub, qps=0)
+    stub.expires_in = 0.4
+    assert client.recognize('海报'.encode('utf-8')) == '海报'
+    assert stub.token_calls == 1
+    time.sleep(0.25)
+    # 有效期过半后刷新
+    client.recognize('海报'.encode('utf-8'))
+    assert stub.token_calls == 2
+
+    # 服务端使 token 失效：刷新一次后重试成功
+    stub.expires_in = 2592000
+    stub.valid_tokens.clear()
+    assert client.recognize('海报'.encode('utf-8')) == '海报'
+    assert stub.token_calls == 3
+
+
+def test_rate_limit_and_errors(stub):
+    client = make_client(stub, qps=10, workers=4)
+    client.recognize_many([b'a'] * 6)
+    gaps = [b - a for a, b in zip(stub.ocr_times, stub.ocr_times[1:])]
+    assert all(gap >= 0.08 for gap in gaps)
+
+    stub.daily_limit = len(stub.ocr_times)
+    with pytest.raises(BaiduOCRError) as info:
+        client.recognize(b'a')
+    assert info.value.quota_exceeded
+    assert isinstance(client.recognize_many([b'a'])[0], BaiduOCRError)
+
+
+def test_module_functions_share_client(stub, monkeypatch, tmp_path):
+    monkeypatch.setattr(ocr_baidu, 'BAIDU_OCR_BASE_URL', f'http://127.0.0.1:{stub.server_port}')
+    monkeypatch.setattr(ocr_baidu, '_clients', {})
+    image = tmp_path / 'poster.jpg'
+    image.write_bytes('招聘宣讲会'.encode('utf-8'))
+    assert ocr_baidu.baidu_ocr_general(str(image), 'k', 's') == '招聘宣讲会'
+    assert ocr_baidu.baidu_ocr_accurate(str(image), 'k', 's') == '招聘宣讲会'
+    assert ocr_baidu.get_baidu_access_token('k', 's') == 'token-1'
+    assert stub.token_calls == 1
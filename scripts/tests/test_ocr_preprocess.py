@@ -0,0 +1,73 @@
+"""
+测试 OCR 预处理和长图切分
+验证灰度 / 二值化、按文字行高缩小、切分点优先落在空白行、找不到空白行时重叠切分，以及拼接时去掉重复识别的行
+"""
+
+import sys
+import pathlib
+
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import ocr_preprocess
+
+
+def make_poster(height, font_size, spacing, size=750, color=(250, 240, 220)):
+    image = Image.new('RGB', (size, height), color)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=font_size)
+    for y in range(20, height - font_size, spacing):
+        draw.text((20, y), f'Lecture {y} Room A509', fill=(20, 20, 80), font=font)
+    return image
+
+
+def test_gray_binarize_and_text_height():
+    poster = make_poster(600, 32, 60)
+    gray = ocr_preprocess.to_gray(poster)
+    assert gray.mode == 'L'
+    binary = ocr_preprocess.binarize(gray)
+    assert sum(binary.histogram()[1:255]) == 0
+    height = ocr_preprocess.estimate_text_height(ocr_preprocess.row_profile(binary))
+    assert 18 <= height <= 32
+
+    # 深色背景浅色字：二值化后同样是黑字白底
+    inverted = ocr_preprocess.binarize(ocr_preprocess.to_gray(Image.eval(poster, lambda v: 255 - v)))
+    assert inverted.histogram()[255] > inverted.histogram()[0]
+
+    # 透明背景铺白底
+    transparent = Image.new('RGBA', (50, 50), (0, 0, 0, 0))
+    assert ocr_preprocess.to_gray(transparent).getpixel((0, 0)) == 255
+
+
+def test_downscale_large_text():
+    (tile, overlapped), = ocr_preprocess.prepare(make_poster(1600, 160, 240))
+    assert not overlapped and tile.mode == 'L'
+    assert tile.width < 750 * 0.5
+    height = ocr_preprocess.estimate_text_height(ocr_preprocess.row_profile(ocr_preprocess.binarize(tile)))
+    assert height <= ocr_preprocess.OCR_TARGET_TEXT_HEIGHT * 1.25
+
+    # 正常大小的文字不缩放
+    (tile, _), = ocr_preprocess.prepare(make_poster(1600, 32, 60))
+    assert tile.size == (750, 1600)
+
+
+def test_tall_poster_tiles_cut_at_blank_rows():
+    tiles = ocr_preprocess.prepare(make_poster(8000, 40, 90))
+    assert len(tiles) == 4
+    assert all(not overlapped and tile.height <= ocr_preprocess.OCR_TILE_HEIGHT for tile, overlapped in tiles)
+    assert sum(tile.height for tile, _ in tiles) == 8000
+
+
+def test_overlap_when_no_blank_rows_and_stitch():
+    profile = [0.2] * 5000
+    tiles = ocr_preprocess.plan_tiles(profile, tile_height=2000, overlap=100)
+    assert tiles == [(0, 2000, False), (1900, 3900, True), (3800, 5000, True)]
+
+    first = '标题：人工智能讲座\n时间：10月20日\n地点：建华楼A509\n主讲'
+    # 第二块开头是被切断的残行，接着是重叠区域中重复识别的两行（有少量识别差异）
+    second = '主讲人：张\n时间：10月2O日\n地点：建华楼A509\n报名方式：扫码报名'
+    assert ocr_preprocess.stitch([(first, False), (second, True)]) == \
+        '标题：人工智能讲座\n时间：10月20日\n地点：建华楼A509\n报名方式：扫码报名'
+    # 没有重叠的块直接拼接
+    assert ocr_preprocess.stitch([('第一块', False), ('第二块', False)]) == '第一块\n第二块'
@@ -0,0 +1,83 @@
+"""
+测试 og:image 提取
+验证只解析 <head>、微信 msg_cdn_url 回退，以及结果缓存
+"""
+
+import sys
+import pathlib
+import threading
+import http.server
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import og_image
+
+BODY = b'<p>' + b'x' * (512 * 1024) + b'</p>'
+PAGES = {
+    '/og': b'<html><head><meta content="/cover.jpg" property="og:image"></head><body>' + BODY + b'</body></html>',
+    '/mp.weixin.qq.com/cdn': b'<html><head></head><body>' + BODY
+                             + b'<script>var msg_cdn_url = "http://mmbiz.qpic.cn/c.jpg";</script></body></html>',
+    '/none': b'<html><head><title>t</title></head><body></body></html>',
+}
+
+
+@pytest.fixture(scope='module')
+def server():
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            content = PAGES.get(self.path, b'')
+            self.send_response(200 if self.path in PAGES else 404)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            try:
+                self.wfile.write(content)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *a):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_port}', hits
+    httpd.shutdown()
+
+
+def test_meta_image_priority():
+    head = b'<meta name="twitter:image" content="a.png"><meta property="og:image" content=\'b&amp;c.png\'>'
+    assert og_image._meta_image(head) == 'b&c.png'
+    assert og_image._meta_image(b'<meta name=twitter:image content=a.png>') == 'a.png'
+    assert og_image._meta_image(b'<meta name="description" content="x">') is None
+
+
+def test_stops_at_head(server):
+    base, _ = server
+    image, info = og_image.fetch_og_image(base + '/og')
+    assert image == base + '/cover.jpg'
+    assert info['source'] == 'og:image'
+    assert info['bytes'] < len(PAGES['/og']) // 4
+
+
+def test_wechat_msg_cdn_url(server):
+    base, _ = server
+    image, info = og_image.fetch_og_image(base + '/mp.weixin.qq.com/cdn')
+    assert image == 'http://mmbiz.qpic.cn/c.jpg'
+    assert info['source'] == 'msg_cdn_url'
+
+
+def test_cache_and_negative_cache(server):
+    base, hits = server
+    for path in ('/og', '/none', '/missing'):
+        url = base + path
+        first, info = og_image.extract_og_image(url)
+        assert info['cached'] is False
+        count = hits.count(path)
+        second, info = og_image.extract_og_image(url)
+        assert info['cached'] is True and second == first
+        assert hits.count(path) == count
+    assert og_image.extract_og_image(base + '/missing')[1]['status_code'] == 404
@@ -0,0 +1,81 @@
+"""
+测试 PDF 文字提取
+验证页码范围解析，串行/并行提取结果一致，以及 workers 限制同时提交的任务数
+"""
+
+import sys
+import time
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import pdf_tools
+
+
+def test_parse_page_ranges():
+    """页码从 1 开始，支持开区间，重复和越界页码被忽略"""
+    assert pdf_tools.parse_page_ranges(None, 5) == [0, 1, 2, 3, 4]
+    assert pdf_tools.parse_page_ranges('1-2,4', 5) == [0, 1, 3]
+    assert pdf_tools.parse_page_ranges('4-,2,2', 5) == [3, 4, 1]
+    assert pdf_tools.parse_page_ranges('-2', 5) == [0, 1]
+    assert pdf_tools.parse_page_ranges('4-9', 5) == [3, 4]
+    with pytest.raises(ValueError):
+        pdf_tools.parse_page_ranges('3-1', 5)
+    with pytest.raises(ValueError):
+        pdf_tools.parse_page_ranges('abc', 5)
+
+
+def test_parallel_matches_serial(monkeypatch):
+    """按页并行提取与串行提取结果相同，且按页码顺序拼接"""
+    fitz = pytest.importorskip('fitz')
+    doc = fitz.open()
+    for i in range(12):
+        doc.new_page().insert_text((72, 72), f'page-{i + 1}')
+    data = doc.tobytes()
+
+    monkeypatch.setattr(pdf_tools, 'PDF_PARALLEL_MIN_PAGES', 2)
+    serial = pdf_tools.extract_pdf_text(data, backend='pymupdf', workers=1)
+    parallel = pdf_tools.extract_pdf_text(data, backend='pymupdf', workers=2)
+    assert serial == parallel
+    assert serial.index('page-2') < serial.index('page-10')
+    assert pdf_tools.extract_pdf_text(data, pages='3', backend='pymupdf').strip() == 'page-3'
+
+
+def test_workers_bounds_in_flight_chunks(monkeypatch):
+    """workers 小于进程池大小时，同时执行的分块不超过 workers"""
+    fitz = pytest.importorskip('fitz')
+    doc = fitz.open()
+    for i in range(12):
+        doc.new_page()
+    data = doc.tobytes()
+
+    state = {'active': 0, 'max_active': 0}
+    lock = threading.Lock()
+
+    def fake_extract(source, backend, chunk):
+        with lock:
+            state['active'] += 1
+            state['max_active'] = max(state['max_active'], state['active'])
+        time.sleep(0.02)
+        with lock:
+            state['active'] -= 1
+        return [(i, f'page-{i + 1}') for i in chunk]
+
+    pool = ThreadPoolExecutor(max_workers=8)
+    monkeypatch.setattr(pdf_tools, '_get_pool', lambda: pool)
+    monkeypatch.setattr(pdf_tools, 'extract_pages', fake_extract)
+    monkeypatch.setattr(pdf_tools, 'PDF_WORKERS', 8)
+    monkeypatch.setattr(pdf_tools, 'PDF_PAGES_PER_TASK', 1)
+    monkeypatch.setattr(pdf_tools, 'PDF_PARALLEL_MIN_PAGES', 2)
+    try:
+        pages = sorted(pdf_tools.iter_pdf_text(data, backend='pymupdf', workers=2))
+        assert [i for i, _ in pages] == list(range(12))
+        assert state['max_active'] == 2
+        pdf_tools.extract_pdf_text(data, backend='pymupdf')
+        assert state['max_active'] > 2
+    finally:
+        pool.shutdown()
@@ -0,0 +1,70 @@
+"""
+测试按内容寻址的结果缓存
+验证内存/磁盘两级命中、版本隔离和磁盘大小淘汰
+"""
+
+import io
+import sys
+import pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from result_cache import ResultCache, hash_content
+
+
+def test_hash_content_accepts_bytes_and_files():
+    """bytes 和文件对象得到相同的哈希，版本不同哈希不同"""
+    data = b'poster' * 1000
+    assert hash_content(data, 'v1') == hash_content(io.BytesIO(data), 'v1')
+    assert hash_content(data, 'v1') != hash_content(data, 'v2')
+
+
+def test_memory_and_disk_hits(tmp_path):
+    """第二次调用命中内存；新实例（模拟其他 worker）命中磁盘"""
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'text'
+
+    cache = ResultCache('t_hits', version='v1', cache_dir=tmp_path)
+    assert cache.get_or_compute(b'img', compute) == ('text', False)
+    assert cache.get_or_compute(b'img', compute) == ('text', True)
+    assert len(calls) == 1
+
+    other = ResultCache('t_hits', version='v1', cache_dir=tmp_path)
+    assert other.get_or_compute(b'img', compute) == ('text', True)
+    assert other.stats()['disk_hits'] == 1
+    assert len(calls) == 1
+
+
+def test_none_is_not_cached(tmp_path):
+    """提取失败（None）不写入缓存"""
+    cache = ResultCache('t_none', version='v1', cache_dir=tmp_path)
+    assert cache.get_or_compute(b'img', lambda: None) == (None, False)
+    assert cache.stats()['sets'] == 0
+
+
+def test_memory_and_disk_eviction(tmp_path):
+    """内存按条目数淘汰，磁盘超过上限时删除最旧的文件"""
+    cache = ResultCache('t_evict', version='v1', memory_items=2, disk_bytes=2000, cache_dir=tmp_path)
+    for i in range(20):
+        cache.set(cache.key(str(i).encode()), 'x' * 200)
+    stats = cache.stats()
+    assert stats['memory_items'] == 2
+    assert stats['evictions'] > 0
+    assert stats['disk_bytes'] <= 2000
+
+
+def test_overwrite_keeps_disk_size(tmp_path):
+    """覆盖同一个键时磁盘总大小按新旧文件之差计算，不会累加到提前触发淘汰"""
+    cache = ResultCache('t_overwrite', version='v1', disk_bytes=2000, cache_dir=tmp_path)
+    key = cache.key(b'img')
+    cache.set(cache.key(b'other'), 'y' * 200)
+    for _ in range(20):
+        cache.set(key, 'x' * 200)
+    stats = cache.stats()
+    assert stats['evictions'] == 0
+    assert stats['disk_bytes'] == cache._scan_disk_size()
+    cache.set(key, 'x' * 50)
+    assert cache.stats()['disk_bytes'] == cache._scan_disk_size()
@@ -0,0 +1,79 @@
+"""
+测试常驻 tesseract 引擎
+用模拟的 tesserocr 绑定验证：每个线程只初始化一次引擎（语言模型只加载一次）、每次识别后释放结果、
+初始化失败时回退到 pytesseract
+"""
+
+import sys
+import types
+import pathlib
+import threading
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import tesseract_engine
+
+
+class FakeAPI:
+    created = []
+
+    def __init__(self, lang, psm):
+        self.lang = lang
+        self.image = None
+        self.cleared = 0
+        FakeAPI.created.append(self)
+
+    def SetImage(self, image):
+        self.image = image
+
+    def GetUTF8Text(self):
+        return f'{self.image.size[0]}x{self.image.size[1]} 海报文字'
+
+    def Clear(self):
+        self.image = None
+        self.cleared += 1
+
+
+@pytest.fixture
+def fake_tesserocr(monkeypatch):
+    FakeAPI.created = []
+    module = types.SimpleNamespace(PyTessBaseAPI=FakeAPI, PSM=types.SimpleNamespace(AUTO=3))
+    monkeypatch.setattr(tesseract_engine, 'tesserocr', module, raising=False)
+    monkeypatch.setattr(tesseract_engine, 'TESSEROCR_AVAILABLE', True)
+    monkeypatch.setattr(tesseract_engine, 'TESSERACT_ENGINE', 'auto')
+    monkeypatch.setattr(tesseract_engine, '_init_failed', False)
+    monkeypatch.setattr(tesseract_engine, '_local', threading.local())
+    return module
+
+
+def test_engine_reused_per_thread(fake_tesserocr):
+    image = Image.new('L', (300, 200), 255)
+    tesseract_engine.warm_up()
+    assert tesseract_engine.image_to_string(image) == '300x200 海报文字'
+    assert tesseract_engine.image_to_string(image) == '300x200 海报文字'
+    assert len(FakeAPI.created) == 1
+    assert FakeAPI.created[0].lang == 'chi_sim+eng' and FakeAPI.created[0].cleared == 2
+    assert tesseract_engine.engine_name() == 'tesserocr'
+
+    # 其他线程使用自己的引擎（PyTessBaseAPI 不能被多个线程同时使用）
+    thread = threading.Thread(target=tesseract_engine.image_to_string, args=(image,))
+    thread.start()
+    thread.join()
+    assert len(FakeAPI.created) == 2
+
+
+def test_fallback_to_pytesseract(fake_tesserocr, monkeypatch):
+    def broken(lang, psm):
+        raise RuntimeError('Failed to init API, possibly an invalid tessdata path')
+
+    monkeypatch.setattr(fake_tesserocr, 'PyTessBaseAPI', broken)
+    calls = []
+    fake_pytesseract = types.SimpleNamespace(image_to_string=lambda image, lang: calls.append(lang) or 'cli 文字')
+    monkeypatch.setattr(tesseract_engine, 'pytesseract', fake_pytesseract, raising=False)
+
+    assert tesseract_engine.image_to_string(Image.new('L', (10, 10))) == 'cli 文字'
+    assert calls == ['chi_sim+eng']
+    assert tesseract_engine.engine_name() == 'pytesseract'
@@ -0,0 +1,50 @@
+"""
+测试上传缓冲区
+验证小文件保留在内存、大文件转存到唯一临时文件，以及释放后清理
+"""
+
+import io
+import os
+import sys
+import pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from uploads import UploadBuffer, buffer_from_stream, buffer_from_data_url
+
+
+def test_small_upload_stays_in_memory():
+    """小于阈值的内容不落盘"""
+    with UploadBuffer(max_memory=1024) as buf:
+        buf.write(b'hello')
+        assert not buf.on_disk
+        assert buf.source().read() == b'hello'
+        assert buf.getvalue() == b'hello'
+
+
+def test_large_upload_rolls_over_to_unique_file():
+    """超过阈值后转存为临时文件，两个缓冲区使用不同的文件名"""
+    first = UploadBuffer(max_memory=4, suffix='.jpg')
+    second = UploadBuffer(max_memory=4, suffix='.jpg')
+    try:
+        for buf in (first, second):
+            buf.write(b'abc')
+            buf.write(b'defgh')
+            assert buf.on_disk
+        assert first.source() != second.source()
+        with open(first.source(), 'rb') as f:
+            assert f.read() == b'abcdefgh'
+        assert first.getvalue() == b'abcdefgh'
+    finally:
+        paths = [first.path, second.path]
+        first.close()
+        second.close()
+    assert not any(os.path.exists(p) for p in paths)
+
+
+def test_buffer_helpers():
+    """从文件流和 data URL 构造缓冲区"""
+    with buffer_from_stream(io.BytesIO(b'x' * 200_000)) as buf:
+        assert buf.size == 200_000
+    with buffer_from_data_url('data:image/png;base64,aGVsbG8=') as buf:
+        assert buf.getvalue() == b'hello'
@@ -0,0 +1,70 @@
+"""
+测试链接抓取内容缓存
+验证微信文章 URL 规范化，以及过期后通过 ETag 条件请求继续使用缓存
+"""
+
+import sys
+import pathlib
+import threading
+import http.server
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import url_cache
+from result_cache import ResultCache
+
+
+def test_canonicalize_wechat():
+    short = 'https://mp.weixin.qq.com/s/sT5-QQ9jNXxi7VWv_M0HAw?scene=1&click_id=6'
+    assert url_cache.canonicalize_url(short) == 'https://mp.weixin.qq.com/s/sT5-QQ9jNXxi7VWv_M0HAw'
+    long_a = ('http://mp.weixin.qq.com/s?__biz=MzA5&mid=2651&idx=1&sn=abc&chksm=xyz'
+              '&scene=21&sessionid=123#wechat_redirect')
+    long_b = 'https://mp.weixin.qq.com/s?sn=abc&idx=1&mid=2651&__biz=MzA5&click_id=9'
+    assert url_cache.canonicalize_url(long_a) == url_cache.canonicalize_url(long_b) \
+        == 'https://mp.weixin.qq.com/s?__biz=MzA5&mid=2651&idx=1&sn=abc'
+
+
+def test_canonicalize_generic():
+    url = 'HTTPS://Example.com/news?id=3&utm_source=wx&from=timeline#top'
+    assert url_cache.canonicalize_url(url) == 'https://example.com/news?id=3'
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(url_cache, 'url_content_cache', ResultCache('url_content_test', 'v1', cache_dir=tmp_path))
+    return url_cache
+
+
+def test_ttl_and_revalidation(cache, monkeypatch):
+    requests_seen = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.headers.get('If-None-Match'))
+            self.send_response(304 if self.headers.get('If-None-Match') == '"v1"' else 200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *a):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{httpd.server_port}/article?utm_source=a'
+    try:
+        cache.put(url, '正文', {'etag': '"v1"'}, source='http')
+        assert cache.get(url.replace('utm_source=a', 'utm_source=b')) == '正文'
+        assert requests_seen == []
+
+        # 过期后发条件请求，304 时继续使用缓存
+        monkeypatch.setattr(url_cache, 'URL_CACHE_TTL', -1)
+        assert cache.get(url) == '正文'
+        assert requests_seen == ['"v1"']
+
+        # 内容已修改（200）时视为未命中
+        cache.put(url, '正文', {'etag': '"v0"'})
+        assert cache.get(url) is None
+    finally:
+        httpd.shutdown()
@@ -0,0 +1,84 @@
+"""
+测试视觉模型图片编码
+验证识别真实格式、大图缩小并重新编码、小图直接使用原图、透明背景处理，以及按原图内容缓存 data URL
+"""
+
+import io
+import sys
+import base64
+import pathlib
+
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import vision_encoder
+from result_cache import ResultCache
+
+
+def screenshot(size=(1600, 3200), mode='RGB', fmt='PNG'):
+    image = Image.new(mode, size, 'white')
+    draw = ImageDraw.Draw(image)
+    for y in range(0, size[1], 24):
+        draw.text((10, y), f'Notice {y}: career fair at Jianhua Building A509 ' * 4, fill='black')
+    # 加一块照片区域（噪点），PNG 体积接近真实截图
+    image.paste(Image.effect_noise((size[0] // 2, size[1] // 4), 60).convert(mode), (0, 0))
+    buf = io.BytesIO()
+    image.save(buf, fmt)
+    return buf.getvalue()
+
+
+def decode(url):
+    header, payload = url.split(',', 1)
+    return header, Image.open(io.BytesIO(base64.b64decode(payload)))
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(vision_encoder, 'vision_cache', ResultCache('test_vision', 'v1', cache_dir=tmp_path))
+
+
+def test_large_png_reencoded_within_bounds(monkeypatch):
+    monkeypatch.setattr(vision_encoder, 'VISION_MAX_SIDE', 2048)
+    data = screenshot()
+    encoded, mime = vision_encoder.encode_image(data)
+    assert mime == 'image/jpeg'
+    assert len(encoded) < len(data) / 2 and len(encoded) <= vision_encoder.VISION_MAX_BYTES
+    image = Image.open(io.BytesIO(encoded))
+    assert image.format == 'JPEG' and max(image.size) == 2048 and image.size[0] == 1024
+
+    encoded, mime = vision_encoder.encode_image(data, fmt='webp')
+    assert mime == 'image/webp' and Image.open(io.BytesIO(encoded)).format == 'WEBP'
+
+
+def test_small_image_passthrough_with_real_mime():
+    image = Image.new('L', (200, 80), 255)
+    ImageDraw.Draw(image).text((5, 30), 'A509', fill=0)
+    buf = io.BytesIO()
+    image.save(buf, 'PNG')
+    data = buf.getvalue()
+    assert vision_encoder.encode_image(data) == (data, 'image/png')
+    # 无法解码的数据原样上传
+    assert vision_encoder.encode_image(b'not an image') == (b'not an image', 'image/jpeg')
+
+
+def test_transparent_background_flattened():
+    image = Image.new('RGBA', (5000, 600), (0, 0, 0, 0))
+    ImageDraw.Draw(image).text((10, 10), 'Career fair ' * 20, fill=(0, 0, 0, 255))
+    buf = io.BytesIO()
+    image.save(buf, 'PNG')
+    header, image = decode(vision_encoder.image_data_url(buf.getvalue()))
+    # 超过最长边，重新编码为 JPEG，透明区域为白色（直接转 RGB 会变成黑色）
+    assert header == 'data:image/jpeg;base64' and image.width == vision_encoder.VISION_MAX_SIDE
+    assert image.convert('L').getpixel((image.width - 1, image.height - 1)) > 245
+
+
+def test_data_url_cached_by_source(monkeypatch):
+    data = screenshot((1200, 1200))
+    url = vision_encoder.image_data_url(data)
+    assert url.startswith('data:image/jpeg;base64,')
+    calls = []
+    monkeypatch.setattr(vision_encoder, 'encode_image', lambda *args: calls.append(args))
+    assert vision_encoder.image_data_url(data) == url
+    assert not calls
@@ -0,0 +1,164 @@
+"""
+上传内容缓冲区
+小文件只保存在内存中，超过阈值后才写入唯一命名的临时文件，
+避免每个请求都落盘，也避免并发请求使用相同的临时文件名互相覆盖
+"""
+
+import io
+import os
+import base64
+import pathlib
+import tempfile
+
+UPLOAD_DIR = pathlib.Path(os.getenv('UPLOAD_DIR', pathlib.Path(__file__).parent.parent / 'uploads'))
+# 内存缓冲上限（字节），超过后转存到临时文件
+UPLOAD_SPOOL_SIZE = int(os.getenv('UPLOAD_SPOOL_SIZE', 8 * 1024 * 1024))
+# 单次上传大小上限（字节）
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 50 * 1024 * 1024))
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """上传内容超过大小上限"""
+
+
+class UploadBuffer:
+    """
+    内存优先的上传缓冲区
+
+    用法：
+        with UploadBuffer(suffix='.pdf') as buf:
+            buf.write(data)
+            text = extract(buf.source())
+
+    source() 在内存模式下返回定位到开头的文件对象，转存后返回临时文件路径，
+    两种形式都可以直接传给 extract_text_from_image、pdfplumber.open 等函数
+
+    同时实现了 read / readline / seek / tell，可以作为 werkzeug 解析 multipart
+    时的文件容器，上传的文件部分直接写入缓冲区，不再经过额外的临时文件
+    """
+
+    def __init__(self, max_memory=UPLOAD_SPOOL_SIZE, suffix=''):
+        self.max_memory = max_memory
+        self.suffix = suffix
+        self.size = 0
+        self.path = None
+        self._file = io.BytesIO()
+
+    @property
+    def on_disk(self):
+        return self.path is not None
+
+    def write(self, data):
+        if not self.on_disk and self.size + len(data) > self.max_memory:
+            self._rollover()
+        self._file.write(data)
+        self.size += len(data)
+
+    def _rollover(self):
+        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, prefix='upload_', suffix=self.suffix, delete=False)
+        tmp_file.write(self._file.getbuffer())
+        self._file = tmp_file
+        self.path = tmp_file.name
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def fileobj(self):
+        """返回定位到开头的文件对象"""
+        self._file.flush()
+        self._file.seek(0)
+        return self._file
+
+    def source(self):
+        """返回可直接交给提取函数的输入：内存模式为文件对象，转存后为文件路径"""
+        if self.on_disk:
+            self._file.flush()
+            return self.path
+        return self.fileobj()
+
+    def getvalue(self):
+        """返回完整内容（bytes）"""
+        if self.on_disk:
+            return self.fileobj().read()
+        return self._file.getvalue()
+
+    def detach(self):
+        """
+        把内容（内存缓冲或临时文件）转移到新的缓冲区并返回，本对象变为空缓冲区
+        multipart 上传的缓冲区由 request.files 持有，请求结束时会被关闭；
+        交给后台任务前先转移，之后关闭原对象不会影响新缓冲区
+        """
+        buf = UploadBuffer(max_memory=self.max_memory, suffix=self.suffix)
+        buf._file, buf.path, buf.size = self._file, self.path, self.size
+        self._file, self.path, self.size = io.BytesIO(), None, 0
+        return buf
+
+    def close(self):
+        try:
+            self._file.close()
+        finally:
+            if self.path:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+                self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def buffer_from_stream(stream, suffix='', max_size=UPLOAD_MAX_SIZE):
+    """
+    分块读取文件流（如 werkzeug FileStorage.stream 或原始请求体）到缓冲区
+    超过 max_size 时抛出 UploadTooLarge，不会把整个请求体读入内存
+    """
+    if isinstance(stream, UploadBuffer):
+        # multipart 解析时已经直接写入了缓冲区
+        if max_size and stream.size > max_size:
+            stream.close()
+            raise UploadTooLarge(f'上传内容超过 {max_size // (1024 * 1024)}MB 限制')
+        return stream
+
+    buf = UploadBuffer(suffix=suffix)
+    try:
+        while True:
+            chunk = stream.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            buf.write(chunk)
+            if max_size and buf.size > max_size:
+                raise UploadTooLarge(f'上传内容超过 {max_size // (1024 * 1024)}MB 限制')
+    except BaseException:
+        buf.close()
+        raise
+    return buf
+
+
+def buffer_from_bytes(data, suffix=''):
+    buf = UploadBuffer(suffix=suffix)
+    buf.write(data)
+    return buf
+
+
+def buffer_from_data_url(data_url, suffix=''):
+    """解码 data:...;base64,xxx 格式的字符串"""
+    header, encoded = data_url.split(',', 1)
+    return buffer_from_bytes(base64.b64decode(encoded), suffix=suffix)
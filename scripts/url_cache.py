@@ -0,0 +1,112 @@
+"""
+链接抓取内容缓存
+同一篇微信文章经常带着不同的跟踪参数（scene、click_id、sessionid 等）被重复提交，
+这里先把 URL 规范化为文章本身的地址，再以规范化 URL 为键缓存抓取到的正文（含图片 OCR 文字），
+重复提交时不再重新抓取和 OCR
+
+- 存储复用 result_cache.ResultCache（内存 LRU + 磁盘，按总大小淘汰，多个 worker 共享）
+- 超过 URL_CACHE_TTL 后，如果有 ETag / Last-Modified，先发条件请求，304 则继续使用缓存内容
+"""
+
+import os
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+
+import http_client
+from result_cache import ResultCache
+
+URL_CACHE_TTL = int(os.getenv('URL_CACHE_TTL', 6 * 3600))
+URL_CACHE_MEMORY_ITEMS = int(os.getenv('URL_CACHE_MEMORY_ITEMS', 256))
+URL_CACHE_DISK_BYTES = int(os.getenv('URL_CACHE_DISK_BYTES', 64 * 1024 * 1024))
+# 条件请求的超时（秒），超时按缓存已过期处理
+URL_REVALIDATE_TIMEOUT = float(os.getenv('URL_REVALIDATE_TIMEOUT', 10))
+
+WECHAT_HOST = 'mp.weixin.qq.com'
+# 微信文章的唯一标识参数，其余参数（scene、click_id、sessionid、chksm 等）都会被去掉
+WECHAT_ARTICLE_PARAMS = ('__biz', 'mid', 'idx', 'sn')
+# 普通网页去掉的跟踪参数
+TRACKING_PARAMS = {'fbclid', 'gclid', 'spm', 'from', 'isappinstalled', 'share_token'}
+TRACKING_PREFIXES = ('utm_',)
+
+url_content_cache = ResultCache('url_content', 'url-content-v1',
+                                memory_items=URL_CACHE_MEMORY_ITEMS, disk_bytes=URL_CACHE_DISK_BYTES)
+
+
+def canonicalize_url(url):
+    """
+    规范化文章 URL
+    微信文章：https://mp.weixin.qq.com/s/<id>，或 https://mp.weixin.qq.com/s?__biz=&mid=&idx=&sn=（只保留这四个参数）
+    其他网页：协议和域名转小写，去掉 #fragment 和 utm_* 等跟踪参数
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'https').lower()
+    host = parts.netloc.lower()
+    query = parse_qsl(parts.query, keep_blank_values=True)
+
+    if host == WECHAT_HOST:
+        segments = [s for s in parts.path.split('/') if s]
+        if len(segments) == 2 and segments[0] == 's':
+            return f'https://{WECHAT_HOST}/s/{segments[1]}'
+        params = dict(query)
+        if all(params.get(name) for name in WECHAT_ARTICLE_PARAMS):
+            return f'https://{WECHAT_HOST}/s?' + urlencode([(name, params[name]) for name in WECHAT_ARTICLE_PARAMS])
+
+    query = [(k, v) for k, v in query
+             if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)]
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+def _key(canonical):
+    return url_content_cache.key(canonical.encode('utf-8'))
+
+
+def _revalidate(entry):
+    """条件请求：内容未修改（304）返回 True"""
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    if not headers:
+        return False
+    try:
+        resp = http_client.get(entry['url'], headers=headers, timeout=URL_REVALIDATE_TIMEOUT, stream=True)
+        resp.close()
+        return resp.status_code == 304
+    except requests.RequestException:
+        return False
+
+
+def get(url):
+    """
+    返回缓存的正文，没有或已过期（且无法通过条件请求确认未修改）时返回 None
+    """
+    canonical = canonicalize_url(url)
+    key = _key(canonical)
+    entry = url_content_cache.get(key)
+    if not entry:
+        return None
+    if time.time() - entry['fetched_at'] < URL_CACHE_TTL:
+        return entry['content']
+    if _revalidate(entry):
+        print(f"♻️ 内容未修改（304），继续使用缓存: {canonical}")
+        entry['fetched_at'] = time.time()
+        url_content_cache.set(key, entry)
+        return entry['content']
+    return None
+
+
+def put(url, content, validators=None, source=None):
+    """保存抓取结果；validators 为抓取时响应头中的 etag / last_modified"""
+    canonical = canonicalize_url(url)
+    validators = validators or {}
+    url_content_cache.set(_key(canonical), {
+        'url': canonical,
+        'content': content,
+        'source': source,
+        'fetched_at': time.time(),
+        'etag': validators.get('etag'),
+        'last_modified': validators.get('last_modified'),
+    })
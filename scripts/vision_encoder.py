@@ -0,0 +1,121 @@
+"""
+GLM-4V 视觉模型的图片编码
+原实现把原始文件字节直接 base64 上传，并一律标成 data:image/jpeg。几 MB 的 PNG 截图、长海报按原尺寸上传，
+上传慢，模型处理也慢。这里：
+
+- 按文件内容识别真实格式（PIL），不再一律标成 JPEG
+- 最长边超过 VISION_MAX_SIDE 时按比例缩小
+- 重新编码为 JPEG（默认）或 WebP：JPEG 使用 4:4:4 色度采样，文字边缘不发虚；
+  超过 VISION_MAX_BYTES 时逐步降低质量（不低于 VISION_MIN_QUALITY），仍然超过时再缩小尺寸
+- 原图已经是尺寸合格的小文件（VISION_PASSTHROUGH_BYTES 以内）或比重新编码还小的 JPEG / PNG / WebP 时直接使用原图
+- 编码结果（data URL）按原图内容哈希缓存，同一张海报重复识别时不再编码
+
+节省的字节数记入 ingest_vision_payload_bytes_total（source / encoded）
+"""
+
+import io
+import os
+import base64
+
+from PIL import Image
+
+import metrics
+from result_cache import ResultCache
+
+# 最长边（像素）；长海报按最长边缩小后文字会变窄，不宜设得太小
+VISION_MAX_SIDE = int(os.getenv('VISION_MAX_SIDE', 4096))
+# 编码后的目标大小（字节）
+VISION_MAX_BYTES = int(os.getenv('VISION_MAX_BYTES', 1024 * 1024))
+# jpeg 或 webp
+VISION_FORMAT = os.getenv('VISION_FORMAT', 'jpeg').lower()
+VISION_QUALITY = int(os.getenv('VISION_QUALITY', 85))
+VISION_MIN_QUALITY = int(os.getenv('VISION_MIN_QUALITY', 60))
+# 尺寸合格且不超过该大小的 JPEG / PNG / WebP 原图直接上传，不尝试重新编码
+VISION_PASSTHROUGH_BYTES = int(os.getenv('VISION_PASSTHROUGH_BYTES', 256 * 1024))
+# 设置 VISION_ENCODE=0 可关闭重新编码（按真实格式上传原图）
+VISION_ENCODE = os.getenv('VISION_ENCODE', '1') != '0'
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp', 'GIF': 'image/gif', 'BMP': 'image/bmp'}
+# 模型接口直接接受的原图格式
+_PASSTHROUGH_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+payload_bytes = metrics.Counter('ingest_vision_payload_bytes_total', '视觉模型图片编码前后的字节数', ['kind'])
+
+vision_cache = ResultCache('vision_payload', 'vision-payload-v1')
+
+
+def _flatten(image):
+    """转为 RGB，透明背景铺白底"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, 'white')
+        return Image.alpha_composite(background, image).convert('RGB')
+    return image.convert('RGB')
+
+
+def _save(image, fmt, quality):
+    buf = io.BytesIO()
+    if fmt == 'webp':
+        image.save(buf, 'WEBP', quality=quality, method=4)
+    else:
+        image.save(buf, 'JPEG', quality=quality, subsampling=0, optimize=True)
+    return buf.getvalue()
+
+
+def _fit(image, max_side):
+    scale = max_side / max(image.size)
+    if scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.LANCZOS)
+
+
+def encode_image(data, fmt=None):
+    """
+    编码一张图片，返回 (编码后的字节, MIME 类型)
+    无法解码的数据原样返回（标为 image/jpeg，与原实现一致）
+    """
+    fmt = fmt or VISION_FORMAT
+    try:
+        image = Image.open(io.BytesIO(data))
+        source_format = image.format
+        image.load()
+    except Exception:
+        return data, 'image/jpeg'
+    mime = MIME_TYPES.get(source_format, 'image/jpeg')
+    if not VISION_ENCODE:
+        return data, mime
+
+    fits = max(image.size) <= VISION_MAX_SIDE
+    passthrough = fits and source_format in _PASSTHROUGH_FORMATS
+    if passthrough and len(data) <= VISION_PASSTHROUGH_BYTES:
+        return data, mime
+    image = _fit(_flatten(image), VISION_MAX_SIDE)
+    quality = VISION_QUALITY
+    encoded = _save(image, fmt, quality)
+    while len(encoded) > VISION_MAX_BYTES:
+        if quality > VISION_MIN_QUALITY:
+            quality = max(VISION_MIN_QUALITY, quality - 10)
+        else:
+            image = _fit(image, int(max(image.size) * 0.8))
+        encoded = _save(image, fmt, quality)
+
+    if passthrough and len(data) <= min(len(encoded), VISION_MAX_BYTES):
+        return data, mime
+    return encoded, 'image/webp' if fmt == 'webp' else 'image/jpeg'
+
+
+def image_data_url(data):
+    """返回发给视觉模型的 data URL（按原图内容哈希缓存）"""
+    key = vision_cache.key(data, f'{VISION_FORMAT}|{VISION_MAX_SIDE}|{VISION_MAX_BYTES}|{VISION_QUALITY}|{VISION_ENCODE}')
+    url = vision_cache.get(key)
+    if url is None:
+        encoded, mime = encode_image(data)
+        url = f'data:{mime};base64,{base64.b64encode(encoded).decode("ascii")}'
+        vision_cache.set(key, url)
+        if len(encoded) < len(data):
+            print(f"🗜️ 视觉模型图片 {len(data) / 1024:.0f} KB -> {len(encoded) / 1024:.0f} KB（{mime}）")
+    payload_bytes.inc(len(data), kind='source')
+    # data URL 中 base64 部分按 4 字符 3 字节换算回原始字节数
+    payload_bytes.inc(len(url.split(',', 1)[1]) * 3 // 4, kind='encoded')
+    return url